@@ -0,0 +1,143 @@
+"""Command-line entry point: ``python -m app``."""
+from __future__ import annotations
+
+import time
+
+# Taken before the imports below, so the startup profile counts them
+_STARTED = time.perf_counter()
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+
+import uvicorn
+
+# Time-to-first-response budget: process start to the first page served,
+# with the parse cache warm (``--profile-startup`` fails above it)
+TTFR_BUDGET_MS = 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m app", description="Run the D&D initiative tracker."
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--reload", action="store_true", help="Reload on code changes")
+    parser.add_argument(
+        "--rebuild-cache",
+        action="store_true",
+        help="Re-parse every stat block instead of using the on-disk parse cache",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="Processes used to parse stat blocks on startup (0 = one per CPU)",
+    )
+    parser.add_argument(
+        "--profile-startup",
+        action="store_true",
+        help="Report where cold-start time goes instead of serving, and check "
+        "time to first response against the budget",
+    )
+    args = parser.parse_args()
+
+    if args.rebuild_cache:
+        os.environ["DND_REBUILD_CACHE"] = "1"
+    if args.workers is not None:
+        os.environ["DND_LOAD_WORKERS"] = str(args.workers)
+    if args.profile_startup:
+        sys.exit(profile_startup())
+    uvicorn.run("app.main:app", host=args.host, port=args.port, reload=args.reload)
+
+
+def _slowest_imports(limit: int = 8) -> list[tuple[str, int]]:
+    """Top-level packages by cumulative import time (us), via ``-X importtime``."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        capture_output=True,
+        text=True,
+    )
+    packages: dict[str, int] = {}
+    for line in result.stderr.splitlines():
+        # "import time:   self [us] | cumulative | imported package"
+        parts = line.split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        name = parts[2].strip()
+        if ("." not in name or name == "app.main") and name not in packages:
+            packages[name] = int(parts[1])
+    return sorted(packages.items(), key=lambda item: -item[1])[:limit]
+
+
+async def _first_requests() -> tuple[list[tuple[str, float]], float]:
+    """Run startup and the first requests; returns their timings and the TTFR."""
+    import httpx
+
+    from app import main, state
+
+    timings = []
+    start = time.perf_counter()
+    await main.startup()
+    timings.append(("startup", time.perf_counter() - start))
+
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=main.app), base_url="http://profile"
+    ) as client:
+        start = time.perf_counter()
+        (await client.get("/")).raise_for_status()
+        timings.append(("GET / (first response)", time.perf_counter() - start))
+        ttfr = time.perf_counter() - _STARTED
+
+        # First combat click, on a scratch table
+        params = {"table": "profile"}
+        if state.monster_library:
+            start = time.perf_counter()
+            await client.post(
+                "/encounter/add-monster",
+                params=params,
+                data={"monster_name": next(iter(state.monster_library))},
+            )
+            await client.post("/encounter/start-combat", params=params)
+            creature = next(iter(state.tables.get("profile").encounter.creatures))
+            (
+                await client.post(
+                    f"/encounter/damage/{creature.id}", params=params, data={"amount": 1}
+                )
+            ).raise_for_status()
+            timings.append(("first combat action", time.perf_counter() - start))
+    await main.shutdown()
+    return timings, ttfr
+
+
+def profile_startup() -> int:
+    """Print a cold-start breakdown; returns 1 if over the TTFR budget."""
+    # Journal into a scratch directory so profiling never touches real tables
+    os.environ["DND_DATA_DIR"] = tempfile.mkdtemp(prefix="dnd-profile-")
+
+    start = time.perf_counter()
+    import app.main
+
+    import_s = time.perf_counter() - start
+    requests, ttfr = asyncio.run(_first_requests())
+    ttfr_ms = ttfr * 1000
+
+    print(f"import app.main        {import_s * 1000:8.1f} ms")
+    print("  slowest imports (cumulative, -X importtime in a fresh process):")
+    for name, us in _slowest_imports():
+        print(f"  {name:<20} {us / 1000:8.1f} ms")
+    for name, seconds in requests:
+        print(f"{name:<22} {seconds * 1000:8.1f} ms")
+        if name == "startup":
+            for phase, phase_s in app.main.startup_timings.items():
+                print(f"  {phase:<20} {phase_s * 1000:8.1f} ms")
+    verdict = "ok" if ttfr_ms <= TTFR_BUDGET_MS else "OVER BUDGET"
+    print(f"time to first response {ttfr_ms:7.1f} ms (budget {TTFR_BUDGET_MS} ms): {verdict}")
+    return 0 if ttfr_ms <= TTFR_BUDGET_MS else 1
+
+
+if __name__ == "__main__":
+    main()
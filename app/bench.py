@@ -0,0 +1,371 @@
+"""End-to-end benchmark: a synthetic library and a scripted combat, in-process.
+
+``python -m app.bench`` writes a synthetic bestiary and party (``*_stats.md``
+files in the ``assets/`` format) to a scratch directory, starts the app on
+them and drives it through httpx's ASGI transport. No server or sockets are
+involved. The scripted session builds an encounter, starts combat and plays
+``--rounds`` rounds: each turn deals damage to a random creature, sometimes
+heals one, and advances the turn.
+
+It reports:
+
+- startup time, cold (empty parse cache) and warm
+- library-load throughput (files per second)
+- p50/p99 latency for each route
+- the process's peak RSS
+
+Results are written as JSON (``--out``). ``--compare old.json`` prints the
+change against an earlier run. It exits non-zero when a route's p99 grew by
+more than ``--threshold`` (on routes called often enough to tell), so two
+commits can be compared.
+
+``python -m app.bench <suite>`` runs one of the micro-benchmarks in
+``app.microbench`` instead (e.g. ``turns``).
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+RESULTS_FORMAT = 1
+# Routes called fewer times than this are compared but never flagged: one
+# sample's p99 is noise
+MIN_SAMPLES = 100
+
+_ADJECTIVES = (
+    "Ashen", "Bog", "Cinder", "Dread", "Ember", "Frost", "Grave", "Hollow", "Iron", "Jade",
+    "Kraken", "Lurking", "Moss", "Night", "Onyx", "Plague", "Quill", "Rust", "Storm", "Thorn",
+)
+_NOUNS = (
+    "Ghoul", "Drake", "Hound", "Wight", "Troll", "Harpy", "Ooze", "Basilisk", "Gnoll", "Wraith",
+    "Stalker", "Golem", "Serpent", "Hag", "Imp", "Ogre", "Spider", "Knight", "Shade", "Wyrm",
+)
+_CLASSES = (
+    "Barbarian", "Bard", "Cleric", "Druid", "Fighter", "Monk", "Paladin", "Rogue", "Wizard",
+)
+_CRS = ("1/8", "1/4", "1/2", "1", "2", "3", "4", "5", "6", "8", "10", "13", "17")
+
+
+def _scores(rng: random.Random) -> str:
+    cells = []
+    for _ in range(6):
+        score = rng.randint(3, 22)
+        cells.append(f"{score} ({(score - 10) // 2:+d})")
+    return "| " + " | ".join(cells) + " |"
+
+
+def monster_stat_block(name: str, rng: random.Random) -> str:
+    """A monster stat block in the ``assets/monsters`` format."""
+    dice = rng.randint(1, 20)
+    size = rng.choice((6, 8, 10, 12))
+    bonus = rng.randint(0, 5)
+    hp = dice * (size + 1) // 2 + bonus
+    to_hit = rng.randint(3, 11)
+    lines = [
+        f"## {name}",
+        "",
+        f"**Armor Class:** {rng.randint(10, 20)} (natural armor)  ",
+        f"**Hit Points:** {hp} ({dice}d{size} + {bonus})  ",
+        f"**Speed:** {rng.choice((20, 30, 40))} ft.",
+        "",
+        "| STR | DEX | CON | INT | WIS | CHA |",
+        "|:---:|:---:|:---:|:---:|:---:|:---:|",
+        _scores(rng),
+        "",
+        f"**Senses:** Darkvision 60 ft., Passive Perception {rng.randint(8, 18)}  ",
+        f"**Challenge:** {rng.choice(_CRS)} (100 XP)",
+        "",
+        "### Traits",
+        "",
+        f"**Keen Senses.** The {name.lower()} has advantage on Wisdom (Perception) checks.",
+        "",
+        "### Actions",
+        "",
+        "**Multiattack.** It makes two attacks.",
+        "",
+        f"**Claw.** *Melee Weapon Attack:* +{to_hit} to hit, reach 5 ft., one target. "
+        f"*Hit:* {rng.randint(4, 20)} ({rng.randint(1, 3)}d{size} + {bonus}) slashing damage.",
+    ]
+    if rng.random() < 0.05:
+        lines += [
+            "",
+            "### Legendary Actions",
+            "",
+            f"The {name.lower()} can take 3 legendary actions, choosing from the options below.",
+            "",
+            "**Claw.** It makes a claw attack.",
+        ]
+    return "\n".join(lines) + "\n"
+
+
+def pc_stat_block(name: str, rng: random.Random) -> str:
+    """A PC stat block in the ``assets/pcs`` format."""
+    dex = rng.randint(8, 18)
+    return "\n".join(
+        [
+            f"## {name}",
+            f"**Class:** {rng.choice(_CLASSES)} {rng.randint(1, 20)}",
+            f"**Armor Class:** {rng.randint(11, 20)}",
+            f"**Hit Points:** {rng.randint(8, 180)}",
+            "**Speed:** 30 ft.",
+            "",
+            "| STR | DEX | CON | INT | WIS | CHA |",
+            "|:---:|:---:|:---:|:---:|:---:|:---:|",
+            _scores(rng),
+            "",
+            f"**Initiative Modifier:** {(dex - 10) // 2:+d}",
+            f"**Passive Perception:** {rng.randint(8, 18)}",
+        ]
+    ) + "\n"
+
+
+def write_library(assets_dir: Path, monsters: int, pcs: int, seed: int = 0) -> None:
+    """Write ``monsters`` + ``pcs`` synthetic stat blocks under ``assets_dir``."""
+    rng = random.Random(seed)
+    monsters_dir = assets_dir / "monsters"
+    monsters_dir.mkdir(parents=True, exist_ok=True)
+    for i in range(monsters):
+        name = f"{_ADJECTIVES[i % 20]} {_NOUNS[i // 20 % 20]} {i // 400 + 1}"
+        path = monsters_dir / f"{name.lower().replace(' ', '_')}_stats.md"
+        path.write_text(monster_stat_block(name, rng), encoding="utf-8")
+    pcs_dir = assets_dir / "pcs"
+    pcs_dir.mkdir(parents=True, exist_ok=True)
+    for i in range(pcs):
+        name = f"Hero {i + 1}"
+        path = pcs_dir / f"hero_{i + 1}_lvl1_stats.md"
+        path.write_text(pc_stat_block(name, rng), encoding="utf-8")
+
+
+def _percentiles(samples: list[float]) -> dict[str, float]:
+    ordered = sorted(samples)
+    n = len(ordered)
+    return {
+        "count": n,
+        "p50_ms": round(ordered[n // 2] * 1000, 3),
+        "p99_ms": round(ordered[min(n - 1, n * 99 // 100)] * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+def _peak_rss_mb() -> float | None:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _commit() -> str | None:
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            cwd=Path(__file__).parent,
+        )
+    except OSError:
+        return None
+    return result.stdout.strip() or None
+
+
+async def _startup(main) -> dict[str, float]:
+    """Run startup (and shutdown); returns its phase timings and total."""
+    start = time.perf_counter()
+    await main.startup()
+    total = time.perf_counter() - start
+    phases = dict(main.startup_timings)
+    await main.shutdown()
+    return {"total_s": round(total, 4), **{k: round(v, 4) for k, v in phases.items()}}
+
+
+async def _session(args: argparse.Namespace) -> dict:
+    import httpx
+
+    from app import main, state
+
+    cold = await _startup(main)
+    warm = await _startup(main)
+    await main.startup()
+    timings: dict[str, list[float]] = {}
+    rng = random.Random(args.seed)
+
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=main.app), base_url="http://bench"
+    ) as client:
+
+        async def call(route: str, url: str, method: str = "POST", **kwargs) -> httpx.Response:
+            start = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            timings.setdefault(route, []).append(time.perf_counter() - start)
+            response.raise_for_status()
+            return response
+
+        await call("GET /", "/", "GET")
+        for name in rng.sample(sorted(state.pc_library), min(args.party, len(state.pc_library))):
+            await call("POST /encounter/add-pc", "/encounter/add-pc", data={"pc_name": name})
+        library = sorted(state.monster_library)
+        kinds = rng.sample(library, min(args.foe_kinds, len(library)))
+        for i, name in enumerate(kinds):
+            count = args.foes // len(kinds) + (i < args.foes % len(kinds))
+            await call(
+                "POST /encounter/add-monster",
+                "/encounter/add-monster",
+                data={"monster_name": name, "count": count},
+            )
+        encounter = state.tables.get("default").encounter
+        rolls = {
+            f"roll_{c.id}": str(rng.randint(1, 20))
+            for c in encounter.creatures
+            if c.creature_type.value == "PC"
+        }
+        await call("POST /encounter/start-combat", "/encounter/start-combat", data=rolls)
+
+        session_start = time.perf_counter()
+        while encounter.round_number <= args.rounds:
+            ids = [c.id for c in encounter.creatures]
+            target = rng.choice(ids)
+            await call(
+                "POST /encounter/damage/{creature_id}",
+                f"/encounter/damage/{target}",
+                data={"amount": rng.randint(1, 8)},
+            )
+            if rng.random() < 0.4:
+                await call(
+                    "POST /encounter/heal/{creature_id}",
+                    f"/encounter/heal/{rng.choice(ids)}",
+                    data={"amount": rng.randint(1, 10)},
+                )
+            await call("POST /encounter/next-turn", "/encounter/next-turn")
+        session_s = time.perf_counter() - session_start
+        creatures = len(encounter.creatures)
+    await main.shutdown()
+
+    requests = sum(len(samples) for samples in timings.values())
+    files = len(state.pc_library) + len(state.monster_library)
+    load_cold = cold["load PCs"] + cold["load monsters"]
+    load_warm = warm["load PCs"] + warm["load monsters"]
+    return {
+        "startup": {"cold": cold, "warm": warm},
+        "library": {
+            "files": files,
+            "cold_files_per_s": round(files / load_cold) if load_cold else None,
+            "warm_files_per_s": round(files / load_warm) if load_warm else None,
+        },
+        "session": {
+            "creatures": creatures,
+            "rounds": args.rounds,
+            "requests": requests,
+            "wall_s": round(session_s, 3),
+            "requests_per_s": round(requests / session_s) if session_s else None,
+        },
+        "routes": {route: _percentiles(samples) for route, samples in sorted(timings.items())},
+    }
+
+
+def compare(old: dict, new: dict, threshold: float) -> list[str]:
+    """Lines comparing two results per route; those over ``threshold`` end in "REGRESSION"."""
+    lines = []
+    for route, stats in new["routes"].items():
+        before = old.get("routes", {}).get(route)
+        if before is None:
+            continue
+        line = f"{route:<40}"
+        regressed = False
+        for key in ("p50_ms", "p99_ms"):
+            ratio = stats[key] / before[key] if before[key] else 1.0
+            line += f"  {key[:3]} {before[key]:8.3f} -> {stats[key]:8.3f} ms ({ratio:5.2f}x)"
+            regressed |= key == "p99_ms" and ratio > threshold and stats["count"] >= MIN_SAMPLES
+        lines.append(line + ("  REGRESSION" if regressed else ""))
+    return lines
+
+
+def _write(results: dict, out: Path | None) -> None:
+    text = json.dumps(results, indent=2)
+    if out:
+        out.write_text(text + "\n")
+    else:
+        print(text)
+
+
+def main(argv: list[str] | None = None) -> int:
+    from app.microbench import SUITES
+
+    parser = argparse.ArgumentParser(
+        prog="python -m app.bench",
+        description="Benchmark the tracker end to end on a synthetic library.",
+    )
+    parser.add_argument(
+        "suite",
+        nargs="?",
+        default="session",
+        choices=("session", *SUITES),
+        help="What to benchmark: the scripted session (default) or a micro-benchmark",
+    )
+    parser.add_argument("--monsters", type=int, default=2000, help="Synthetic monster files")
+    parser.add_argument("--pcs", type=int, default=50, help="Synthetic PC files")
+    parser.add_argument("--party", type=int, default=4, help="PCs in the encounter")
+    parser.add_argument("--foes", type=int, default=12, help="Monsters in the encounter")
+    parser.add_argument("--foe-kinds", type=int, default=4, help="Distinct monsters among the foes")
+    parser.add_argument("--rounds", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", type=Path, help="Write the results here as JSON")
+    parser.add_argument("--compare", type=Path, help="Earlier results to compare against")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=1.25,
+        help="p99 growth (ratio) that counts as a regression with --compare",
+    )
+    args = parser.parse_args(argv)
+    if args.suite != "session":
+        _write(SUITES[args.suite](), args.out)
+        return 0
+
+    scratch = Path(tempfile.mkdtemp(prefix="dnd-bench-"))
+    try:
+        write_library(scratch / "assets", args.monsters, args.pcs, args.seed)
+        # Set before app.main is imported: it reads its directories once
+        os.environ["DND_ASSETS_DIR"] = str(scratch / "assets")
+        os.environ["DND_CACHE_DIR"] = str(scratch / "cache")
+        os.environ["DND_DATA_DIR"] = str(scratch / "data")
+        os.environ["DND_WATCH_ASSETS"] = "0"
+
+        start = time.perf_counter()
+        import app.main  # noqa: F401
+
+        import_s = time.perf_counter() - start
+        results = asyncio.run(_session(args))
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    results = {
+        "format": RESULTS_FORMAT,
+        "commit": _commit(),
+        "python": platform.python_version(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+        "import_s": round(import_s, 4),
+        **results,
+        "memory": {"peak_rss_mb": _peak_rss_mb()},
+    }
+
+    _write(results, args.out)
+    if args.compare:
+        lines = compare(json.loads(args.compare.read_text()), results, args.threshold)
+        print("\n".join(lines), file=sys.stderr)
+        return 1 if any(line.endswith("REGRESSION") for line in lines) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
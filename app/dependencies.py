@@ -0,0 +1,55 @@
+"""FastAPI dependencies shared by the routers."""
+from __future__ import annotations
+
+from collections.abc import AsyncIterator
+
+from fastapi import HTTPException, Request
+
+from app import state
+from app.services.tables import DEFAULT_TABLE, Table, valid_table_id
+
+
+def table_id_for(request: Request) -> str:
+    """The table a request is for: ``?table=``, else the ``table`` cookie."""
+    table_id = request.query_params.get("table") or request.cookies.get("table")
+    return table_id if valid_table_id(table_id) else DEFAULT_TABLE
+
+
+def existing_table(request: Request) -> Table:
+    """The request's table, without taking its lock; 404 if there is none.
+
+    For read-only routes: looking a table up never creates it.
+    """
+    table_id = table_id_for(request)
+    table = state.tables.get(table_id)
+    if table is None:
+        raise HTTPException(status_code=404, detail=f"No table {table_id!r}")
+    return table
+
+
+async def _locked(table: Table) -> AsyncIterator[Table]:
+    async with table.lock:
+        try:
+            yield table
+        finally:
+            table.history.seal()
+
+
+async def current_table(request: Request) -> AsyncIterator[Table]:
+    """Resolve the request's table and hold its lock for the request.
+
+    Whatever the request changed becomes one undo step. 404 if the table
+    does not exist.
+    """
+    async for table in _locked(existing_table(request)):
+        yield table
+
+
+async def setup_table(request: Request) -> AsyncIterator[Table]:
+    """Like ``current_table``, but creates the table if need be.
+
+    Only for the DM's setup actions (adding creatures): the first one
+    starts a new table.
+    """
+    async for table in _locked(state.tables.create(table_id_for(request))):
+        yield table
@@ -1,43 +1,144 @@
+import os
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
 from pathlib import Path
 
 from fastapi import FastAPI, Request
 from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
 
-from app.parsers.character_md import load_all_pcs
-from app.parsers.monster_md import load_all_monsters
-from app.routers import creatures, encounter
+from app import state
+from app.dependencies import table_id_for
+from app.metrics import REGISTRY, Gauge, MetricsMiddleware
+from app.models import Encounter
+from app.parsers.cache import StatBlockCache
+from app.parsers.character_md import load_all_pcs, parse_character_md, select_pcs
+from app.parsers.loader import available_cpus
+from app.parsers.monster_md import load_all_monsters, parse_monster_md, select_monsters
+from app.routers import api, creatures, encounter, metrics, player
+from app.services.tables import DEFAULT_TABLE, TableRegistry
+from app.services.watcher import LibraryWatcher, WatchedLibrary
+from app.services.workers import MAX_WORKERS, make_pool
+from app.templating import precompile, templates
 
 APP_DIR = Path(__file__).parent
-ASSETS_DIR = APP_DIR.parent / "assets"
+ASSETS_DIR = Path(os.environ.get("DND_ASSETS_DIR", APP_DIR.parent / "assets"))
 PCS_DIR = ASSETS_DIR / "pcs"
 MONSTERS_DIR = ASSETS_DIR / "monsters"
+CACHE_DIR = Path(os.environ.get("DND_CACHE_DIR", APP_DIR.parent / ".cache"))
+DATA_DIR = Path(os.environ.get("DND_DATA_DIR", APP_DIR.parent / ".data"))
+# Worker processes for parsing stat blocks on startup (0 = one per CPU)
+LOAD_WORKERS = int(os.environ.get("DND_LOAD_WORKERS", "1")) or os.cpu_count() or 1
+# Processes shared by simulations and bulk imports (0 = one per CPU, at most MAX_WORKERS)
+POOL_WORKERS = min(int(os.environ.get("DND_POOL_WORKERS", "0")) or available_cpus(), MAX_WORKERS)
+# Reload edited/added/deleted asset files while running (0 = off)
+WATCH_ASSETS = os.environ.get("DND_WATCH_ASSETS", "1") != "0"
 
 app = FastAPI(title="D&D Initiative Tracker")
 app.mount("/static", StaticFiles(directory=APP_DIR / "static"), name="static")
+app.add_middleware(MetricsMiddleware)
 
-templates = Jinja2Templates(directory=APP_DIR / "templates")
+# Seconds spent in each startup phase (see ``python -m app --profile-startup``)
+startup_timings: dict[str, float] = {}
+
+REGISTRY.register(
+    Gauge(
+        "dnd_startup_phase_seconds",
+        "Seconds spent in each startup phase.",
+        ("phase",),
+        lambda: (((name,), seconds) for name, seconds in startup_timings.items()),
+    )
+)
 
 app.include_router(encounter.router)
 app.include_router(creatures.router)
+app.include_router(player.router)
+app.include_router(metrics.router)
+app.include_router(api.router)
+
+
+@contextmanager
+def _phase(name: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        startup_timings[name] = time.perf_counter() - start
 
 
 @app.on_event("startup")
 async def startup() -> None:
-    load_all_pcs(PCS_DIR)
-    load_all_monsters(MONSTERS_DIR)
+    with _phase("open parse cache"):
+        cache = StatBlockCache(
+            CACHE_DIR / "statblocks.sqlite",
+            rebuild=os.environ.get("DND_REBUILD_CACHE") == "1",
+        )
+    try:
+        with _phase("load PCs"):
+            pc_files = load_all_pcs(PCS_DIR, cache, LOAD_WORKERS)
+        with _phase("load monsters"):
+            monster_files = load_all_monsters(MONSTERS_DIR, cache, LOAD_WORKERS)
+    finally:
+        cache.close()
+
+    with _phase("index library"):
+        state.library_index.rebuild(
+            state.pc_library.values(), state.monster_library.values()
+        )
+
+    # Compile every template now rather than on the first request that uses it
+    with _phase("compile templates"):
+        precompile(CACHE_DIR / "templates")
+
+    # Tables pick up their encounter where the last run (or crash) left it
+    with _phase("open tables"):
+        state.tables = TableRegistry(DATA_DIR / "tables")
+        state.tables.create(DEFAULT_TABLE)
+
+    # One pool for simulations and imports, rather than a fork of the server per request
+    with _phase("worker pool"):
+        state.worker_count = POOL_WORKERS
+        state.worker_pool = make_pool(POOL_WORKERS)
+
+    if WATCH_ASSETS:
+        with _phase("watch assets"):
+            state.watcher = LibraryWatcher(
+                [
+                    WatchedLibrary(PCS_DIR, parse_character_md, select_pcs, "pc_library", pc_files),
+                    WatchedLibrary(
+                        MONSTERS_DIR, parse_monster_md, select_monsters, "monster_library",
+                        monster_files,
+                    ),
+                ]
+            )
+            state.watcher.start()
+
+
+@app.on_event("shutdown")
+async def shutdown() -> None:
+    if state.watcher is not None:
+        await state.watcher.stop()
+    if state.worker_pool is not None:
+        state.worker_pool.shutdown(cancel_futures=True)
+    state.tables.close()
 
 
 @app.get("/")
 async def index(request: Request):
-    from app import state
-
-    return templates.TemplateResponse(
+    table_id = table_id_for(request)
+    table = state.tables.get(table_id)
+    response = templates.TemplateResponse(
         "encounter/setup.html",
         {
             "request": request,
             "monster_library": state.monster_library,
             "pc_library": state.pc_library,
-            "encounter": state.encounter,
+            "library": state.library_index,
+            # A new table only exists once its first creature is added
+            "encounter": table.encounter if table is not None else Encounter(),
         },
     )
+    # /?table=<id> switches this browser to another table
+    if request.query_params.get("table") == table_id:
+        response.set_cookie("table", table_id, samesite="lax")
+    return response
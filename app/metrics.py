@@ -0,0 +1,280 @@
+"""Request and service timings, exposed in the Prometheus text format.
+
+``MetricsMiddleware`` times every request by route template
+(``/encounter/damage/{creature_id}``, not the id), and ``timed`` wraps the
+combat service functions and library loading. Templates time their own
+renders (see ``templating``). Gauges such as encounter and library size are
+read when ``/metrics`` is scraped, so they cost nothing in between.
+
+Everything is kept in plain dicts and lists: an observation is a bisect
+and two additions, well under a microsecond, so it stays on in production.
+
+With ``DND_PROFILE_REQUESTS=1``, a request sent with the ``X-Profile: 1``
+header runs under cProfile and is answered with the profile (top functions
+by cumulative time) instead of its normal response. The profiler sees
+everything the event loop runs meanwhile, so profile one request at a time.
+"""
+from __future__ import annotations
+
+import cProfile
+import functools
+import io
+import os
+import pstats
+import time
+from bisect import bisect_left
+from collections.abc import Callable, Iterable
+from typing import Any, TypeVar
+
+F = TypeVar("F", bound=Callable[..., Any])
+M = TypeVar("M", "Histogram", "Counter", "Gauge")
+
+# Upper bounds (seconds) of the latency buckets, from 50 us to 2.5 s
+BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25,
+    0.5, 1.0, 2.5,
+)
+
+PROFILE_REQUESTS = os.environ.get("DND_PROFILE_REQUESTS") == "1"
+PROFILE_HEADER = b"x-profile"
+PROFILE_LINES = 60
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    """Observation counts per bucket, plus their sum, for each label set."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: tuple[str, ...],
+        buckets: tuple[float, ...] = BUCKETS,
+    ):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> [count in each bucket ..., count above the last, sum]
+        self._series: dict[tuple[str, ...], list[float]] = {}
+
+    def observe(self, labels: tuple[str, ...], value: float) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def samples(self) -> Iterable[str]:
+        bounds = [f'le="{b!r}"' for b in self.buckets] + ['le="+Inf"']
+        for values, series in sorted(self._series.items()):
+            total = 0
+            for bound, count in zip(bounds, series):
+                total += count
+                yield f"{self.name}_bucket{_labels(self.labels, values, bound)} {total}"
+            yield f"{self.name}_sum{_labels(self.labels, values)} {series[-1]}"
+            yield f"{self.name}_count{_labels(self.labels, values)} {total}"
+
+
+class Counter:
+    """A running total for each label set."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...]):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values: dict[tuple[str, ...], int] = {}
+
+    def inc(self, labels: tuple[str, ...], amount: int = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self) -> Iterable[str]:
+        for values, total in sorted(self._values.items()):
+            yield f"{self.name}{_labels(self.labels, values)} {total}"
+
+
+class Gauge:
+    """Values read from ``collect`` at scrape time: ``(label values, value)`` pairs."""
+
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: tuple[str, ...],
+        collect: Callable[[], Iterable[tuple[tuple[str, ...], float]]],
+    ):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.collect = collect
+
+    def samples(self) -> Iterable[str]:
+        for values, value in self.collect():
+            yield f"{self.name}{_labels(self.labels, values)} {value}"
+
+
+class Registry:
+    """The metrics one process exposes."""
+
+    def __init__(self) -> None:
+        self._metrics: dict[str, Histogram | Counter | Gauge] = {}
+
+    def register(self, metric: M) -> M:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format (0.0.4)."""
+        lines: list[str] = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+REQUEST_SECONDS = REGISTRY.register(
+    Histogram(
+        "dnd_http_request_duration_seconds",
+        "Time to handle a request, by route.",
+        ("method", "route"),
+    )
+)
+RESPONSES = REGISTRY.register(
+    Counter(
+        "dnd_http_responses_total",
+        "Responses sent, by route and status code.",
+        ("route", "status"),
+    )
+)
+RENDER_SECONDS = REGISTRY.register(
+    Histogram("dnd_template_render_seconds", "Time to render a template, by name.", ("template",))
+)
+CALL_SECONDS = REGISTRY.register(
+    Histogram(
+        "dnd_call_duration_seconds",
+        "Time spent in combat and library functions, by name.",
+        ("function",),
+    )
+)
+
+
+def timed(name: str) -> Callable[[F], F]:
+    """Record each call's duration in ``dnd_call_duration_seconds{function=name}``."""
+    labels = (name,)
+
+    def decorator(func: F) -> F:
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                CALL_SECONDS.observe(labels, time.perf_counter() - start)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorator
+
+
+class MetricsMiddleware:
+    """Times each HTTP request and counts its response status, by route.
+
+    A pure ASGI middleware, so streamed responses pass through untouched.
+    Server-Sent Event streams are timed to their first byte, not to when
+    the viewer leaves.
+    """
+
+    def __init__(self, app: Callable, profile: bool = PROFILE_REQUESTS):
+        self.app = app
+        self.profile = profile
+        self._profiling = False
+
+    async def __call__(self, scope: dict, receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        if self.profile and not self._profiling and _wants_profile(scope):
+            await self._profiled(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+        streaming = False
+
+        async def send_wrapper(message: dict) -> None:
+            nonlocal status, streaming
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                for key, value in message.get("headers", ()):
+                    if key == b"content-type" and value.startswith(b"text/event-stream"):
+                        streaming = True
+                        _record(scope, status, time.perf_counter() - start)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if not streaming:
+                _record(scope, status, time.perf_counter() - start)
+
+    async def _profiled(self, scope: dict, receive: Callable, send: Callable) -> None:
+        """Run the request under cProfile and answer with the profile."""
+
+        async def discard(message: dict) -> None:
+            pass
+
+        profiler = cProfile.Profile()
+        self._profiling = True
+        try:
+            profiler.enable()
+            try:
+                await self.app(scope, receive, discard)
+            finally:
+                profiler.disable()
+        finally:
+            self._profiling = False
+
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(PROFILE_LINES)
+        body = out.getvalue().encode()
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-type", b"text/plain; charset=utf-8"),
+                    (b"content-length", str(len(body)).encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
+
+
+def _wants_profile(scope: dict) -> bool:
+    return any(key == PROFILE_HEADER and value == b"1" for key, value in scope["headers"])
+
+
+def _record(scope: dict, status: int, seconds: float) -> None:
+    # FastAPI puts the matched route in the scope; anything else (static files, 404s) is "other"
+    route = getattr(scope.get("route"), "path", "other")
+    REQUEST_SECONDS.observe((scope["method"], route), seconds)
+    RESPONSES.inc((route, str(status)))
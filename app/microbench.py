@@ -0,0 +1,347 @@
+"""Micro-benchmarks of single hot paths, without the web stack.
+
+Run through the benchmark CLI, by suite name::
+
+    python -m app.bench turns     # turn advance, 10 to 10,000 creatures
+    python -m app.bench lookups   # get_creature / remove_creature at 5,000
+    python -m app.bench loader    # serial vs process-pool parsing, 10k files
+    python -m app.bench parsers   # stat block parser throughput, files/s
+    python -m app.bench creatures # bytes per creature, copies per second
+    python -m app.bench journal   # per-change latency with the journal attached
+
+Each suite returns a JSON-ready dict; ``app.bench`` prints it or writes it
+with ``--out``. Latencies are per call, from ``time.perf_counter_ns``.
+"""
+from __future__ import annotations
+
+import dataclasses
+import random
+import shutil
+import tempfile
+import time
+import tracemalloc
+import uuid
+from collections.abc import Callable
+from pathlib import Path
+
+from app.models import AbilityScores, Creature, CreatureType, Encounter
+from app.services import combat
+
+TURN_SIZES = (10, 100, 1_000, 10_000)
+TURN_CALLS = 2_000
+
+
+def _stats_us(samples: list[int]) -> dict[str, float]:
+    ordered = sorted(samples)
+    n = len(ordered)
+    return {
+        "p50_us": round(ordered[n // 2] / 1000, 2),
+        "p99_us": round(ordered[min(n - 1, n * 99 // 100)] / 1000, 2),
+    }
+
+
+def _time_calls(func: Callable[[], object], calls: int) -> list[int]:
+    samples = []
+    clock = time.perf_counter_ns
+    for _ in range(calls):
+        start = clock()
+        func()
+        samples.append(clock() - start)
+    return samples
+
+
+def build_encounter(size: int, rng: random.Random) -> Encounter:
+    """An encounter of ``size`` goblins with rolled initiative."""
+    encounter = Encounter()
+    for i in range(size):
+        encounter.add_creature(
+            Creature(
+                name=f"Goblin {i + 1}",
+                creature_type=CreatureType.MONSTER,
+                max_hp=7,
+                initiative_modifier=rng.randint(-1, 4),
+            )
+        )
+    combat.roll_monster_initiative(encounter, rng)
+    return encounter
+
+
+def turns(sizes: tuple[int, ...] = TURN_SIZES, calls: int = TURN_CALLS, seed: int = 0) -> dict:
+    """``next_turn`` latency by encounter size.
+
+    ``resort_scan`` times what a turn advance cost before the order was
+    kept incrementally: sort every creature, then scan for the current one.
+    """
+    rng = random.Random(seed)
+    results = {}
+    for size in sizes:
+        encounter = build_encounter(size, rng)
+        combat.start_combat(encounter, rng)
+        advance = _stats_us(_time_calls(lambda: combat.next_turn(encounter, rng), calls))
+
+        creatures = list(encounter.creatures)
+
+        def resort_scan() -> None:
+            order = sorted(creatures, key=lambda c: (-(c.initiative_roll or 0), -c.dex_modifier))
+            current = encounter.current_creature_id
+            next(i for i, c in enumerate(order) if c.id == current)
+
+        results[str(size)] = {
+            "next_turn": advance,
+            "resort_scan": _stats_us(_time_calls(resort_scan, min(calls, 200))),
+        }
+    return {"suite": "turns", "calls": calls, "sizes": results}
+
+
+def lookups(size: int = 5_000, calls: int = 5_000, seed: int = 0) -> dict:
+    """``get_creature`` and ``remove_creature`` on a ``size``-creature encounter.
+
+    ``linear_*`` time the list scan and list rebuild they replaced.
+    """
+    rng = random.Random(seed)
+    encounter = build_encounter(size, rng)
+    ids = [c.id for c in encounter.creatures]
+    targets = [rng.choice(ids) for _ in range(calls)]
+    creatures = list(encounter.creatures)
+
+    lookup = iter(targets)
+    get = _stats_us(_time_calls(lambda: encounter.get_creature(next(lookup)), calls))
+
+    lookup = iter(targets)
+
+    def linear_get() -> None:
+        wanted = next(lookup)
+        next(c for c in creatures if c.id == wanted)
+
+    # Remove a fifth of the roster, so it stays near ``size`` throughout
+    removals = size // 5
+    victims = iter(rng.sample(ids, removals))
+    remove = _stats_us(_time_calls(lambda: encounter.remove_creature(next(victims)), removals))
+    victims = iter(rng.sample(ids, removals))
+
+    def linear_remove() -> None:
+        nonlocal creatures
+        victim = next(victims)
+        creatures = [c for c in creatures if c.id != victim]
+
+    return {
+        "suite": "lookups",
+        "creatures": size,
+        "get_creature": get,
+        "linear_get": _stats_us(_time_calls(linear_get, min(calls, 500))),
+        "remove_creature": remove,
+        "linear_remove": _stats_us(_time_calls(linear_remove, removals)),
+    }
+
+
+def loader(files: int = 10_000, seed: int = 0) -> dict:
+    """Cold library load of ``files`` synthetic monsters: serial, pooled, automatic.
+
+    ``pool`` forces each worker count; ``auto`` is what ``load_stat_files``
+    picks on this machine (serial on one CPU).
+    """
+    from app.bench import write_library
+    from app.parsers.loader import available_cpus, load_stat_files, parse_stat_files, pool_workers
+    from app.parsers.monster_md import parse_monster_md
+
+    scratch = Path(tempfile.mkdtemp(prefix="dnd-microbench-"))
+    try:
+        write_library(scratch, files, 0, seed)
+        paths = sorted((scratch / "monsters").glob("*_stats.md"))
+        parse_stat_files(paths[:50], parse_monster_md, 1)  # warm the page cache
+
+        def files_per_s(run: Callable[[], object]) -> int:
+            start = time.perf_counter()
+            run()
+            return round(len(paths) / (time.perf_counter() - start))
+
+        cpus = available_cpus()
+        pool = {
+            str(workers): files_per_s(lambda: parse_stat_files(paths, parse_monster_md, workers))
+            for workers in sorted({2, 4, cpus} - {1})
+        }
+        return {
+            "suite": "loader",
+            "files": len(paths),
+            "cpus": cpus,
+            "serial_files_per_s": files_per_s(lambda: parse_stat_files(paths, parse_monster_md, 1)),
+            "pool_files_per_s": pool,
+            "auto_workers": pool_workers(cpus, len(paths)),
+            "auto_files_per_s": files_per_s(
+                lambda: load_stat_files(paths, parse_monster_md, workers=cpus)
+            ),
+        }
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+def parsers(files: int = 2_000, repeat: int = 5, seed: int = 0) -> dict:
+    """Parser throughput on in-memory text (no file reads), best of ``repeat``.
+
+    Covers the synthetic monster and PC blocks ``app.bench`` writes and the
+    sample files in ``assets/``.
+    """
+    from app.bench import monster_stat_block, pc_stat_block
+    from app.parsers.character_md import parse_character_md
+    from app.parsers.monster_md import parse_monster_md
+
+    rng = random.Random(seed)
+    assets = Path(__file__).resolve().parent.parent / "assets"
+    corpora = {
+        "synthetic_monsters": (
+            parse_monster_md,
+            [monster_stat_block(f"Monster {i}", rng) for i in range(files)],
+        ),
+        "synthetic_pcs": (
+            parse_character_md,
+            [pc_stat_block(f"Hero {i}", rng) for i in range(files)],
+        ),
+        "asset_monsters": (
+            parse_monster_md,
+            [p.read_text(encoding="utf-8") for p in sorted((assets / "monsters").glob("*.md"))],
+        ),
+        "asset_pcs": (
+            parse_character_md,
+            [p.read_text(encoding="utf-8") for p in sorted((assets / "pcs").glob("*.md"))],
+        ),
+    }
+    results = {}
+    for name, (parse, texts) in corpora.items():
+        if not texts:
+            continue
+        # Small corpora are parsed several times over, for a stable timing
+        texts = texts * max(1, files // len(texts))
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for text in texts:
+                parse(text)
+            best = min(best, time.perf_counter() - start)
+        results[name] = {"files": len(texts), "files_per_s": round(len(texts) / best)}
+    return {"suite": "parsers", "corpora": results}
+
+
+def _unslotted(cls: type, **types: type) -> type:
+    """``cls`` as a plain dataclass, with a per-instance ``__dict__``.
+
+    Stands in for the models before they were slotted; ``types``
+    overrides field types (for nested dataclasses).
+    """
+    fields = []
+    for f in dataclasses.fields(cls):
+        if f.default is not dataclasses.MISSING:
+            spec = dataclasses.field(default=f.default)
+        elif f.default_factory is not dataclasses.MISSING:
+            spec = dataclasses.field(default_factory=types.get(f.name, f.default_factory))
+        else:
+            spec = dataclasses.field()
+        fields.append((f.name, f.type, spec))
+    return dataclasses.make_dataclass(cls.__name__, fields)
+
+
+def _bytes_each(make: Callable[[], object], count: int) -> int:
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        kept = [make() for _ in range(count)]
+        used = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    del kept
+    return round(used / count)
+
+
+def creatures(count: int = 10_000, repeat: int = 5, seed: int = 0) -> dict:
+    """Memory per creature and ``copy()`` throughput, slotted vs plain dataclasses.
+
+    Measured on a parsed synthetic monster, as ``add_monster`` copies it.
+    The plain variant copies the way ``copy()`` did before: two
+    ``dataclasses.replace`` calls and a UUID-derived id.
+    """
+    from app.bench import monster_stat_block
+    from app.parsers.monster_md import parse_monster_md
+
+    template = parse_monster_md(monster_stat_block("Ashen Ghoul", random.Random(seed)))
+    PlainAbilities = _unslotted(AbilityScores)
+    PlainCreature = _unslotted(Creature, abilities=PlainAbilities)
+    plain = PlainCreature(
+        **{
+            f.name: getattr(template, f.name)
+            for f in dataclasses.fields(Creature)
+            if f.name != "abilities"
+        },
+        abilities=PlainAbilities(**dataclasses.asdict(template.abilities)),
+    )
+
+    def plain_copy() -> object:
+        new = dataclasses.replace(plain, id=uuid.uuid4().hex[:8])
+        new.abilities = dataclasses.replace(plain.abilities)
+        return new
+
+    def copies_per_s(copy: Callable[[], object]) -> int:
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(count):
+                copy()
+            best = min(best, time.perf_counter() - start)
+        return round(count / best)
+
+    return {
+        "suite": "creatures",
+        "copies": count,
+        "slotted": {
+            "bytes_per_creature": _bytes_each(template.copy, count),
+            "copies_per_s": copies_per_s(template.copy),
+        },
+        "plain": {
+            "bytes_per_creature": _bytes_each(plain_copy, count),
+            "copies_per_s": copies_per_s(plain_copy),
+        },
+    }
+
+
+def journal(sizes: tuple[int, ...] = (20, 200), changes: int = 5_000, seed: int = 0) -> dict:
+    """Latency of one HP change with a journal and committer thread attached.
+
+    The tail (p99.9, max) includes the changes that trigger a compaction.
+    """
+    from app.services.journal import GroupCommitter, Journal
+
+    rng = random.Random(seed)
+    results = {}
+    for size in sizes:
+        scratch = Path(tempfile.mkdtemp(prefix="dnd-microbench-"))
+        committer = GroupCommitter()
+        try:
+            encounter = build_encounter(size, rng)
+            log = Journal(scratch)
+            log.attach(encounter)
+            committer.add(log)
+            roster = list(encounter.creatures)
+            step = iter(range(changes))
+
+            def change() -> None:
+                creature = rng.choice(roster)
+                encounter.update_creature(creature, "temp_hp", temp_hp=next(step))
+
+            samples = sorted(_time_calls(change, changes))
+        finally:
+            committer.close()
+            shutil.rmtree(scratch, ignore_errors=True)
+        results[str(size)] = {
+            **_stats_us(samples),
+            "p999_us": round(samples[len(samples) * 999 // 1000] / 1000, 2),
+            "max_us": round(samples[-1] / 1000, 2),
+        }
+    return {"suite": "journal", "changes": changes, "creatures": results}
+
+
+SUITES: dict[str, Callable[[], dict]] = {
+    "turns": turns,
+    "lookups": lookups,
+    "loader": loader,
+    "parsers": parsers,
+    "creatures": creatures,
+    "journal": journal,
+}
@@ -1,7 +1,12 @@
 from __future__ import annotations
 
-import uuid
+import bisect
+import dataclasses
+import hashlib
+import os
+from collections.abc import Callable, Iterable, ValuesView
 from dataclasses import dataclass, field
+from typing import Any
 from enum import Enum
 
 
@@ -10,7 +15,7 @@ class CreatureType(str, Enum):
     MONSTER = "MONSTER"
 
 
-@dataclass
+@dataclass(slots=True)
 class AbilityScores:
     strength: int = 10
     dexterity: int = 10
@@ -24,7 +29,142 @@ class AbilityScores:
         return (score - 10) // 2
 
 
-@dataclass
+def text_digest(data: bytes) -> str:
+    """Short content hash of a stat block text, stored with file references."""
+    return hashlib.blake2b(data, digest_size=8).hexdigest()
+
+
+class SourceText:
+    """Long stat block text (traits, actions) kept on disk until needed.
+
+    Holds the source file, the byte range of the text and a digest of those
+    bytes. The text is read on first use and then shared by a library
+    template and all its copies. If the file has changed since it was
+    parsed (the digest no longer matches), the text reads as empty rather
+    than as whatever the range now holds.
+    """
+
+    __slots__ = ("path", "start", "end", "summary", "digest", "_text")
+
+    def __init__(
+        self,
+        path: str | None,
+        start: int,
+        end: int,
+        summary: str = "",
+        text: str | None = None,
+        digest: str | None = None,
+    ) -> None:
+        self.path = path
+        self.start = start
+        self.end = end
+        self.summary = summary  # e.g. feature names: "Scimitar, Shortbow"
+        self.digest = digest
+        self._text = text
+
+    @classmethod
+    def from_string(cls, text: str, summary: str = "") -> SourceText:
+        """Wrap text that has no backing file (e.g. an uploaded stat block)."""
+        return cls(None, 0, len(text), summary, text)
+
+    @classmethod
+    def in_file(cls, path: str, start: int, end: int, text: str, summary: str = "") -> SourceText:
+        """Reference ``text``, found at bytes ``start:end`` of ``path``, without keeping it."""
+        return cls(path, start, end, summary, digest=text_digest(text.encode("utf-8")))
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            try:
+                with open(self.path, "rb") as f:
+                    f.seek(self.start)
+                    data = f.read(self.end - self.start)
+            except (OSError, TypeError):
+                return ""
+            if self.digest is not None and text_digest(data) != self.digest:
+                return ""  # edited since: not cached, the edit may be undone
+            self._text = data.decode("utf-8", errors="replace")
+        return self._text
+
+    def __str__(self) -> str:
+        return self.text
+
+    def __bool__(self) -> bool:
+        return self.end > self.start
+
+    def to_dict(self) -> dict:
+        if self.path is None:
+            return {"text": self.text, "summary": self.summary}
+        return {
+            "path": self.path,
+            "start": self.start,
+            "end": self.end,
+            "summary": self.summary,
+            "digest": self.digest,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> SourceText:
+        if "text" in data:
+            return cls.from_string(data["text"], data["summary"])
+        # References saved before digests existed are read unchecked
+        return cls(
+            data["path"], data["start"], data["end"], data["summary"], digest=data.get("digest")
+        )
+
+
+def _new_id() -> str:
+    return os.urandom(4).hex()
+
+
+@dataclass(frozen=True, slots=True)
+class Effect:
+    """A condition or timed effect on a creature ("Poisoned", "Bless").
+
+    It expires at the start or end of ``expires_on``'s turn in round
+    ``expires_round`` (both None: until removed). ``source_id`` is the
+    creature that caused it; with ``concentration`` set, it ends when
+    that creature's concentration breaks. ``on_turn`` ("start"/"end")
+    makes it trigger on the bearer's own turn: ``damage`` (a dice
+    expression) is dealt then, and ``note`` is a reminder such as
+    "CON save DC 13 ends".
+    """
+
+    name: str
+    expires_round: int | None = None
+    expires_on: str | None = None
+    expires_at: str = "start"
+    source_id: str | None = None
+    concentration: bool = False
+    on_turn: str = ""
+    damage: str = ""
+    note: str = ""
+    id: str = field(default_factory=_new_id)
+
+    @property
+    def expiry(self) -> tuple[int, str, str] | None:
+        """(round, creature id, "start"/"end"): the turn slot it expires in."""
+        if self.expires_round is None or self.expires_on is None:
+            return None
+        return self.expires_round, self.expires_on, self.expires_at
+
+    def to_dict(self) -> dict:
+        return {f.name: getattr(self, f.name) for f in dataclasses.fields(self)}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> Effect:
+        return cls(**data)
+
+
+def _effects_to_dicts(effects: tuple[Effect, ...] | None) -> list[dict] | None:
+    return None if effects is None else [e.to_dict() for e in effects]
+
+
+def _effects_from_dicts(data: list[dict] | None) -> tuple[Effect, ...] | None:
+    return None if data is None else tuple(Effect.from_dict(e) for e in data)
+
+
+@dataclass(slots=True)
 class Creature:
     name: str
     creature_type: CreatureType
@@ -39,11 +179,21 @@ class Creature:
     initiative_roll: int | None = None
     passive_perception: int = 10
     challenge_rating: str = ""
+    # Monster HP formula from the stat block (e.g. "2d6"), for rolled HP
+    hit_dice: str = ""
     death_save_successes: int = 0
     death_save_failures: int = 0
-    traits: str = ""
-    actions: str = ""
-    id: str = field(default_factory=lambda: uuid.uuid4().hex[:8])
+    # Legendary actions per round (from the stat block), and used since its turn
+    legendary_actions: int = 0
+    legendary_used: int = 0
+    # Holding its turn: out of the turn order until it acts
+    delayed: bool = False
+    # Monsters hold SourceText references, shared by all copies
+    traits: str | SourceText = ""
+    actions: str | SourceText = ""
+    # Conditions and timed effects; replaced as a whole on every change
+    effects: tuple[Effect, ...] = ()
+    id: str = field(default_factory=_new_id)
 
     def __post_init__(self) -> None:
         if self.current_hp == 0:
@@ -70,48 +220,596 @@ class Creature:
         return self.death_save_failures >= 3
 
     def copy(self) -> Creature:
-        """Create a copy with a new ID."""
-        import dataclasses
-        new = dataclasses.replace(self)
-        new.id = uuid.uuid4().hex[:8]
-        new.abilities = dataclasses.replace(self.abilities)
-        new.initiative_roll = None
-        new.current_hp = new.max_hp
-        new.temp_hp = 0
-        new.death_save_successes = 0
-        new.death_save_failures = 0
-        return new
+        """Create a copy with a new ID and fresh combat state."""
+        a = self.abilities
+        return Creature(
+            name=self.name,
+            creature_type=self.creature_type,
+            description=self.description,
+            armor_class=self.armor_class,
+            max_hp=self.max_hp,
+            current_hp=self.max_hp,
+            speed=self.speed,
+            abilities=AbilityScores(
+                a.strength,
+                a.dexterity,
+                a.constitution,
+                a.intelligence,
+                a.wisdom,
+                a.charisma,
+            ),
+            initiative_modifier=self.initiative_modifier,
+            passive_perception=self.passive_perception,
+            challenge_rating=self.challenge_rating,
+            hit_dice=self.hit_dice,
+            legendary_actions=self.legendary_actions,
+            traits=self.traits,
+            actions=self.actions,
+        )
+
+    def to_dict(self) -> dict:
+        """Plain JSON-serializable representation of all fields."""
+        # Field by field: dataclasses.fields/asdict cost more than the copy
+        data = {name: getattr(self, name) for name in _CREATURE_FIELDS}
+        data["creature_type"] = self.creature_type.value
+        abilities = self.abilities
+        data["abilities"] = {name: getattr(abilities, name) for name in _ABILITY_FIELDS}
+        for name in ("traits", "actions"):
+            value = getattr(self, name)
+            if isinstance(value, SourceText):
+                data[name] = value.to_dict()
+        data["effects"] = _effects_to_dicts(self.effects)
+        return data
+
+    @classmethod
+    def from_dict(cls, data: dict) -> Creature:
+        data = dict(data)
+        data["creature_type"] = CreatureType(data["creature_type"])
+        data["abilities"] = AbilityScores(**data["abilities"])
+        for name in ("traits", "actions"):
+            if isinstance(data.get(name), dict):
+                data[name] = SourceText.from_dict(data[name])
+        data["effects"] = _effects_from_dicts(data.get("effects", []))
+        creature = cls(**data)
+        creature.current_hp = data["current_hp"]  # __post_init__ resets 0 HP
+        return creature
+
+
+_CREATURE_FIELDS = tuple(f.name for f in dataclasses.fields(Creature))
+_ABILITY_FIELDS = tuple(f.name for f in dataclasses.fields(AbilityScores))
+
+# Schedule entry id of the lair action, which is not a creature
+LAIR_ID = "lair"
+# Fields whose change can move a creature into or out of the turn schedule
+_SCHEDULE_FIELDS = frozenset({"current_hp", "death_save_failures", "delayed"})
+# Encounter fields that say whose turn it is
+_TURN_FIELDS = ("current_creature_id", "turn_index", "turn_phase", "resume_after")
+
+
+def _lair_key(initiative: int) -> tuple[int, int, int]:
+    """Schedule key of the lair action: loses initiative ties to every creature."""
+    return (-initiative, 1_000, 0)
+
+
+def _initiative_key(creature: Creature, seq: int) -> tuple[int, int, int]:
+    """Ascending sort key for initiative order (highest roll first).
+
+    Ties on roll are broken by DEX modifier, then by insertion order.
+    """
+    roll = creature.initiative_roll if creature.initiative_roll is not None else -100
+    return (-roll, -creature.dex_modifier, seq)
+
+
+@dataclass(slots=True)
+class Change:
+    """One encounter mutation, as a delta: field -> (old value, new value).
+
+    ``creature_id`` is None for encounter-level fields (turn, round, ...).
+    Adding or removing a creature is recorded as a change of the pseudo
+    field ``"creature"`` between None and the creature's ``to_dict()``, and
+    of ``"seq"``, its position among initiative ties. ``"effects"`` values
+    are tuples of Effect, stored as lists of dicts.
+    """
+
+    op: str
+    creature_id: str | None
+    fields: dict[str, tuple[Any, Any]]
+
+    def to_dict(self) -> dict:
+        fields = {k: list(v) for k, v in self.fields.items()}
+        if "effects" in fields:
+            fields["effects"] = [_effects_to_dicts(v) for v in fields["effects"]]
+        return {"op": self.op, "id": self.creature_id, "fields": fields}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> Change:
+        fields = {k: tuple(v) for k, v in data["fields"].items()}
+        if "effects" in fields:
+            fields["effects"] = tuple(_effects_from_dicts(v) for v in fields["effects"])
+        return cls(data["op"], data["id"], fields)
+
+
+ChangeListener = Callable[[Change], None]
 
 
 @dataclass
 class Encounter:
-    creatures: list[Creature] = field(default_factory=list)
+    # Whose turn it is: a creature id, or LAIR_ID for the lair action
     current_creature_id: str | None = None
     round_number: int = 0
     is_active: bool = False
+    # Position of the current entry in the turn schedule
+    turn_index: int = 0
+    # Initiative count of the lair action; None when there is no lair
+    lair_initiative: int | None = None
+    # "legendary": the current creature's turn is over and legendary
+    # creatures may act before the next entry; "" otherwise
+    turn_phase: str = ""
+    # While a delayed creature takes its turn out of order: the entry whose
+    # turn it followed, and after which the round continues
+    resume_after: str | None = None
+    # Bumped on every change; listeners are told about each one
+    version: int = 0
+    _listeners: list[ChangeListener] = field(
+        default_factory=list, init=False, repr=False
+    )
+    # Initiative order is maintained incrementally: creatures sorted by
+    # _initiative_key, with a parallel list of keys for bisect lookups.
+    _order: list[Creature] = field(default_factory=list, init=False, repr=False)
+    _order_keys: list[tuple[int, int, int]] = field(
+        default_factory=list, init=False, repr=False
+    )
+    # Creature roster indexed by id; dict order is the order creatures were
+    # added, so removal is O(1) and needs no list rebuild.
+    _by_id: dict[str, Creature] = field(default_factory=dict, init=False, repr=False)
+    # id -> insertion sequence number (last initiative tiebreaker)
+    _seq: dict[str, int] = field(default_factory=dict, init=False, repr=False)
+    _next_seq: int = field(default=0, init=False, repr=False)
+    # Turn schedule: the ids of the entries that get a turn (living, not
+    # delayed creatures, plus the lair action) in initiative order, with a
+    # parallel key list. Kept up to date on every change that affects it,
+    # so advancing a turn is an index step.
+    _schedule: list[str] = field(default_factory=list, init=False, repr=False)
+    _schedule_keys: list[tuple[int, int, int]] = field(
+        default_factory=list, init=False, repr=False
+    )
+    _scheduled: dict[str, tuple[int, int, int]] = field(
+        default_factory=dict, init=False, repr=False
+    )
+    # Ids of creatures with legendary actions
+    _legendary: dict[str, None] = field(default_factory=dict, init=False, repr=False)
+    # Effect expiry wheel: one slot per turn boundary, (round, creature id,
+    # "start"/"end") -> (bearer id, effect id) of the effects expiring then.
+    # Advancing a turn pops two slots instead of looking at every effect.
+    _due: dict[tuple[int, str, str], dict[tuple[str, str], None]] = field(
+        default_factory=dict, init=False, repr=False
+    )
+    # Concentrating creature id -> (bearer id, effect id) of its effects
+    _concentration: dict[str, dict[tuple[str, str], None]] = field(
+        default_factory=dict, init=False, repr=False
+    )
+
+    @property
+    def creatures(self) -> ValuesView[Creature]:
+        """All creatures in the order they were added (read-only view).
+
+        Use ``add_creature``/``remove_creature`` to change the roster.
+        """
+        return self._by_id.values()
 
     @property
     def initiative_order(self) -> list[Creature]:
-        return sorted(
-            self.creatures,
-            key=lambda c: (
-                c.initiative_roll if c.initiative_roll is not None else -100,
-                c.dex_modifier,
-            ),
-            reverse=True,
-        )
+        """Creatures sorted by initiative (do not mutate the returned list)."""
+        return self._order
 
     @property
     def current_creature(self) -> Creature | None:
         if self.current_creature_id is None:
             return None
-        for c in self.creatures:
-            if c.id == self.current_creature_id:
-                return c
-        return None
+        return self._by_id.get(self.current_creature_id)
 
     def get_creature(self, creature_id: str) -> Creature | None:
-        for c in self.creatures:
-            if c.id == creature_id:
-                return c
-        return None
+        return self._by_id.get(creature_id)
+
+    @property
+    def schedule(self) -> list[str]:
+        """Entry ids that get a turn, in order (do not mutate the returned list)."""
+        return self._schedule
+
+    @property
+    def lair_index(self) -> int | None:
+        """Where the lair action falls in ``initiative_order``, if there is one."""
+        if self.lair_initiative is None:
+            return None
+        return bisect.bisect_left(self._order_keys, _lair_key(self.lair_initiative))
+
+    def schedule_index(self, entry_id: str) -> int:
+        """Position of an entry in the schedule (where it would go, if it is out)."""
+        key = self._entry_key(entry_id)
+        return 0 if key is None else bisect.bisect_left(self._schedule_keys, key)
+
+    def is_scheduled(self, entry_id: str | None) -> bool:
+        return entry_id in self._scheduled
+
+    def legendary_candidates(self) -> list[Creature]:
+        """Legendary creatures that may act at the end of the current turn."""
+        found = []
+        for creature_id in self._legendary:
+            creature = self._by_id[creature_id]
+            if (
+                creature_id != self.current_creature_id
+                and creature_id in self._scheduled
+                and creature.legendary_used < creature.legendary_actions
+            ):
+                found.append(creature)
+        return found
+
+    def subscribe(self, listener: ChangeListener) -> None:
+        """Call ``listener`` with every Change made through this encounter."""
+        self._listeners.append(listener)
+
+    def unsubscribe(self, listener: ChangeListener) -> None:
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def _emit(self, change: Change) -> None:
+        self.version += 1
+        for listener in self._listeners:
+            listener(change)
+
+    def update_creature(self, creature: Creature, op: str, **values: Any) -> None:
+        """Set fields on one of this encounter's creatures and record the change.
+
+        Initiative rolls must go through ``set_initiative`` instead.
+        """
+        fields = {}
+        for name, new in values.items():
+            old = getattr(creature, name)
+            if old != new:
+                fields[name] = (old, new)
+                setattr(creature, name, new)
+        if "effects" in fields:
+            self._index_effects(creature.id, *fields["effects"])
+        if "legendary_actions" in fields:
+            self._index_legendary(creature)
+        if not _SCHEDULE_FIELDS.isdisjoint(fields):
+            self._reschedule(creature)
+        if fields:
+            self._emit(Change(op, creature.id, fields))
+
+    def update_state(self, op: str, **values: Any) -> None:
+        """Set encounter-level fields (round, turn, ...) and record the change."""
+        fields = {}
+        for name, new in values.items():
+            old = getattr(self, name)
+            if old != new:
+                fields[name] = (old, new)
+                setattr(self, name, new)
+        if "lair_initiative" in fields:
+            self._schedule_remove(LAIR_ID)
+            if self.lair_initiative is not None:
+                self._schedule_insert(LAIR_ID, _lair_key(self.lair_initiative))
+            self._sync_turn_index()
+        if fields:
+            self._emit(Change(op, None, fields))
+
+    def _index_effects(
+        self, creature_id: str, old: tuple[Effect, ...], new: tuple[Effect, ...]
+    ) -> None:
+        """Re-index a creature's effects after they changed from ``old`` to ``new``."""
+        for effect in old:
+            if effect in new:
+                continue
+            key = (creature_id, effect.id)
+            for index, slot in ((self._due, effect.expiry), (self._concentration, effect.source_id)):
+                entries = index.get(slot)
+                if entries is not None:
+                    entries.pop(key, None)
+                    if not entries:
+                        del index[slot]
+        for effect in new:
+            if effect in old:
+                continue
+            key = (creature_id, effect.id)
+            if effect.expiry is not None:
+                self._due.setdefault(effect.expiry, {})[key] = None
+            if effect.concentration and effect.source_id is not None:
+                self._concentration.setdefault(effect.source_id, {})[key] = None
+
+    def _resolve(self, keys: Iterable[tuple[str, str]]) -> list[tuple[Creature, Effect]]:
+        found = []
+        for creature_id, effect_id in keys:
+            creature = self._by_id.get(creature_id)
+            if creature is not None:
+                found.extend((creature, e) for e in creature.effects if e.id == effect_id)
+        return found
+
+    def pop_due_effects(
+        self, round_number: int, creature_id: str, at: str
+    ) -> list[tuple[Creature, Effect]]:
+        """Take the effects expiring at the "start"/"end" of a turn out of the wheel."""
+        return self._resolve(self._due.pop((round_number, creature_id, at), ()))
+
+    def expiring_on(self, creature_id: str) -> list[tuple[Creature, Effect]]:
+        """(bearer, effect) for every effect that expires on ``creature_id``'s turn."""
+        return self._resolve(
+            key for slot, keys in self._due.items() if slot[1] == creature_id for key in keys
+        )
+
+    def pop_overdue_effects(self, round_number: int) -> list[tuple[Creature, Effect]]:
+        """Take the effects due before ``round_number`` out of the wheel.
+
+        Only left there when the creature whose turn they expire on never
+        took it (it delayed through the round).
+        """
+        overdue = [slot for slot in self._due if slot[0] < round_number]
+        return self._resolve(key for slot in overdue for key in self._due.pop(slot))
+
+    def concentration_effects(self, source_id: str) -> list[tuple[Creature, Effect]]:
+        """(bearer, effect) for every effect ``source_id`` concentrates on."""
+        return self._resolve(self._concentration.get(source_id, ()))
+
+    def _index_legendary(self, creature: Creature) -> None:
+        if creature.legendary_actions > 0 and creature.id in self._by_id:
+            self._legendary[creature.id] = None
+        else:
+            self._legendary.pop(creature.id, None)
+
+    def _key(self, creature: Creature) -> tuple[int, int, int]:
+        return _initiative_key(creature, self._seq[creature.id])
+
+    def _entry_key(self, entry_id: str) -> tuple[int, int, int] | None:
+        if entry_id == LAIR_ID:
+            return None if self.lair_initiative is None else _lair_key(self.lair_initiative)
+        creature = self._by_id.get(entry_id)
+        return None if creature is None else self._key(creature)
+
+    def _order_index(self, creature: Creature) -> int:
+        return bisect.bisect_left(self._order_keys, self._key(creature))
+
+    def _insert_ordered(self, creature: Creature) -> None:
+        key = self._key(creature)
+        idx = bisect.bisect_left(self._order_keys, key)
+        self._order_keys.insert(idx, key)
+        self._order.insert(idx, creature)
+        if not creature.delayed and not creature.is_dead:
+            self._schedule_insert(creature.id, key)
+
+    def _remove_ordered(self, creature: Creature) -> None:
+        idx = self._order_index(creature)
+        del self._order_keys[idx]
+        del self._order[idx]
+        self._schedule_remove(creature.id)
+
+    def _schedule_insert(self, entry_id: str, key: tuple[int, int, int]) -> None:
+        idx = bisect.bisect_left(self._schedule_keys, key)
+        self._schedule_keys.insert(idx, key)
+        self._schedule.insert(idx, entry_id)
+        self._scheduled[entry_id] = key
+
+    def _schedule_remove(self, entry_id: str) -> None:
+        key = self._scheduled.pop(entry_id, None)
+        if key is not None:
+            idx = bisect.bisect_left(self._schedule_keys, key)
+            del self._schedule_keys[idx]
+            del self._schedule[idx]
+
+    def _reschedule(self, creature: Creature) -> None:
+        """Put a creature in or out of the schedule as it dies, revives or delays."""
+        wanted = not creature.delayed and not creature.is_dead and creature.id in self._by_id
+        if wanted == (creature.id in self._scheduled):
+            return
+        if wanted:
+            self._schedule_insert(creature.id, self._key(creature))
+        else:
+            self._schedule_remove(creature.id)
+        self._sync_turn_index()
+
+    def rebuild_order(self) -> None:
+        """Fully re-sort the initiative order (after bulk initiative changes)."""
+        pairs = sorted((self._key(c), c) for c in self.creatures)
+        self._order_keys = [k for k, _ in pairs]
+        self._order = [c for _, c in pairs]
+        entries = [(k, c.id) for k, c in pairs if not c.delayed and not c.is_dead]
+        if self.lair_initiative is not None:
+            entries.append((_lair_key(self.lair_initiative), LAIR_ID))
+            entries.sort()
+        self._schedule_keys = [k for k, _ in entries]
+        self._schedule = [i for _, i in entries]
+        self._scheduled = dict((i, k) for k, i in entries)
+        self._sync_turn_index()
+
+    def _sync_turn_index(self) -> None:
+        """Point ``turn_index`` at the current entry (or, if it is out of the
+        schedule, at the entry that follows it)."""
+        entry = self.resume_after or self.current_creature_id
+        key = self._entry_key(entry) if entry is not None else None
+        if key is not None:
+            self.turn_index = bisect.bisect_left(self._schedule_keys, key)
+
+    def set_turn(self, index: int, op: str = "turn", **values: Any) -> None:
+        """Give the turn to the entry at ``index`` in the schedule.
+
+        Extra encounter fields (e.g. ``round_number``) change along with it.
+        """
+        self.update_state(
+            op,
+            turn_index=index,
+            current_creature_id=self._schedule[index],
+            turn_phase="",
+            resume_after=None,
+            **values,
+        )
+
+    def set_current(self, creature_id: str | None, op: str = "turn", **values: Any) -> None:
+        """Give the turn to an entry by id (None: nobody).
+
+        ``resume_after`` among ``values`` makes it an out-of-order turn.
+        """
+        if creature_id is not None and self._entry_key(creature_id) is None:
+            creature_id = None
+        entry = values.get("resume_after") or creature_id
+        self.update_state(
+            op,
+            turn_index=self.schedule_index(entry) if entry is not None else 0,
+            current_creature_id=creature_id,
+            **values,
+        )
+
+    def add_creature(self, creature: Creature, seq: int | None = None) -> None:
+        """Add a creature; ``seq`` restores its place among initiative ties."""
+        self._attach(creature, seq)
+        self._emit(
+            Change(
+                "add",
+                creature.id,
+                {"creature": (None, creature.to_dict()), "seq": (None, self._seq[creature.id])},
+            )
+        )
+
+    def _attach(self, creature: Creature, seq: int | None = None) -> None:
+        self._by_id[creature.id] = creature
+        if seq is None:
+            seq = self._next_seq
+        self._seq[creature.id] = seq
+        if seq < self._next_seq - 1:
+            # Restored (undo of a removal): back to its place in the roster
+            self._by_id = dict(sorted(self._by_id.items(), key=lambda i: self._seq[i[0]]))
+        self._next_seq = max(self._next_seq, seq + 1)
+        self._index_effects(creature.id, (), creature.effects)
+        self._index_legendary(creature)
+        self._insert_ordered(creature)
+        self._sync_turn_index()
+
+    def remove_creature(self, creature_id: str) -> None:
+        creature = self._by_id.pop(creature_id, None)
+        if creature is None:
+            return
+        key = self._key(creature)
+        self._remove_ordered(creature)
+        seq = self._seq.pop(creature_id)
+        self._index_effects(creature_id, creature.effects, ())
+        self._legendary.pop(creature_id, None)
+
+        # The turn moves along with the removal; what moved is recorded as
+        # a turn change right after it
+        turn = {name: getattr(self, name) for name in _TURN_FIELDS}
+        if creature_id == self.current_creature_id:
+            # The entry that followed in the schedule takes over the turn
+            entry = self.resume_after or creature_id
+            entry_key = key if entry == creature_id else self._entry_key(entry)
+            if self._schedule and entry_key is not None:
+                idx = bisect.bisect_right(self._schedule_keys, entry_key) % len(self._schedule)
+                self.turn_index = idx
+                self.current_creature_id = self._schedule[idx]
+            else:
+                self.turn_index = 0
+                self.current_creature_id = None
+            self.turn_phase = ""
+            self.resume_after = None
+        else:
+            if creature_id == self.resume_after:
+                # Continue after the entry before it instead
+                idx = bisect.bisect_left(self._schedule_keys, key)
+                self.resume_after = self._schedule[idx - 1] if idx > 0 else None
+            self._sync_turn_index()
+        self._emit(
+            Change(
+                "remove",
+                creature_id,
+                {"creature": (creature.to_dict(), None), "seq": (seq, None)},
+            )
+        )
+        moved = {
+            name: (old, getattr(self, name))
+            for name, old in turn.items()
+            if getattr(self, name) != old
+        }
+        if moved:
+            self._emit(Change("turn", None, moved))
+
+    def set_initiative(self, creature_id: str, value: int | None) -> None:
+        """Change one creature's initiative roll, repositioning it in order."""
+        creature = self.get_creature(creature_id)
+        if creature is None or creature.initiative_roll == value:
+            return
+        old = creature.initiative_roll
+        self._remove_ordered(creature)
+        creature.initiative_roll = value
+        self._insert_ordered(creature)
+        self._sync_turn_index()
+        self._emit(Change("initiative", creature_id, {"initiative_roll": (old, value)}))
+
+    def set_initiatives(self, rolls: dict[str, int | None]) -> None:
+        """Set many initiative rolls at once, re-sorting the order only once."""
+        changes = []
+        for creature_id, value in rolls.items():
+            creature = self.get_creature(creature_id)
+            if creature is not None and creature.initiative_roll != value:
+                changes.append(
+                    Change(
+                        "initiative",
+                        creature_id,
+                        {"initiative_roll": (creature.initiative_roll, value)},
+                    )
+                )
+                creature.initiative_roll = value
+        self.rebuild_order()
+        for change in changes:
+            self._emit(change)
+
+    def apply_change(self, change: Change) -> None:
+        """Re-apply a recorded change (used to replay a journal)."""
+        if change.creature_id is None:
+            self.update_state(
+                change.op, **{k: new for k, (_, new) in change.fields.items()}
+            )
+            return
+        if "creature" in change.fields:
+            _, new = change.fields["creature"]
+            if new is None:
+                self.remove_creature(change.creature_id)
+            elif self.get_creature(change.creature_id) is None:
+                seq = change.fields.get("seq", (None, None))[1]
+                self.add_creature(Creature.from_dict(new), seq)
+            return
+        if "initiative_roll" in change.fields:
+            self.set_initiative(change.creature_id, change.fields["initiative_roll"][1])
+            return
+        creature = self.get_creature(change.creature_id)
+        if creature is not None:
+            self.update_creature(
+                creature, change.op, **{k: new for k, (_, new) in change.fields.items()}
+            )
+
+    def to_dict(self) -> dict:
+        """Snapshot of the whole encounter (creatures in the order added)."""
+        return {
+            "version": self.version,
+            "current_creature_id": self.current_creature_id,
+            "round_number": self.round_number,
+            "is_active": self.is_active,
+            "lair_initiative": self.lair_initiative,
+            "turn_phase": self.turn_phase,
+            "resume_after": self.resume_after,
+            "creatures": [c.to_dict() for c in self.creatures],
+            "seqs": [self._seq[c.id] for c in self.creatures],
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> Encounter:
+        encounter = cls(
+            current_creature_id=data["current_creature_id"],
+            round_number=data["round_number"],
+            is_active=data["is_active"],
+            lair_initiative=data.get("lair_initiative"),
+            turn_phase=data.get("turn_phase", ""),
+            resume_after=data.get("resume_after"),
+            version=data["version"],
+        )
+        # Snapshots written before "seqs" existed: ties fall back to roster order
+        seqs = data.get("seqs") or [None] * len(data["creatures"])
+        for c, seq in zip(data["creatures"], seqs):
+            encounter._attach(Creature.from_dict(c), seq)
+        encounter.rebuild_order()
+        return encounter
@@ -0,0 +1,131 @@
+"""On-disk cache of parsed stat blocks.
+
+Entries are keyed by file path and validated against the file's mtime and
+size; when those change, the content hash decides whether the file really
+needs to be parsed again. Parsed creatures are stored as JSON rows in SQLite.
+A database that cannot be read is deleted and started over, as everything
+in it can be parsed again.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import sqlite3
+from pathlib import Path
+
+from app.models import Creature
+from app.parsers.loader import ParsedFile, content_digest
+
+log = logging.getLogger(__name__)
+
+# Bump when parser output changes so stale entries are discarded.
+PARSER_VERSION = 5
+
+
+class StatBlockCache:
+    """Parse cache for ``*_stats.md`` files, one row per file."""
+
+    def __init__(self, db_path: Path, rebuild: bool = False) -> None:
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            self._open(db_path, rebuild)
+        except sqlite3.DatabaseError:
+            log.warning("Parse cache %s is unreadable; starting a new one", db_path)
+            self.conn.close()
+            for path in (db_path, db_path.with_name(db_path.name + "-journal")):
+                path.unlink(missing_ok=True)
+            self._open(db_path, rebuild=True)
+        self.hits = 0
+        self.misses = 0
+
+    def _open(self, db_path: Path, rebuild: bool) -> None:
+        self.conn = sqlite3.connect(db_path)
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS statblocks (
+                path TEXT PRIMARY KEY,
+                mtime_ns INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                digest BLOB NOT NULL,
+                creature TEXT NOT NULL
+            );
+            """
+        )
+        row = self.conn.execute(
+            "SELECT value FROM meta WHERE key = 'parser_version'"
+        ).fetchone()
+        if rebuild or row is None or int(row[0]) != PARSER_VERSION:
+            self.clear()
+        # Read the whole table once; a warm start then needs one stat per file
+        self._rows = {
+            row[0]: row[1:]
+            for row in self.conn.execute(
+                "SELECT path, mtime_ns, size, digest, creature FROM statblocks"
+            )
+        }
+
+    def clear(self) -> None:
+        """Drop every cached entry."""
+        self.conn.execute("DELETE FROM statblocks")
+        self._rows = {}
+        self.conn.execute(
+            "INSERT OR REPLACE INTO meta VALUES ('parser_version', ?)",
+            (str(PARSER_VERSION),),
+        )
+        self.conn.commit()
+
+    def get(self, path: Path) -> Creature | None:
+        """Return the cached creature for ``path``, or None if it changed."""
+        key = os.path.abspath(path)
+        row = self._rows.get(key)
+        if row is None:
+            self.misses += 1
+            return None
+        st = os.stat(key)
+        if row[0] == st.st_mtime_ns and row[1] == st.st_size:
+            self.hits += 1
+            return Creature.from_dict(json.loads(row[3]))
+
+        if content_digest(path.read_bytes()) == row[2]:
+            # Touched but not edited: keep the parsed result, refresh the stat
+            self._rows[key] = (st.st_mtime_ns, st.st_size, *row[2:])
+            self.conn.execute(
+                "UPDATE statblocks SET mtime_ns = ?, size = ? WHERE path = ?",
+                (st.st_mtime_ns, st.st_size, key),
+            )
+            self.hits += 1
+            return Creature.from_dict(json.loads(row[3]))
+        self.misses += 1
+        return None
+
+    def put(self, path: Path, parsed: ParsedFile) -> None:
+        key = os.path.abspath(path)
+        row = (
+            parsed.mtime_ns,
+            parsed.size,
+            parsed.digest,
+            json.dumps(parsed.creature.to_dict(), separators=(",", ":")),
+        )
+        self._rows[key] = row
+        self.conn.execute(
+            "INSERT OR REPLACE INTO statblocks VALUES (?, ?, ?, ?, ?)", (key, *row)
+        )
+
+    def prune(self, directory: Path, keep: list[Path]) -> None:
+        """Forget cached files under ``directory`` that are not in ``keep``."""
+        prefix = os.path.abspath(directory) + os.sep
+        kept = {os.path.abspath(p) for p in keep}
+        stale = [
+            key for key in self._rows if key.startswith(prefix) and key not in kept
+        ]
+        for key in stale:
+            del self._rows[key]
+        self.conn.executemany(
+            "DELETE FROM statblocks WHERE path = ?", [(key,) for key in stale]
+        )
+
+    def close(self) -> None:
+        self.conn.commit()
+        self.conn.close()
@@ -3,52 +3,44 @@ from __future__ import annotations
 
 import re
 from pathlib import Path
+from typing import TYPE_CHECKING
 
+from app.metrics import timed
 from app.models import AbilityScores, Creature, CreatureType
+from app.parsers.loader import load_stat_files
+from app.parsers.statblock import parse_stat_block
 
+if TYPE_CHECKING:
+    from app.parsers.cache import StatBlockCache
 
-def parse_character_md(text: str) -> Creature:
-    """Parse a PC markdown stat block into a Creature."""
-    # Name from ## heading
-    name_match = re.search(r"^##\s+(.+)$", text, re.MULTILINE)
-    name = name_match.group(1).strip() if name_match else "Unknown PC"
 
-    # AC
-    ac_match = re.search(r"\*\*Armor Class:\*\*\s*(\d+)", text)
-    ac = int(ac_match.group(1)) if ac_match else 10
+def parse_character_md(text: str, source: Path | None = None) -> Creature:
+    """Parse a PC markdown stat block into a Creature.
 
-    # HP (first number)
-    hp_match = re.search(r"\*\*Hit Points:\*\*\s*(\d+)", text)
-    hp = int(hp_match.group(1)) if hp_match else 1
-
-    # Speed
-    speed_match = re.search(r"\*\*Speed:\*\*\s*(.+?)(?:\n|$)", text)
-    speed = speed_match.group(1).strip() if speed_match else "30 ft."
+    ``source`` is accepted for symmetry with ``parse_monster_md``; PC sheets
+    have no long text sections to reference.
+    """
+    block = parse_stat_block(text)
 
-    # Ability scores from table row: | 12 (+1) | 15 (+2) | ...
     abilities = AbilityScores()
-    score_row = re.search(
-        r"^\|.*\(\s*[+-]\d+\s*\).*\|$", text, re.MULTILINE
-    )
-    if score_row:
-        scores = [int(s) for s in re.findall(r"(\d+)\s*\([+-]", score_row.group())]
-        if len(scores) == 6:
-            abilities = AbilityScores(*scores)
+    if block.ability_scores is not None and len(block.ability_scores) == 6:
+        abilities = AbilityScores(*block.ability_scores)
 
     # Initiative modifier (explicit for PCs — may differ from DEX mod)
-    init_match = re.search(r"\*\*Initiative Modifier:\*\*\s*([+-]?\d+)", text)
-    initiative = int(init_match.group(1)) if init_match else AbilityScores.modifier(abilities.dexterity)
+    initiative = block.initiative_modifier
+    if initiative is None:
+        initiative = AbilityScores.modifier(abilities.dexterity)
 
-    # Passive Perception
-    pp_match = re.search(r"\*\*Passive Perception:\*\*\s*(\d+)", text)
-    passive = int(pp_match.group(1)) if pp_match else 10 + AbilityScores.modifier(abilities.wisdom)
+    passive = block.passive_perception
+    if passive is None:
+        passive = 10 + AbilityScores.modifier(abilities.wisdom)
 
     return Creature(
-        name=name,
+        name=block.name or "Unknown PC",
         creature_type=CreatureType.PC,
-        armor_class=ac,
-        max_hp=hp,
-        speed=speed,
+        armor_class=block.armor_class if block.armor_class is not None else 10,
+        max_hp=block.hit_points if block.hit_points is not None else 1,
+        speed=block.speed if block.speed is not None else "30 ft.",
         abilities=abilities,
         initiative_modifier=initiative,
         passive_perception=passive,
@@ -61,22 +53,40 @@ def _extract_level(filename: str) -> int:
     return int(match.group(1)) if match else 0
 
 
-def load_all_pcs(pcs_dir: Path) -> None:
-    """Load all .md files from pcs directory into PC library.
+def select_pcs(files: dict[Path, Creature]) -> dict[str, Creature]:
+    """Library entries for parsed PC files: name -> creature.
 
-    When multiple files share the same character name (## heading),
-    only the highest-level file is kept.
+    When multiple files share the same character name (## heading), only
+    the highest-level file is kept; of equal levels, the first by path.
     """
-    from app import state
-
+    library: dict[str, Creature] = {}
     # Track the level loaded per character name
     loaded_levels: dict[str, int] = {}
-
-    for md_file in pcs_dir.glob("*_stats.md"):
+    for md_file in sorted(files):
+        creature = files[md_file]
         level = _extract_level(md_file.name)
-        text = md_file.read_text()
-        creature = parse_character_md(text)
-
         if creature.name not in loaded_levels or level > loaded_levels[creature.name]:
-            state.pc_library[creature.name] = creature
+            library[creature.name] = creature
             loaded_levels[creature.name] = level
+    return library
+
+
+@timed("library.load_pcs")
+def load_all_pcs(
+    pcs_dir: Path, cache: StatBlockCache | None = None, workers: int = 1
+) -> dict[Path, Creature]:
+    """Load all .md files from pcs directory into PC library.
+
+    Duplicate names resolve as in ``select_pcs``. With a ``cache``,
+    unchanged files are not parsed again; ``workers`` > 1 parses the rest
+    in parallel. Returns the creature parsed from each file.
+    """
+    from app import state
+
+    md_files = sorted(pcs_dir.glob("*_stats.md"))
+    files = dict(zip(md_files, load_stat_files(md_files, parse_character_md, cache, workers)))
+    state.pc_library.update(select_pcs(files))
+
+    if cache is not None:
+        cache.prune(pcs_dir, md_files)
+    return files
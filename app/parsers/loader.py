@@ -0,0 +1,105 @@
+"""Read and parse stat block files, from the parse cache or a process pool."""
+from __future__ import annotations
+
+import hashlib
+import os
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from pathlib import Path
+from typing import TYPE_CHECKING, NamedTuple
+
+from app.models import Creature
+
+if TYPE_CHECKING:
+    from app.parsers.cache import StatBlockCache
+
+# parse_character_md / parse_monster_md: (text, source file) -> Creature
+StatBlockParser = Callable[[str, Path | None], Creature]
+
+# A worker process takes tens of milliseconds to start and import the
+# parsers, about what it takes to parse this many files itself; below it,
+# a worker costs more than it saves.
+MIN_FILES_PER_WORKER = 256
+
+
+class ParsedFile(NamedTuple):
+    creature: Creature
+    digest: bytes
+    mtime_ns: int
+    size: int
+
+
+def decode_stat_block(data: bytes) -> str:
+    """Decode like ``Path.read_text`` does, including newline translation."""
+    return data.decode("utf-8").replace("\r\n", "\n").replace("\r", "\n")
+
+
+def content_digest(data: bytes) -> bytes:
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+def parse_stat_file(path: Path, parse: StatBlockParser) -> ParsedFile:
+    """Read and parse one file (runs in worker processes)."""
+    st = os.stat(path)
+    data = path.read_bytes()
+    # Byte offsets into the file are only valid without newline translation
+    source = None if b"\r" in data else path.absolute()
+    return ParsedFile(
+        parse(decode_stat_block(data), source),
+        content_digest(data),
+        st.st_mtime_ns,
+        st.st_size,
+    )
+
+
+def available_cpus() -> int:
+    """CPUs this process may run on (its affinity mask, where there is one)."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def pool_workers(requested: int, files: int) -> int:
+    """How many processes to parse ``files`` files with; 1 means serially.
+
+    At most ``requested``, one per available CPU, and one per
+    ``MIN_FILES_PER_WORKER`` files.
+    """
+    return max(1, min(requested, available_cpus(), files // MIN_FILES_PER_WORKER))
+
+
+def parse_stat_files(paths: list[Path], parse: StatBlockParser, workers: int) -> list[ParsedFile]:
+    """Parse ``paths`` in order, across ``workers`` processes if more than one."""
+    if workers <= 1:
+        return [parse_stat_file(p, parse) for p in paths]
+    chunksize = max(1, len(paths) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(parse_stat_file, paths, repeat(parse), chunksize=chunksize))
+
+
+def load_stat_files(
+    paths: list[Path],
+    parse: StatBlockParser,
+    cache: StatBlockCache | None = None,
+    workers: int = 1,
+) -> list[Creature]:
+    """Parse ``paths`` and return their creatures in the same order.
+
+    Cached files are served from ``cache``; the rest are parsed serially,
+    or across up to ``workers`` processes when there are enough of them
+    and enough CPUs (see ``pool_workers``).
+    """
+    creatures: list[Creature | None] = [
+        cache.get(p) if cache is not None else None for p in paths
+    ]
+    missing = [i for i, c in enumerate(creatures) if c is None]
+    todo = [paths[i] for i in missing]
+
+    results = parse_stat_files(todo, parse, pool_workers(workers, len(todo)))
+
+    for i, parsed in zip(missing, results):
+        creatures[i] = parsed.creature
+        if cache is not None:
+            cache.put(paths[i], parsed)
+    return creatures  # type: ignore[return-value]
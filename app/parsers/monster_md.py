@@ -3,80 +3,96 @@ from __future__ import annotations
 
 import re
 from pathlib import Path
+from typing import TYPE_CHECKING
 
-from app.models import AbilityScores, Creature, CreatureType
+from app.metrics import timed
+from app.models import AbilityScores, Creature, CreatureType, SourceText
+from app.parsers.loader import load_stat_files
+from app.parsers.statblock import StatBlock, parse_stat_block
 
+if TYPE_CHECKING:
+    from app.parsers.cache import StatBlockCache
 
-def parse_monster_md(text: str) -> Creature:
-    """Parse a markdown stat block into a Creature."""
-    # Name from ## heading
-    name_match = re.search(r"^##\s+(.+)$", text, re.MULTILINE)
-    name = name_match.group(1).strip() if name_match else "Unknown"
 
-    # AC
-    ac_match = re.search(r"\*\*Armor Class:\*\*\s*(\d+)", text)
-    ac = int(ac_match.group(1)) if ac_match else 10
+# Feature names in a section: "**Scimitar.** *Melee Weapon Attack:* ..."
+_FEATURE_RE = re.compile(r"^\*\*(.+?)\.\*\*", re.MULTILINE)
 
-    # HP (first number)
-    hp_match = re.search(r"\*\*Hit Points:\*\*\s*(\d+)", text)
-    hp = int(hp_match.group(1)) if hp_match else 1
+# "The dragon can take 3 legendary actions, ..."
+_LEGENDARY_RE = re.compile(r"can take (\d+) legendary actions?", re.IGNORECASE)
 
-    # Speed
-    speed_match = re.search(r"\*\*Speed:\*\*\s*(.+?)(?:\n|$)", text)
-    speed = speed_match.group(1).strip() if speed_match else "30 ft."
 
-    # Ability scores from table row: | 12 (+1) | 15 (+2) | ...
+def _section(
+    block: StatBlock, title: str, text: str, source: Path | None
+) -> SourceText:
+    """Reference a section's text in ``source``, or wrap it if there is none."""
+    body = block.sections.get(title, "")
+    summary = ", ".join(_FEATURE_RE.findall(body))
+    if source is None or not body:
+        return SourceText.from_string(body, summary)
+    start, end = block.section_spans[title]
+    if not text.isascii():
+        start = len(text[:start].encode("utf-8"))
+        end = start + len(body.encode("utf-8"))
+    return SourceText.in_file(str(source), start, end, body, summary)
+
+
+def parse_monster_md(text: str, source: Path | None = None) -> Creature:
+    """Parse a markdown stat block into a Creature.
+
+    When ``source`` is the file ``text`` was read from (byte for byte),
+    traits and actions are kept as references into it and only read when
+    displayed.
+    """
+    block = parse_stat_block(text)
+
     abilities = AbilityScores()
-    score_row = re.search(
-        r"^\|.*\(\s*[+-]\d+\s*\).*\|$", text, re.MULTILINE
-    )
-    if score_row:
-        scores = [int(s) for s in re.findall(r"(\d+)\s*\([+-]", score_row.group())]
-        if len(scores) == 6:
-            abilities = AbilityScores(*scores)
-
-    # Passive Perception
-    pp_match = re.search(r"Passive Perception\s+(\d+)", text)
-    passive = int(pp_match.group(1)) if pp_match else 10 + AbilityScores.modifier(abilities.wisdom)
-
-    # Challenge Rating
-    cr_match = re.search(r"\*\*Challenge:\*\*\s*([^\s(]+)", text)
-    cr = cr_match.group(1).strip() if cr_match else ""
-
-    # Traits (between ### Traits and ### Actions)
-    traits = ""
-    traits_match = re.search(
-        r"###\s*Traits\s*\n(.*?)(?=###|$)", text, re.DOTALL
-    )
-    if traits_match:
-        traits = traits_match.group(1).strip()
+    if block.ability_scores is not None and len(block.ability_scores) == 6:
+        abilities = AbilityScores(*block.ability_scores)
 
-    # Actions (after ### Actions)
-    actions = ""
-    actions_match = re.search(r"###\s*Actions\s*\n(.*?)(?=###|$)", text, re.DOTALL)
-    if actions_match:
-        actions = actions_match.group(1).strip()
+    # Passive Perception (from the Senses line)
+    passive = block.senses_passive_perception
+    if passive is None:
+        passive = 10 + AbilityScores.modifier(abilities.wisdom)
+
+    legendary = _LEGENDARY_RE.search(block.sections.get("Legendary Actions", ""))
 
     return Creature(
-        name=name,
+        name=block.name or "Unknown",
         creature_type=CreatureType.MONSTER,
-        armor_class=ac,
-        max_hp=hp,
-        speed=speed,
+        armor_class=block.armor_class if block.armor_class is not None else 10,
+        max_hp=block.hit_points if block.hit_points is not None else 1,
+        speed=block.speed if block.speed is not None else "30 ft.",
         abilities=abilities,
         initiative_modifier=AbilityScores.modifier(abilities.dexterity),
         passive_perception=passive,
-        challenge_rating=cr,
-        traits=traits,
-        actions=actions,
+        challenge_rating=block.challenge_rating or "",
+        hit_dice=block.hit_dice or "",
+        legendary_actions=int(legendary.group(1)) if legendary else 0,
+        traits=_section(block, "Traits", text, source),
+        actions=_section(block, "Actions", text, source),
     )
 
 
-def load_all_monsters(monsters_dir: Path) -> None:
-    """Load all .md files from monsters directory into monster library."""
+def select_monsters(files: dict[Path, Creature]) -> dict[str, Creature]:
+    """Library entries for parsed monster files; of duplicate names, the last by path."""
+    return {files[path].name: files[path] for path in sorted(files)}
+
+
+@timed("library.load_monsters")
+def load_all_monsters(
+    monsters_dir: Path, cache: StatBlockCache | None = None, workers: int = 1
+) -> dict[Path, Creature]:
+    """Load all .md files from monsters directory into monster library.
+
+    With a ``cache``, unchanged files are not parsed again; ``workers`` > 1
+    parses the rest in parallel. Returns the creature parsed from each file.
+    """
     from app import state
 
-    for md_file in monsters_dir.glob("*_stats.md"):
-        text = md_file.read_text()
-        creature = parse_monster_md(text)
-        state.monster_library[creature.name] = creature
+    md_files = sorted(monsters_dir.glob("*_stats.md"))
+    files = dict(zip(md_files, load_stat_files(md_files, parse_monster_md, cache, workers)))
+    state.monster_library.update(select_monsters(files))
+
+    if cache is not None:
+        cache.prune(monsters_dir, md_files)
+    return files
@@ -0,0 +1,131 @@
+"""Single-pass tokenizer for markdown stat blocks, shared by the PC and
+monster parsers.
+
+One precompiled pattern scans the text once and yields the line-start
+tokens a stat block is made of: the ``##`` name heading, ``###`` section
+headers, ``**Field:**`` labels and the ability score table row. For every
+field the first occurrence wins.
+"""
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass, field
+
+# Tokens start after a newline (the text is scanned with one prepended):
+# a literal first character lets the regex engine skip ahead quickly.
+_TOKEN_RE = re.compile(
+    r"\n(?:"
+    r"##[ \t]+(?P<name>\S[^\n]*)$"
+    r"|(?P<section>###)"
+    r"|\*\*(?P<label>[^*\n]+?):\*\*"
+    r"|(?P<scores>\|[^\n]*\(\s*[+-]\d+\s*\)[^\n]*\|)$"
+    r")",
+    re.MULTILINE,
+)
+_SECTION_TITLE_RE = re.compile(r"###[ \t]*(\S[^\n]*?)[ \t]*\n")
+_INT_RE = re.compile(r"\s*(\d+)")
+# "7 (2d6)", "52 (8d8 + 16)": the average, then the dice formula
+_HP_RE = re.compile(r"\s*(\d+)(?:\s*\(\s*(\d+d\d+(?:\s*[+-]\s*\d+)?)\s*\))?")
+_SIGNED_INT_RE = re.compile(r"\s*([+-]?\d+)")
+_CR_RE = re.compile(r"\s*([^\s(]+)")
+_SPEED_RE = re.compile(r"\s*(.+?)(?:\n|$)")
+_SCORE_RE = re.compile(r"(\d+)\s*\([+-]")
+_SENSES_PP_RE = re.compile(r"Passive Perception\s+(\d+)")
+
+# **Label:** -> (StatBlock attribute, value pattern matched after the label)
+_LABELS: dict[str, tuple[str, re.Pattern[str]]] = {
+    "Armor Class": ("armor_class", _INT_RE),
+    "Hit Points": ("hit_points", _HP_RE),
+    "Speed": ("speed", _SPEED_RE),
+    "Initiative Modifier": ("initiative_modifier", _SIGNED_INT_RE),
+    "Passive Perception": ("passive_perception", _INT_RE),
+    "Challenge": ("challenge_rating", _CR_RE),
+}
+_STR_FIELDS = {"speed", "challenge_rating"}
+
+
+@dataclass
+class StatBlock:
+    """Raw fields found in a stat block; None means the field is absent."""
+
+    name: str | None = None
+    armor_class: int | None = None
+    hit_points: int | None = None
+    # Dice formula after the hit points, spaces removed (e.g. "8d8+16")
+    hit_dice: str | None = None
+    speed: str | None = None
+    ability_scores: list[int] | None = None
+    initiative_modifier: int | None = None
+    # From a **Passive Perception:** label (PC sheets)
+    passive_perception: int | None = None
+    # From "Passive Perception N" on a label line, e.g. **Senses:** (monsters)
+    senses_passive_perception: int | None = None
+    challenge_rating: str | None = None
+    # "### Title" -> stripped section body
+    sections: dict[str, str] = field(default_factory=dict)
+    # "### Title" -> (start, end) character offsets of the body in the text
+    section_spans: dict[str, tuple[int, int]] = field(default_factory=dict)
+
+
+def _close_section(block: StatBlock, text: str, title: str, start: int, end: int) -> None:
+    if title in block.sections:
+        return
+    raw = text[start:end]
+    body = raw.strip()
+    # Offsets are into the original text, which lacks the prepended newline
+    start += len(raw) - len(raw.lstrip()) - 1
+    block.sections[title] = body
+    block.section_spans[title] = (start, start + len(body))
+
+
+def parse_stat_block(text: str) -> StatBlock:
+    """Tokenize a markdown stat block in a single pass."""
+    block = StatBlock()
+    values: dict[str, re.Match[str]] = {}
+    section: str | None = None
+    section_start = 0
+
+    text = "\n" + text
+    for m in _TOKEN_RE.finditer(text):
+        kind = m.lastgroup
+        if kind == "label":
+            label = m.group(kind)
+            if label in _LABELS:
+                if label not in values:
+                    value = _LABELS[label][1].match(text, m.end())
+                    if value is not None:
+                        values[label] = value
+            elif block.senses_passive_perception is None:
+                # Other labels (**Senses:**, **Skills:**) may carry passive
+                # perception inline
+                line_end = text.find("\n", m.end())
+                pp = _SENSES_PP_RE.search(
+                    text, m.end(), line_end if line_end >= 0 else len(text)
+                )
+                if pp is not None:
+                    block.senses_passive_perception = int(pp.group(1))
+        elif kind == "section":
+            # A "###" line ends the open section and may open the next one
+            if section is not None:
+                _close_section(block, text, section, section_start, m.start())
+                section = None
+            title = _SECTION_TITLE_RE.match(text, m.start() + 1)
+            if title is not None and title.group(1) not in block.sections:
+                section = title.group(1)
+                section_start = title.end()
+        elif kind == "name":
+            if block.name is None:
+                block.name = m.group(kind).strip()
+        elif block.ability_scores is None:  # first score row only
+            block.ability_scores = [int(s) for s in _SCORE_RE.findall(m.group(kind))]
+
+    if section is not None:
+        _close_section(block, text, section, section_start, len(text))
+    for label, value in values.items():
+        attr = _LABELS[label][0]
+        raw = value.group(1)
+        setattr(block, attr, raw.strip() if attr in _STR_FIELDS else int(raw))
+    hp = values.get("Hit Points")
+    if hp is not None and hp.group(2):
+        block.hit_dice = "".join(hp.group(2).split())
+    return block
@@ -0,0 +1,151 @@
+"""Versioned JSON API over the combat services, for bots and external displays.
+
+Responses are state diffs from the table's ChangeLog rather than rendered
+HTML: a mutation returns only what it changed, and a poller sends back the
+last ETag (as ``?since=`` and/or ``If-None-Match``) to get what changed
+since, or a 304 when nothing did. Bodies are encoded by one reused
+compact encoder, without FastAPI's ``jsonable_encoder`` pass.
+"""
+from __future__ import annotations
+
+import json
+from typing import Any
+
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import Response
+from pydantic import BaseModel, Field
+
+from app.dependencies import current_table, existing_table
+from app.routers.encounter import BatchRequest
+from app.services.combat import (
+    CombatAction,
+    apply_actions,
+    apply_damage,
+    apply_healing,
+    next_turn,
+    prev_turn,
+    roll_area_damage,
+    set_temp_hp,
+)
+from app.services.tables import Table
+
+router = APIRouter(prefix="/api/v1", tags=["api"])
+
+# The C encoder, no indentation or spaces, UTF-8 as is, no cycle check
+_encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"), check_circular=False)
+
+
+class CompactJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return _encoder.encode(content).encode()
+
+
+class Amount(BaseModel):
+    amount: int = Field(0, ge=0)
+
+
+def _matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    return any(
+        tag.strip() in ("*", etag) or tag.strip().removeprefix("W/") == etag
+        for tag in if_none_match.split(",")
+    )
+
+
+def _diff_response(table: Table, since: int | None) -> CompactJSONResponse:
+    return CompactJSONResponse(table.changes.diff(since), headers={"ETag": table.changes.etag})
+
+
+def _not_found(creature_id: str) -> CompactJSONResponse:
+    return CompactJSONResponse({"detail": f"No creature {creature_id!r}"}, status_code=404)
+
+
+@router.get("/encounter")
+async def encounter_state(request: Request, since: str | None = None):
+    """The encounter, or only what changed after ``since`` (an earlier ETag).
+
+    Does not wait for the table lock: it only reads.
+    """
+    table = existing_table(request)
+    etag = table.changes.etag
+    if _matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    return _diff_response(table, table.changes.parse_version(since))
+
+
+@router.post("/encounter/damage/{creature_id}")
+async def damage(creature_id: str, body: Amount, table: Table = Depends(current_table)):
+    """Damage a creature; returns what changed (HP, concentration, ...)."""
+    if table.encounter.get_creature(creature_id) is None:
+        return _not_found(creature_id)
+    before = table.encounter.version
+    apply_damage(table.encounter, creature_id, body.amount)
+    return _diff_response(table, before)
+
+
+@router.post("/encounter/heal/{creature_id}")
+async def heal(creature_id: str, body: Amount, table: Table = Depends(current_table)):
+    """Heal a creature; returns what changed."""
+    if table.encounter.get_creature(creature_id) is None:
+        return _not_found(creature_id)
+    before = table.encounter.version
+    apply_healing(table.encounter, creature_id, body.amount)
+    return _diff_response(table, before)
+
+
+@router.post("/encounter/temp-hp/{creature_id}")
+async def temp_hp(creature_id: str, body: Amount, table: Table = Depends(current_table)):
+    """Set a creature's temporary HP; returns what changed."""
+    if table.encounter.get_creature(creature_id) is None:
+        return _not_found(creature_id)
+    before = table.encounter.version
+    set_temp_hp(table.encounter, creature_id, body.amount)
+    return _diff_response(table, before)
+
+
+@router.post("/encounter/batch")
+async def batch(body: BatchRequest, table: Table = Depends(current_table)):
+    """Several damage/heal/temp HP/death save operations (as ``/encounter/batch``)."""
+    before = table.encounter.version
+    actions = [CombatAction(**op.model_dump()) for op in body.operations]
+    total = roll_area_damage(actions, body.roll) if body.roll else None
+    apply_actions(table.encounter, actions)
+    response = _diff_response(table, before)
+    if total is not None:
+        response.headers["X-Roll-Total"] = str(total)
+    return response
+
+
+@router.post("/encounter/next-turn")
+async def advance_turn(table: Table = Depends(current_table)):
+    """Advance the turn; returns the new turn plus effects that expired or triggered."""
+    before = table.encounter.version
+    next_turn(table.encounter)
+    return _diff_response(table, before)
+
+
+@router.post("/encounter/prev-turn")
+async def go_back_turn(table: Table = Depends(current_table)):
+    """Go back one turn; returns what changed."""
+    before = table.encounter.version
+    prev_turn(table.encounter)
+    return _diff_response(table, before)
+
+
+@router.post("/encounter/undo")
+async def undo(table: Table = Depends(current_table)):
+    """Revert the last action; returns what changed (an empty diff if nothing)."""
+    before = table.encounter.version
+    table.history.undo()
+    return _diff_response(table, before)
+
+
+@router.post("/encounter/redo")
+async def redo(table: Table = Depends(current_table)):
+    """Re-apply the last undone action; returns what changed."""
+    before = table.encounter.version
+    table.history.redo()
+    return _diff_response(table, before)
@@ -1,17 +1,21 @@
 """Routes for managing creature libraries (PC uploads, monster library)."""
 from __future__ import annotations
 
-from pathlib import Path
+import asyncio
+from typing import Literal
 
-from fastapi import APIRouter, Request, UploadFile
-from fastapi.templating import Jinja2Templates
+from fastapi import APIRouter, Form, Request, UploadFile
+from fastapi.responses import HTMLResponse
+from markupsafe import escape
 
 from app import state
 from app.parsers.character_md import parse_character_md
 from app.parsers.monster_md import parse_monster_md
+from app.services.importer import merge_into_library, parse_uploads
+from app.services.library import PAGE_SIZE, challenge_value
+from app.templating import templates
 
 router = APIRouter(prefix="/creatures", tags=["creatures"])
-templates = Jinja2Templates(directory=Path(__file__).parent.parent / "templates")
 
 
 @router.post("/upload-pc")
@@ -20,30 +24,97 @@ async def upload_pc(request: Request, file: UploadFile):
     content = (await file.read()).decode("utf-8")
     creature = parse_character_md(content)
     state.pc_library[creature.name] = creature
+    state.library_index.add(creature)
 
     return templates.TemplateResponse(
         "partials/library_lists.html",
-        {
-            "request": request,
-            "pc_library": state.pc_library,
-            "monster_library": state.monster_library,
-        },
+        {"request": request, "library": state.library_index},
     )
 
 
-
 @router.post("/upload-monster")
 async def upload_monster(request: Request, file: UploadFile):
     """Upload a monster stat block markdown file."""
     content = (await file.read()).decode("utf-8")
     creature = parse_monster_md(content)
     state.monster_library[creature.name] = creature
+    state.library_index.add(creature)
 
     return templates.TemplateResponse(
         "partials/library_lists.html",
+        {"request": request, "library": state.library_index},
+    )
+
+
+@router.post("/import")
+async def import_stat_blocks(
+    request: Request,
+    files: list[UploadFile],
+    kind: Literal["pc", "monster"] = Form("monster"),
+):
+    """Import many stat blocks at once: .md files, or .zip/.tar archives of them.
+
+    Parsing runs off the event loop; the library is then updated in one step.
+    """
+    uploads = [(f.filename or "upload", f.file) for f in files]
+    parsed, summary = await asyncio.to_thread(
+        parse_uploads, uploads, kind, state.worker_count, state.worker_pool
+    )
+    merge_into_library(parsed, summary)
+    return templates.TemplateResponse(
+        "partials/import_summary.html",
         {
             "request": request,
-            "pc_library": state.pc_library,
-            "monster_library": state.monster_library,
+            "summary": summary,
+            "library": state.library_index,
+            "page": state.library_index.search(),
         },
     )
+
+
+def _number(value: str) -> int | None:
+    """Blank or malformed filter fields are ignored rather than rejected."""
+    try:
+        return int(value)
+    except ValueError:
+        return None
+
+
+@router.get("/search")
+async def search_library(
+    request: Request,
+    q: str = "",
+    type: str = "",
+    cr_min: str = "",
+    cr_max: str = "",
+    ac_min: str = "",
+    ac_max: str = "",
+    hp_min: str = "",
+    hp_max: str = "",
+    offset: int = 0,
+):
+    """One page of library search results; later pages append to the first."""
+    page = state.library_index.search(
+        q,
+        kind=type if type in ("pc", "monster") else None,
+        cr_min=challenge_value(cr_min),
+        cr_max=challenge_value(cr_max),
+        ac_min=_number(ac_min),
+        ac_max=_number(ac_max),
+        hp_min=_number(hp_min),
+        hp_max=_number(hp_max),
+        offset=offset,
+    )
+    return templates.TemplateResponse(
+        "partials/library_page.html" if offset else "partials/library_results.html",
+        {"request": request, "page": page, "library": state.library_index},
+    )
+
+
+@router.get("/monster-options")
+async def monster_options(monster_name: str = ""):
+    """``<option>``s for the add-monster typeahead, best matches first."""
+    page = state.library_index.search(monster_name, kind="monster", limit=PAGE_SIZE)
+    return HTMLResponse(
+        "".join(f'<option value="{escape(m.name)}"></option>' for m in page.items)
+    )
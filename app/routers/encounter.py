@@ -1,40 +1,135 @@
 """Routes for encounter setup and combat management."""
 from __future__ import annotations
 
-from pathlib import Path
+import asyncio
+from collections.abc import Iterable
+from typing import Literal
 
-from fastapi import APIRouter, Form, Request
-from fastapi.responses import HTMLResponse
-from fastapi.templating import Jinja2Templates
+from fastapi import APIRouter, Depends, Form, Request
+from fastapi.responses import HTMLResponse, JSONResponse, Response
+from markupsafe import escape
+from pydantic import BaseModel, field_validator
 
 from app import state
-from app.models import Encounter
+from app.dependencies import current_table, existing_table, setup_table
 from app.models import CreatureType
+from app.services import dice
 from app.services.combat import (
+    CombatAction,
+    add_effect,
+    apply_actions,
     apply_damage,
     apply_healing,
+    delay_turn,
+    monster_hit_points,
     next_turn,
     prev_turn,
+    remove_creature,
+    remove_effect,
+    resume_turn,
+    roll_area_damage,
     roll_monster_initiative,
     start_combat,
+    set_description,
+    set_lair,
+    set_legendary_actions,
+    set_pc_initiative,
     set_temp_hp,
     update_death_save,
+    use_legendary_action,
 )
+from app.services.history import Step
+from app.services.simulate import combatants, parse_attack_profile, simulate_combatants
+from app.services.tables import Table
+from app.templating import templates
 
 router = APIRouter(tags=["encounter"])
-templates = Jinja2Templates(directory=Path(__file__).parent.parent / "templates")
+
+
+class BatchOperation(BaseModel):
+    action: Literal["damage", "heal", "temp_hp", "death_save"]
+    creature_id: str
+    amount: int = 0
+    half: bool = False
+    save_type: Literal["", "success", "failure"] = ""
+    value: int = 0
+
+
+class BatchRequest(BaseModel):
+    operations: list[BatchOperation]
+    # Dice expression rolled once for every damage operation (e.g. "8d6")
+    roll: str | None = None
+
+    @field_validator("roll")
+    @classmethod
+    def _check_roll(cls, value: str | None) -> str | None:
+        if value:
+            dice.parse(value)  # ValueError -> 422
+        return value or None
+
+
+def _setup_response(request: Request, table: Table):
+    return templates.TemplateResponse(
+        "encounter/setup.html",
+        {
+            "request": request,
+            "monster_library": state.monster_library,
+            "pc_library": state.pc_library,
+            "library": state.library_index,
+            "encounter": table.encounter,
+        },
+    )
+
+
+def _card_response(table: Table, creature_id: str, also: Iterable[str] = ()) -> HTMLResponse:
+    """One creature's card, re-rendered only if it changed.
+
+    Cards in ``also`` (e.g. effects a lost concentration ended) follow out of band.
+    """
+    encounter = table.encounter
+    html = table.cards.render(encounter.get_creature(creature_id))
+    others = [
+        c for cid in also if cid != creature_id and (c := encounter.get_creature(cid)) is not None
+    ]
+    if others:
+        html += templates.get_template("partials/creature_cards_oob.html").render(
+            creatures=others, cards=table.cards
+        )
+    return HTMLResponse(html)
+
+
+def _turn_response(
+    request: Request, table: Table, previous: str | None, also: set[str] = frozenset()
+):
+    """Turn controls plus, out of band, the cards that gained or lost the turn.
+
+    ``also`` names further cards to re-render (those an undo touched).
+    """
+    encounter = table.encounter
+    changed = ({previous, encounter.current_creature_id} | also) - {None}
+    return templates.TemplateResponse(
+        "partials/turn_update.html",
+        {
+            "request": request,
+            "encounter": encounter,
+            "creatures": [c for c in encounter.initiative_order if c.id in changed],
+            "cards": table.cards,
+        },
+    )
 
 
 @router.post("/encounter/add-pc")
-async def add_pc(request: Request, pc_name: str = Form(...)):
+async def add_pc(
+    request: Request, pc_name: str = Form(...), table: Table = Depends(setup_table)
+):
     """Add a PC from library to the encounter."""
     if pc_name in state.pc_library:
         creature = state.pc_library[pc_name].copy()
-        state.encounter.creatures.append(creature)
+        table.encounter.add_creature(creature)
 
     return templates.TemplateResponse(
         "partials/encounter_creatures.html",
-        {"request": request, "encounter": state.encounter},
+        {"request": request, "encounter": table.encounter},
     )
 
 
@@ -43,159 +138,256 @@ async def add_monster(
     request: Request,
     monster_name: str = Form(...),
     count: int = Form(1),
+    hp_mode: Literal["average", "rolled", "max"] = Form("average"),
+    table: Table = Depends(setup_table),
 ):
-    """Add monsters from library to the encounter."""
+    """Add monsters from library to the encounter.
+
+    ``hp_mode`` picks each copy's HP: the stat block average, rolled from
+    its hit dice (one batch for all copies), or the maximum.
+    """
     if monster_name in state.monster_library:
         template = state.monster_library[monster_name]
-        for i in range(min(count, 20)):  # cap at 20
+        count = min(count, 20)  # cap at 20
+        hit_points = monster_hit_points(template, count, hp_mode)
+        for i, hp in enumerate(hit_points):
             creature = template.copy()
+            creature.max_hp = creature.current_hp = hp
             if count > 1:
                 creature.name = f"{template.name} {i + 1}"
-            state.encounter.creatures.append(creature)
+            table.encounter.add_creature(creature)
 
     return templates.TemplateResponse(
         "partials/encounter_creatures.html",
-        {"request": request, "encounter": state.encounter},
+        {"request": request, "encounter": table.encounter},
     )
 
 
 @router.post("/encounter/description/{creature_id}")
 async def update_description(
-    request: Request, creature_id: str, description: str = Form("")
+    request: Request,
+    creature_id: str,
+    description: str = Form(""),
+    table: Table = Depends(current_table),
 ):
     """Update a creature's description."""
-    creature = state.encounter.get_creature(creature_id)
-    if creature and creature.creature_type == CreatureType.MONSTER:
-        creature.description = description
+    set_description(table.encounter, creature_id, description)
     return templates.TemplateResponse(
         "partials/encounter_creatures.html",
-        {"request": request, "encounter": state.encounter},
+        {"request": request, "encounter": table.encounter},
     )
 
 
 @router.post("/encounter/remove/{creature_id}")
-async def remove_creature(request: Request, creature_id: str):
+async def remove_creature_route(
+    request: Request, creature_id: str, table: Table = Depends(current_table)
+):
     """Remove a creature from the encounter."""
-    state.encounter.creatures = [
-        c for c in state.encounter.creatures if c.id != creature_id
-    ]
-    if state.encounter.is_active:
-        return templates.TemplateResponse(
-            "partials/creature_list.html",
-            {"request": request, "encounter": state.encounter},
-        )
+    remove_creature(table.encounter, creature_id)
+    if table.encounter.is_active:
+        return _list_response(request, table)
     return templates.TemplateResponse(
         "partials/encounter_creatures.html",
-        {"request": request, "encounter": state.encounter},
+        {"request": request, "encounter": table.encounter},
     )
 
 
 @router.post("/encounter/roll-initiative")
-async def roll_initiative(request: Request):
+async def roll_initiative(request: Request, table: Table = Depends(current_table)):
     """Show the initiative modal for PC rolls."""
-    if not state.encounter.creatures:
+    if not table.encounter.creatures:
         return HTMLResponse("<p>No creatures in encounter!</p>")
     return templates.TemplateResponse(
         "partials/initiative_modal.html",
-        {"request": request, "encounter": state.encounter},
+        {"request": request, "encounter": table.encounter},
     )
 
 
 @router.post("/encounter/start-combat")
-async def start_combat_route(request: Request):
+async def start_combat_route(request: Request, table: Table = Depends(current_table)):
     """Process PC initiative inputs, roll for monsters, and start combat."""
     form = await request.form()
 
     # Apply PC initiative rolls from the form
-    for creature in state.encounter.creatures:
+    pc_rolls: dict[str, int] = {}
+    for creature in table.encounter.creatures:
         if creature.creature_type == CreatureType.PC:
             raw = form.get(f"roll_{creature.id}")
             is_total = form.get(f"total_{creature.id}")
             if raw is not None:
                 value = int(raw)
                 if is_total:
-                    creature.initiative_roll = value
+                    pc_rolls[creature.id] = value
                 else:
-                    creature.initiative_roll = value + creature.initiative_modifier
+                    pc_rolls[creature.id] = value + creature.initiative_modifier
+    set_pc_initiative(table.encounter, pc_rolls)
 
     # Roll for monsters
-    roll_monster_initiative(state.encounter)
+    roll_monster_initiative(table.encounter)
 
     # Start combat
-    start_combat(state.encounter)
+    start_combat(table.encounter)
 
     return templates.TemplateResponse(
         "encounter/tracker.html",
-        {"request": request, "encounter": state.encounter},
+        {"request": request, "encounter": table.encounter, "cards": table.cards},
     )
 
 
 @router.post("/encounter/next-turn")
-async def advance_turn(request: Request):
+async def advance_turn(request: Request, table: Table = Depends(current_table)):
     """Advance to next turn."""
-    next_turn(state.encounter)
-    return templates.TemplateResponse(
-        "partials/creature_list.html",
-        {"request": request, "encounter": state.encounter},
-    )
+    previous = table.encounter.current_creature_id
+    affected = next_turn(table.encounter)
+    return _turn_response(request, table, previous, set(affected))
 
 
 @router.post("/encounter/prev-turn")
-async def go_back_turn(request: Request):
+async def go_back_turn(request: Request, table: Table = Depends(current_table)):
     """Go back one turn."""
-    prev_turn(state.encounter)
+    previous = table.encounter.current_creature_id
+    prev_turn(table.encounter)
+    return _turn_response(request, table, previous)
+
+
+# Changes that re-order or re-populate the initiative list
+_LIST_FIELDS = frozenset({"creature", "initiative_roll", "is_active", "lair_initiative"})
+
+
+def _list_response(request: Request, table: Table):
     return templates.TemplateResponse(
         "partials/creature_list.html",
-        {"request": request, "encounter": state.encounter},
+        {"request": request, "encounter": table.encounter, "cards": table.cards},
     )
 
 
+def _step_response(request: Request, table: Table, previous: str | None, step: Step | None):
+    """What an undo or redo changed, re-rendered."""
+    if step is None:
+        return Response(status_code=204)
+    encounter = table.encounter
+    if not encounter.is_active:
+        # Undid the start of combat: back to setup
+        response = _setup_response(request, table)
+        response.headers.update({"HX-Retarget": "main", "HX-Reswap": "innerHTML"})
+        return response
+    if any(not _LIST_FIELDS.isdisjoint(c.fields) for c in step.changes):
+        # The roster or initiative order changed: redraw the whole list
+        response = _list_response(request, table)
+        response.headers.update({"HX-Retarget": "#combat-tracker", "HX-Reswap": "innerHTML"})
+        return response
+    return _turn_response(
+        request, table, previous, {c.creature_id for c in step.changes} - {None}
+    )
+
+
+@router.post("/encounter/undo")
+async def undo(request: Request, table: Table = Depends(current_table)):
+    """Revert the last action (a whole batch or turn advance at once)."""
+    previous = table.encounter.current_creature_id
+    return _step_response(request, table, previous, table.history.undo())
+
+
+@router.post("/encounter/redo")
+async def redo(request: Request, table: Table = Depends(current_table)):
+    """Re-apply the last undone action."""
+    previous = table.encounter.current_creature_id
+    return _step_response(request, table, previous, table.history.redo())
+
+
+@router.get("/encounter/transcript")
+async def transcript(table: Table = Depends(current_table)):
+    """The combat so far as a replayable JSON transcript."""
+    return JSONResponse(
+        table.history.transcript(),
+        headers={
+            "Content-Disposition": f'attachment; filename="combat-{table.id}.json"'
+        },
+    )
+
+
+@router.post("/encounter/delay")
+async def delay(request: Request, table: Table = Depends(current_table)):
+    """The current creature holds its turn; the next one starts."""
+    previous = table.encounter.current_creature_id
+    affected = delay_turn(table.encounter)
+    return _turn_response(request, table, previous, set(affected))
+
+
+@router.post("/encounter/act-now/{creature_id}")
+async def act_now(request: Request, creature_id: str, table: Table = Depends(current_table)):
+    """A delayed creature takes its turn now (and that place in initiative)."""
+    resume_turn(table.encounter, creature_id)
+    return _list_response(request, table)
+
+
+@router.post("/encounter/legendary/{creature_id}")
+async def legendary_action(
+    request: Request,
+    creature_id: str,
+    cost: int = Form(1),
+    table: Table = Depends(current_table),
+):
+    """Spend legendary actions (at the end of another creature's turn)."""
+    use_legendary_action(table.encounter, creature_id, cost)
+    return _turn_response(
+        request, table, table.encounter.current_creature_id, {creature_id}
+    )
+
+
+@router.post("/encounter/legendary-actions/{creature_id}")
+async def legendary_actions(
+    creature_id: str, count: int = Form(0), table: Table = Depends(current_table)
+):
+    """Set how many legendary actions a creature has per round."""
+    set_legendary_actions(table.encounter, creature_id, count)
+    return _card_response(table, creature_id)
+
+
+@router.post("/encounter/lair")
+async def lair(
+    request: Request, initiative: str = Form(""), table: Table = Depends(current_table)
+):
+    """Put the lair action in the turn order (usually at 20), or take it out (blank)."""
+    value = initiative.strip()
+    set_lair(table.encounter, int(value) if value.lstrip("-").isdigit() else None)
+    return _list_response(request, table)
+
+
 @router.post("/encounter/damage/{creature_id}")
 async def damage_creature(
-    request: Request, creature_id: str, amount: int = Form(0)
+    request: Request,
+    creature_id: str,
+    amount: int = Form(0),
+    table: Table = Depends(current_table),
 ):
     """Apply damage to a creature."""
-    apply_damage(state.encounter, creature_id, amount)
-    return templates.TemplateResponse(
-        "partials/creature_card.html",
-        {
-            "request": request,
-            "creature": state.encounter.get_creature(creature_id),
-            "encounter": state.encounter,
-        },
-    )
+    affected = apply_damage(table.encounter, creature_id, amount)
+    return _card_response(table, creature_id, affected)
 
 
 @router.post("/encounter/heal/{creature_id}")
 async def heal_creature(
-    request: Request, creature_id: str, amount: int = Form(0)
+    request: Request,
+    creature_id: str,
+    amount: int = Form(0),
+    table: Table = Depends(current_table),
 ):
     """Heal a creature."""
-    apply_healing(state.encounter, creature_id, amount)
-    return templates.TemplateResponse(
-        "partials/creature_card.html",
-        {
-            "request": request,
-            "creature": state.encounter.get_creature(creature_id),
-            "encounter": state.encounter,
-        },
-    )
+    apply_healing(table.encounter, creature_id, amount)
+    return _card_response(table, creature_id)
 
 
 @router.post("/encounter/temp-hp/{creature_id}")
 async def temp_hp(
-    request: Request, creature_id: str, amount: int = Form(0)
+    request: Request,
+    creature_id: str,
+    amount: int = Form(0),
+    table: Table = Depends(current_table),
 ):
     """Set temporary HP."""
-    set_temp_hp(state.encounter, creature_id, amount)
-    return templates.TemplateResponse(
-        "partials/creature_card.html",
-        {
-            "request": request,
-            "creature": state.encounter.get_creature(creature_id),
-            "encounter": state.encounter,
-        },
-    )
+    set_temp_hp(table.encounter, creature_id, amount)
+    return _card_response(table, creature_id)
 
 
 @router.post("/encounter/death-save/{creature_id}")
@@ -204,43 +396,129 @@ async def death_save(
     creature_id: str,
     save_type: str = Form(...),
     value: int = Form(...),
+    table: Table = Depends(current_table),
 ):
     """Update death save."""
-    update_death_save(state.encounter, creature_id, save_type, value)
+    affected = update_death_save(table.encounter, creature_id, save_type, value)
+    return _card_response(table, creature_id, affected)
+
+
+@router.post("/encounter/effect/{creature_id}")
+async def add_effect_route(
+    creature_id: str,
+    name: str = Form(...),
+    rounds: str = Form(""),
+    expires_at: Literal["start", "end"] = Form("start"),
+    concentration: bool = Form(False),
+    on_turn: Literal["", "start", "end"] = Form(""),
+    damage: str = Form(""),
+    note: str = Form(""),
+    table: Table = Depends(current_table),
+):
+    """Put a condition or timed effect on a creature (blank rounds: until removed)."""
+    try:
+        affected = add_effect(
+            table.encounter,
+            creature_id,
+            name,
+            rounds=max(1, int(rounds)) if rounds.strip() else None,
+            expires_at=expires_at,
+            concentration=concentration,
+            on_turn=on_turn,
+            damage=damage.strip(),
+            note=note,
+        )
+    except ValueError as e:
+        return HTMLResponse(escape(str(e)), status_code=422)
+    return _card_response(table, creature_id, affected)
+
+
+@router.post("/encounter/effect/{creature_id}/remove/{effect_id}")
+async def remove_effect_route(
+    creature_id: str, effect_id: str, table: Table = Depends(current_table)
+):
+    """Take an effect off a creature."""
+    remove_effect(table.encounter, creature_id, effect_id)
+    return _card_response(table, creature_id)
+
+
+@router.post("/encounter/batch")
+async def batch_actions(
+    request: Request, batch: BatchRequest, table: Table = Depends(current_table)
+):
+    """Apply several damage/heal/temp HP/death save operations at once.
+
+    Used for area effects: each target gets its own operation, with
+    ``half`` set for targets that made their saving throw. With ``roll``
+    (e.g. "8d6") the damage is rolled once for all targets and the total is
+    returned in the ``X-Roll-Total`` header. Only the affected cards are
+    re-rendered, as out-of-band swaps.
+    """
+    actions = [CombatAction(**op.model_dump()) for op in batch.operations]
+    headers = {}
+    if batch.roll:
+        headers["X-Roll-Total"] = str(roll_area_damage(actions, batch.roll))
+    affected = apply_actions(table.encounter, actions)
     return templates.TemplateResponse(
-        "partials/creature_card.html",
+        "partials/creature_cards_oob.html",
         {
             "request": request,
-            "creature": state.encounter.get_creature(creature_id),
-            "encounter": state.encounter,
+            "creatures": [table.encounter.get_creature(cid) for cid in affected],
+            "encounter": table.encounter,
+            "cards": table.cards,
         },
+        headers=headers,
+    )
+
+
+@router.post("/encounter/simulate")
+async def simulate_encounter(request: Request, trials: int = Form(10_000)):
+    """Estimate the party's chance of winning with a Monte Carlo simulation.
+
+    PCs attack with their ``attack_<creature id>`` profile (e.g. "+5 1d8+3
+    x2") if one is posted, else a default from their ability scores. The
+    table is locked only while its creatures are copied, not for the run.
+    """
+    table = existing_table(request)
+    form = await request.form()
+    try:
+        async with table.lock:
+            creatures = table.encounter.creatures
+            pc_attacks = {
+                c.name: parse_attack_profile(form[f"attack_{c.id}"], c.name)
+                for c in creatures
+                if form.get(f"attack_{c.id}")
+            }
+            side = combatants(creatures, pc_attacks)
+        # Runs off the event loop, in the shared pool when there is one
+        report = await asyncio.to_thread(
+            simulate_combatants,
+            side,
+            trials,
+            workers=state.worker_count,
+            pool=state.worker_pool,
+        )
+    except ValueError as e:
+        return HTMLResponse(f"<p>{escape(str(e))}</p>")
+    return templates.TemplateResponse(
+        "partials/simulation_result.html", {"request": request, "report": report}
     )
 
 
 @router.post("/encounter/set-initiative/{creature_id}")
 async def set_initiative(
-    request: Request, creature_id: str, value: int = Form(...)
+    request: Request,
+    creature_id: str,
+    value: int = Form(...),
+    table: Table = Depends(current_table),
 ):
     """Manually set a creature's initiative roll."""
-    creature = state.encounter.get_creature(creature_id)
-    if creature:
-        creature.initiative_roll = value
-    return templates.TemplateResponse(
-        "partials/creature_list.html",
-        {"request": request, "encounter": state.encounter},
-    )
+    table.encounter.set_initiative(creature_id, value)
+    return _list_response(request, table)
 
 
 @router.post("/encounter/reset")
-async def reset_encounter(request: Request):
+async def reset_encounter(request: Request, table: Table = Depends(current_table)):
     """End combat and reset the encounter."""
-    state.encounter = Encounter()
-    return templates.TemplateResponse(
-        "encounter/setup.html",
-        {
-            "request": request,
-            "monster_library": state.monster_library,
-            "pc_library": state.pc_library,
-            "encounter": state.encounter,
-        },
-    )
+    table.reset()
+    return _setup_response(request, table)
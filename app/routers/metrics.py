@@ -0,0 +1,47 @@
+"""Prometheus scrape endpoint, plus the gauges read when it is scraped."""
+from __future__ import annotations
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app import state
+from app.metrics import REGISTRY, Gauge
+
+router = APIRouter(tags=["metrics"])
+
+
+def _encounter_sizes():
+    for table in state.tables:
+        yield (table.id,), len(table.encounter.creatures)
+
+
+def _library_sizes():
+    yield ("pc",), len(state.pc_library)
+    yield ("monster",), len(state.monster_library)
+
+
+def _player_screens():
+    for table in state.tables:
+        yield (table.id,), len(table.feed)
+
+
+REGISTRY.register(
+    Gauge(
+        "dnd_encounter_creatures",
+        "Creatures in each table's encounter.",
+        ("table",),
+        _encounter_sizes,
+    )
+)
+REGISTRY.register(
+    Gauge("dnd_library_entries", "Stat blocks in each library.", ("library",), _library_sizes)
+)
+REGISTRY.register(
+    Gauge("dnd_player_screens", "Open player screens per table.", ("table",), _player_screens)
+)
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """All metrics, in the Prometheus text format."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,36 @@
+"""Read-only player view, kept live with Server-Sent Events."""
+from __future__ import annotations
+
+from fastapi import APIRouter, Request
+from fastapi.responses import StreamingResponse
+
+from app.dependencies import existing_table
+from app.templating import templates
+
+router = APIRouter(prefix="/player", tags=["player"])
+
+
+@router.get("")
+async def player_view(request: Request):
+    """Initiative order for the players' screen (no monster HP, no controls)."""
+    table = existing_table(request)
+    return templates.TemplateResponse(
+        "encounter/player.html",
+        {"request": request, "encounter": table.encounter, "table_id": table.id},
+    )
+
+
+@router.get("/events")
+async def player_events(request: Request):
+    """Stream card, turn and order updates for the player view.
+
+    Does not hold the table lock: the stream stays open for as long as the
+    screen does, and updates are pushed to it by the table's LiveFeed.
+    """
+    table = existing_table(request)
+    viewer = table.feed.connect()
+    return StreamingResponse(
+        table.feed.stream(viewer),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
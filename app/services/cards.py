@@ -0,0 +1,74 @@
+"""Rendered creature cards, cached per creature with dirty tracking.
+
+A card depends on the creature's own fields plus whether it holds the
+current turn and whether combat is active. The cache follows the
+encounter's changes and bumps a creature's revision whenever one touches
+it, so a card is only re-rendered when its revision, turn or combat state
+differs from the cached copy. A card also names other creatures (an
+effect's source and the creature whose turn ends it), so renaming or
+removing one of those drops the cards that show it. Advancing a turn re-renders two cards; the
+rest of the list is stitched together from cached fragments.
+"""
+from __future__ import annotations
+
+from collections import defaultdict
+
+from markupsafe import Markup
+
+from app.models import Change, Creature, Encounter
+from app.templating import env
+
+
+class CardCache:
+    """``partials/creature_card.html`` fragments for one encounter."""
+
+    def __init__(self) -> None:
+        self.encounter: Encounter | None = None
+        self._template = env.get_template("partials/creature_card.html")
+        self._revisions: dict[str, int] = {}
+        # id -> ((revision, is_current, is_active), html)
+        self._cards: dict[str, tuple[tuple[int, bool, bool], Markup]] = {}
+        # id -> ids of the cached cards that show its name
+        self._shown_on: defaultdict[str, set[str]] = defaultdict(set)
+
+    def attach(self, encounter: Encounter) -> None:
+        """Cache cards for ``encounter`` (dropping those of any previous one)."""
+        if self.encounter is not None:
+            self.encounter.unsubscribe(self._on_change)
+        self.encounter = encounter
+        encounter.subscribe(self._on_change)
+        self._revisions.clear()
+        self._cards.clear()
+        self._shown_on.clear()
+
+    def _on_change(self, change: Change) -> None:
+        creature_id = change.creature_id
+        if creature_id is None:
+            return  # turn/round/combat state is part of the cache key
+        if "creature" in change.fields or "name" in change.fields:
+            for bearer in self._shown_on.pop(creature_id, ()):
+                self._cards.pop(bearer, None)
+        if "creature" in change.fields and change.fields["creature"][1] is None:
+            self._revisions.pop(creature_id, None)
+            self._cards.pop(creature_id, None)
+        else:
+            self._revisions[creature_id] = self._revisions.get(creature_id, 0) + 1
+
+    def render(self, creature: Creature) -> Markup:
+        """The creature's card, from cache unless something it shows changed."""
+        encounter = self.encounter
+        key = (
+            self._revisions.get(creature.id, 0),
+            encounter.current_creature_id == creature.id,
+            encounter.is_active,
+        )
+        cached = self._cards.get(creature.id)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        html = Markup(self._template.render(creature=creature, encounter=encounter))
+        self._cards[creature.id] = (key, html)
+        for effect in creature.effects:
+            for other in (effect.source_id, effect.expires_on):
+                if other and other != creature.id:
+                    self._shown_on[other].add(creature.id)
+        return html
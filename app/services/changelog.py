@@ -0,0 +1,183 @@
+"""Recent encounter changes, for the JSON API's state diffs.
+
+A ChangeLog follows one table's encounter and keeps its last ``limit``
+changes, each tagged with the encounter version it produced. ``diff``
+merges the changes since a client's version into one small document:
+
+    {"epoch": "3f9c0a12", "version": 57,
+     "encounter": {"current_creature_id": "a1b2c3d4", "round_number": 3},
+     "creatures": {"a1b2c3d4": {"current_hp": 4}},
+     "removed": ["e5f6a7b8"],
+     "order": ["a1b2c3d4", ...]}
+
+Only the keys that changed are present. ``order`` (ids in initiative
+order) appears when creatures were added, removed or re-ordered. A full
+``snapshot`` has the same shape with ``"full": true``, so a client
+applies both the same way.
+
+The epoch is new each time an encounter is attached (a reset, or a
+restart). A version from another epoch, or older than the log, gets a
+snapshot instead of a diff.
+"""
+from __future__ import annotations
+
+import dataclasses
+import secrets
+from collections import deque
+from typing import Any
+
+from app.models import AbilityScores, Change, Creature, Encounter
+
+CHANGE_LOG_LIMIT = 1024
+
+# Encounter fields a client sees (turn_index is the server's bookkeeping)
+ENCOUNTER_FIELDS = (
+    "current_creature_id",
+    "round_number",
+    "is_active",
+    "lair_initiative",
+    "turn_phase",
+    "resume_after",
+)
+# Creature fields left out: references into stat block files
+_HIDDEN_FIELDS = frozenset({"traits", "actions"})
+# Changes to these re-order the initiative list
+_ORDER_FIELDS = frozenset({"creature", "seq", "initiative_roll"})
+_STATE_FIELDS = tuple(
+    f.name for f in dataclasses.fields(Creature) if f.name not in _HIDDEN_FIELDS
+)
+_ABILITY_FIELDS = tuple(f.name for f in dataclasses.fields(AbilityScores))
+
+
+def creature_state(creature: Creature) -> dict[str, Any]:
+    """A creature as the API shows it: ``to_dict()`` without the hidden fields.
+
+    Built field by field; ``dataclasses.asdict`` would deep-copy every value.
+    """
+    data = {name: getattr(creature, name) for name in _STATE_FIELDS}
+    data["creature_type"] = creature.creature_type.value
+    abilities = creature.abilities
+    data["abilities"] = {name: getattr(abilities, name) for name in _ABILITY_FIELDS}
+    data["effects"] = [effect.to_dict() for effect in creature.effects]
+    return data
+
+
+def _value(name: str, value: Any) -> Any:
+    if name == "effects":
+        return [effect.to_dict() for effect in value]
+    return value
+
+
+class ChangeLog:
+    """The last ``limit`` changes to one encounter, by version."""
+
+    def __init__(self, limit: int = CHANGE_LOG_LIMIT) -> None:
+        self.encounter: Encounter | None = None
+        self.epoch = ""
+        self._changes: deque[tuple[int, Change]] = deque(maxlen=limit)
+        # creature id -> creature_state(), until a change touches the creature
+        self._states: dict[str, dict[str, Any]] = {}
+
+    def attach(self, encounter: Encounter) -> None:
+        """Follow ``encounter`` from its current version, in a new epoch."""
+        if self.encounter is not None:
+            self.encounter.unsubscribe(self._on_change)
+        self.encounter = encounter
+        encounter.subscribe(self._on_change)
+        self.epoch = secrets.token_hex(4)
+        self._changes.clear()
+        self._states.clear()
+
+    @property
+    def etag(self) -> str:
+        """The current epoch and version, as an ETag value."""
+        return f'"{self.epoch}-{self.encounter.version}"'
+
+    def _on_change(self, change: Change) -> None:
+        self._changes.append((self.encounter.version, change))
+        if change.creature_id is not None:
+            self._states.pop(change.creature_id, None)
+
+    def _state(self, creature: Creature) -> dict[str, Any]:
+        state = self._states.get(creature.id)
+        if state is None:
+            state = self._states[creature.id] = creature_state(creature)
+        return state
+
+    def parse_version(self, token: str | None) -> int | None:
+        """The version in an ETag/``since`` token of this epoch, else None."""
+        if not token:
+            return None
+        epoch, _, version = token.strip().removeprefix("W/").strip('"').partition("-")
+        if epoch != self.epoch or not version.isdigit():
+            return None
+        return int(version)
+
+    def snapshot(self) -> dict[str, Any]:
+        """The whole encounter, shaped like a diff."""
+        encounter = self.encounter
+        return {
+            "epoch": self.epoch,
+            "version": encounter.version,
+            "full": True,
+            "encounter": {name: getattr(encounter, name) for name in ENCOUNTER_FIELDS},
+            "creatures": {c.id: self._state(c) for c in encounter.creatures},
+            "order": [c.id for c in encounter.initiative_order],
+        }
+
+    def diff(self, since: int | None) -> dict[str, Any]:
+        """What changed after version ``since``; a snapshot if that is unknown."""
+        encounter = self.encounter
+        if since is None or since > encounter.version:
+            return self.snapshot()
+        if since < encounter.version and (
+            not self._changes or self._changes[0][0] > since + 1
+        ):
+            return self.snapshot()  # older than the log
+
+        state: dict[str, Any] = {}
+        creatures: dict[str, dict[str, Any]] = {}
+        removed: dict[str, None] = {}
+        reordered = False
+        # Changes are in version order: walk back to the first one after ``since``
+        start = len(self._changes)
+        while start and self._changes[start - 1][0] > since:
+            start -= 1
+        for i in range(start, len(self._changes)):
+            change = self._changes[i][1]
+            fields = change.fields
+            reordered = reordered or not _ORDER_FIELDS.isdisjoint(fields)
+            creature_id = change.creature_id
+            if creature_id is None:
+                for name, (_, new) in fields.items():
+                    if name in ENCOUNTER_FIELDS:
+                        state[name] = new
+                continue
+            if "creature" in fields:
+                added = fields["creature"][1]
+                if added is None:
+                    creatures.pop(creature_id, None)
+                    removed[creature_id] = None
+                else:
+                    data = dict(added)
+                    for name in _HIDDEN_FIELDS:
+                        data.pop(name, None)
+                    creatures[creature_id] = data
+                    removed.pop(creature_id, None)
+                continue
+            target = creatures.setdefault(creature_id, {})
+            for name, (_, new) in fields.items():
+                if name != "seq":
+                    target[name] = _value(name, new)
+
+        result: dict[str, Any] = {"epoch": self.epoch, "version": encounter.version}
+        if state:
+            result["encounter"] = state
+        if creatures:
+            result["creatures"] = creatures
+        if removed:
+            result["removed"] = list(removed)
+        if reordered:
+            result["order"] = [c.id for c in encounter.initiative_order]
+        return result
+
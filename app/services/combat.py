@@ -1,113 +1,576 @@
-"""Combat management: initiative, turns, HP logic."""
+"""Combat management: initiative, the turn schedule, HP logic, conditions and effects."""
 from __future__ import annotations
 
-from app.models import CreatureType, Encounter
-from app.services.dice import roll_d20
+import random
+from dataclasses import dataclass, replace
 
+from app.metrics import timed
+from app.models import LAIR_ID, AbilityScores, Creature, CreatureType, Effect, Encounter
+from app.services import dice
 
-def roll_monster_initiative(encounter: Encounter) -> None:
-    """Roll initiative for monsters only (PCs are set manually)."""
-    for creature in encounter.creatures:
-        if creature.creature_type == CreatureType.MONSTER:
-            creature.initiative_roll = roll_d20() + creature.initiative_modifier
 
+@timed("combat.set_pc_initiative")
+def set_pc_initiative(encounter: Encounter, rolls: dict[str, int]) -> None:
+    """Set PC initiative totals (creature id -> final initiative)."""
+    encounter.set_initiatives(
+        {
+            cid: value
+            for cid, value in rolls.items()
+            if (c := encounter.get_creature(cid)) and c.creature_type == CreatureType.PC
+        }
+    )
 
-def start_combat(encounter: Encounter) -> None:
+
+@timed("combat.roll_monster_initiative")
+def roll_monster_initiative(
+    encounter: Encounter, rng: random.Random | None = None
+) -> None:
+    """Roll initiative for monsters only (PCs are set manually), in one batch."""
+    monsters = [c for c in encounter.creatures if c.creature_type == CreatureType.MONSTER]
+    rolls = dice.roll_many("d20", len(monsters), rng)
+    encounter.set_initiatives(
+        {c.id: roll + c.initiative_modifier for c, roll in zip(monsters, rolls)}
+    )
+
+
+HP_MODES = ("average", "rolled", "max")
+
+
+def monster_hit_points(
+    monster: Creature, count: int, mode: str = "average", rng: random.Random | None = None
+) -> list[int]:
+    """Max HP for ``count`` copies of a library monster.
+
+    "average" is the stat block's number; "rolled" rolls its hit dice
+    formula once per copy, all in one batch; "max" is the formula's
+    maximum. Monsters without a usable formula always get the average.
+    """
+    try:
+        formula = dice.parse(monster.hit_dice) if monster.hit_dice else None
+    except ValueError:
+        formula = None
+    if formula is None or mode == "average":
+        return [monster.max_hp] * count
+    if mode == "max":
+        return [formula.maximum] * count
+    return [max(1, hp) for hp in formula.roll_many(count, rng)]
+
+
+@timed("combat.start_combat")
+def start_combat(encounter: Encounter, rng: random.Random | None = None) -> None:
     """Start combat after all initiative values are set."""
-    encounter.round_number = 1
-    encounter.is_active = True
-    order = encounter.initiative_order
-    if order:
-        encounter.current_creature_id = order[0].id
+    if encounter.schedule:
+        encounter.set_turn(0, op="start", round_number=1, is_active=True)
+        _start_turn(encounter, {}, rng)
+    else:
+        encounter.update_state("start", round_number=1, is_active=True)
+
+
+@timed("combat.next_turn")
+def next_turn(encounter: Encounter, rng: random.Random | None = None) -> list[str]:
+    """Advance to the next entry in the turn schedule.
 
+    Ends the current creature's turn: its end-of-turn effects trigger and
+    expire. If legendary creatures may act then, the turn pauses in a
+    legendary phase first; the next call moves on. Dead and delayed
+    creatures are not in the schedule, so they are never stopped at; the
+    lair action is. The next entry's start-of-turn effects then expire and
+    trigger. Returns the ids of other creatures whose effects or HP
+    changed on the way.
+    """
+    if not encounter.is_active or not encounter.schedule:
+        return []
+    affected: dict[str, None] = {}
+    if encounter.turn_phase != "legendary":
+        _end_turn(encounter, affected, rng)
+        if encounter.current_creature is not None and encounter.legendary_candidates():
+            encounter.update_state("legendary", turn_phase="legendary")
+            return list(affected)
+    _advance(encounter, affected, rng)
+    return list(affected)
 
-def next_turn(encounter: Encounter) -> None:
-    """Advance to the next creature in initiative order."""
-    if not encounter.is_active:
+
+@timed("combat.prev_turn")
+def prev_turn(encounter: Encounter) -> None:
+    """Go back to the previous entry in the turn schedule.
+
+    Effects are not brought back or triggered again; undo does that.
+    """
+    if not encounter.is_active or not encounter.schedule:
         return
-    order = encounter.initiative_order
-    if not order:
+    if encounter.turn_phase == "legendary":
+        encounter.update_state("turn", turn_phase="")
         return
 
-    current_idx = 0
-    for i, c in enumerate(order):
-        if c.id == encounter.current_creature_id:
-            current_idx = i
-            break
+    # turn_index is the current entry, or the one after it if it left the schedule
+    count = len(encounter.schedule)
+    prev_idx = encounter.turn_index - 1
+    round_number = encounter.round_number
+    if prev_idx < 0:
+        prev_idx = count - 1
+        round_number = max(1, round_number - 1)
+    encounter.set_turn(prev_idx % count, round_number=round_number)
 
-    next_idx = (current_idx + 1) % len(order)
-    if next_idx <= current_idx:
-        encounter.round_number += 1
 
-    encounter.current_creature_id = order[next_idx].id
+@timed("combat.delay_turn")
+def delay_turn(encounter: Encounter, rng: random.Random | None = None) -> list[str]:
+    """The current creature holds its turn: it leaves the schedule until it acts.
 
+    Its turn has not happened, so no end-of-turn effects or legendary
+    actions follow; the next entry starts.
+    """
+    creature = encounter.current_creature
+    if not encounter.is_active or creature is None or encounter.turn_phase == "legendary":
+        return []
+    encounter.update_creature(creature, "delay", delayed=True)
+    affected: dict[str, None] = {}
+    if encounter.schedule:
+        _advance(encounter, affected, rng)
+    return list(affected)
 
-def prev_turn(encounter: Encounter) -> None:
-    """Go back to the previous creature in initiative order."""
-    if not encounter.is_active:
+
+@timed("combat.resume_turn")
+def resume_turn(
+    encounter: Encounter, creature_id: str, rng: random.Random | None = None
+) -> list[str]:
+    """A delayed creature acts now, right after the current turn ends.
+
+    It takes the current entry's initiative from then on. The round
+    continues after whichever of the two comes later in the schedule.
+    """
+    creature = encounter.get_creature(creature_id)
+    if not encounter.is_active or creature is None or not creature.delayed:
+        return []
+    affected: dict[str, None] = {}
+    if encounter.turn_phase != "legendary":
+        _end_turn(encounter, affected, rng)
+    anchor = encounter.resume_after or encounter.current_creature_id
+    encounter.update_creature(creature, "delay", delayed=False)
+    if anchor == LAIR_ID:
+        encounter.set_initiative(creature.id, encounter.lair_initiative)
+    elif anchor is not None:
+        encounter.set_initiative(creature.id, encounter.get_creature(anchor).initiative_roll)
+    if anchor is None or encounter.schedule_index(creature.id) > encounter.schedule_index(anchor):
+        anchor = None  # its own place is the later one
+    encounter.set_current(creature.id, resume_after=anchor, turn_phase="")
+    _start_turn(encounter, affected, rng)
+    return list(affected)
+
+
+@timed("combat.use_legendary_action")
+def use_legendary_action(encounter: Encounter, creature_id: str, cost: int = 1) -> None:
+    """Spend ``cost`` of a creature's legendary actions for this round."""
+    creature = encounter.get_creature(creature_id)
+    if creature is None or creature.legendary_actions <= 0:
         return
-    order = encounter.initiative_order
-    if not order:
+    used = max(0, min(creature.legendary_actions, creature.legendary_used + cost))
+    encounter.update_creature(creature, "legendary", legendary_used=used)
+
+
+@timed("combat.set_legendary_actions")
+def set_legendary_actions(encounter: Encounter, creature_id: str, count: int) -> None:
+    """Set how many legendary actions a creature has per round (0: none)."""
+    creature = encounter.get_creature(creature_id)
+    if creature is None:
         return
+    count = max(0, min(count, 10))
+    encounter.update_creature(
+        creature,
+        "legendary",
+        legendary_actions=count,
+        legendary_used=min(creature.legendary_used, count),
+    )
 
-    current_idx = 0
-    for i, c in enumerate(order):
-        if c.id == encounter.current_creature_id:
-            current_idx = i
-            break
 
-    prev_idx = (current_idx - 1) % len(order)
-    if prev_idx >= current_idx and encounter.round_number > 1:
-        encounter.round_number -= 1
+@timed("combat.set_lair")
+def set_lair(
+    encounter: Encounter, initiative: int | None, rng: random.Random | None = None
+) -> list[str]:
+    """Add the lair action to the schedule at ``initiative``, or remove it (None).
 
-    encounter.current_creature_id = order[prev_idx].id
+    Removing it on its own turn passes the turn on to the entry after it.
+    """
+    affected: dict[str, None] = {}
+    lair_turn = initiative is None and encounter.current_creature_id == LAIR_ID
+    # Out of the schedule first, so the turn cannot come back round to it
+    encounter.update_state("lair", lair_initiative=initiative)
+    if lair_turn:
+        _advance(encounter, affected, rng)
+    return list(affected)
+
+
+def _end_turn(
+    encounter: Encounter, affected: dict[str, None], rng: random.Random | None
+) -> None:
+    outgoing = encounter.current_creature
+    if outgoing is not None:
+        _turn_triggers(encounter, outgoing, "end", affected, rng)
+        due = encounter.pop_due_effects(encounter.round_number, outgoing.id, "end")
+        _expire(encounter, due, affected)
+
+
+def _advance(
+    encounter: Encounter, affected: dict[str, None], rng: random.Random | None
+) -> None:
+    """Start the turn of the schedule entry after the current one.
+
+    With nobody left in the schedule (end-of-turn damage killed the last
+    creature, say) it is nobody's turn.
+    """
+    if not encounter.schedule:
+        encounter.set_current(None, turn_phase="", resume_after=None)
+        return
+    # turn_index is the current entry (or the one it resumes after); if
+    # that left the schedule, it already points at the entry that follows
+    anchor = encounter.resume_after or encounter.current_creature_id
+    next_idx = encounter.turn_index + (1 if encounter.is_scheduled(anchor) else 0)
+    round_number = encounter_round = encounter.round_number
+    if next_idx >= len(encounter.schedule):
+        next_idx = 0
+        round_number += 1
+    encounter.set_turn(next_idx, round_number=round_number)
+    if round_number > encounter_round:
+        _expire(encounter, encounter.pop_overdue_effects(round_number), affected)
+    _start_turn(encounter, affected, rng)
 
 
-def apply_damage(encounter: Encounter, creature_id: str, amount: int) -> None:
-    """Apply damage to a creature, consuming temp HP first."""
+@timed("combat.apply_damage")
+def apply_damage(
+    encounter: Encounter, creature_id: str, amount: int, rng: random.Random | None = None
+) -> list[str]:
+    """Apply damage to a creature, consuming temp HP first.
+
+    A concentrating creature makes a CON save (DC 10 or half the damage,
+    whichever is higher) and loses concentration on a failure or at 0 HP.
+    Returns the ids of creatures whose effects ended as a result.
+    """
     creature = encounter.get_creature(creature_id)
     if creature is None or amount <= 0:
-        return
+        return []
 
     remaining = amount
-    if creature.temp_hp > 0:
-        absorbed = min(creature.temp_hp, remaining)
-        creature.temp_hp -= absorbed
+    temp_hp = creature.temp_hp
+    if temp_hp > 0:
+        absorbed = min(temp_hp, remaining)
+        temp_hp -= absorbed
         remaining -= absorbed
 
-    creature.current_hp = max(0, creature.current_hp - remaining)
+    encounter.update_creature(
+        creature,
+        "damage",
+        temp_hp=temp_hp,
+        current_hp=max(0, creature.current_hp - remaining),
+    )
+    affected: dict[str, None] = {}
+    if creature.is_dead:
+        _release_expiries(encounter, creature.id, affected)
+    if not encounter.concentration_effects(creature_id):
+        return list(affected)
+    if creature.current_hp > 0:
+        save = dice.roll("d20", rng) + AbilityScores.modifier(creature.abilities.constitution)
+        if save >= max(10, amount // 2):
+            return list(affected)
+    affected.update(dict.fromkeys(break_concentration(encounter, creature_id)))
+    return list(affected)
 
 
+@timed("combat.apply_healing")
 def apply_healing(encounter: Encounter, creature_id: str, amount: int) -> None:
     """Heal a creature, capped at max HP."""
     creature = encounter.get_creature(creature_id)
     if creature is None or amount <= 0:
         return
 
-    creature.current_hp = min(creature.max_hp, creature.current_hp + amount)
+    current_hp = min(creature.max_hp, creature.current_hp + amount)
     # Healing from 0 resets death saves
-    if creature.current_hp > 0:
-        creature.death_save_successes = 0
-        creature.death_save_failures = 0
+    if current_hp > 0:
+        encounter.update_creature(
+            creature,
+            "heal",
+            current_hp=current_hp,
+            death_save_successes=0,
+            death_save_failures=0,
+        )
+    else:
+        encounter.update_creature(creature, "heal", current_hp=current_hp)
 
 
+@timed("combat.set_temp_hp")
 def set_temp_hp(encounter: Encounter, creature_id: str, amount: int) -> None:
     """Set temporary HP (doesn't stack, takes higher)."""
     creature = encounter.get_creature(creature_id)
     if creature is None:
         return
-    creature.temp_hp = max(creature.temp_hp, amount)
+    encounter.update_creature(
+        creature, "temp_hp", temp_hp=max(creature.temp_hp, amount)
+    )
 
 
+@timed("combat.update_death_save")
 def update_death_save(
     encounter: Encounter, creature_id: str, save_type: str, value: int
-) -> None:
-    """Update death save successes or failures."""
+) -> list[str]:
+    """Update death save successes or failures.
+
+    Returns the ids of other creatures whose effects changed because the
+    creature died.
+    """
     creature = encounter.get_creature(creature_id)
     if creature is None or creature.creature_type != CreatureType.PC:
-        return
+        return []
 
     if save_type == "success":
-        creature.death_save_successes = max(0, min(3, value))
+        encounter.update_creature(
+            creature, "death_save", death_save_successes=max(0, min(3, value))
+        )
     elif save_type == "failure":
-        creature.death_save_failures = max(0, min(3, value))
+        encounter.update_creature(
+            creature, "death_save", death_save_failures=max(0, min(3, value))
+        )
+    affected: dict[str, None] = {}
+    if creature.is_dead:
+        _release_expiries(encounter, creature.id, affected)
+    return list(affected)
+
+
+def set_description(encounter: Encounter, creature_id: str, description: str) -> None:
+    """Set a monster's description (e.g. "the one under the table")."""
+    creature = encounter.get_creature(creature_id)
+    if creature is None or creature.creature_type != CreatureType.MONSTER:
+        return
+    encounter.update_creature(creature, "description", description=description)
+
+
+@dataclass
+class CombatAction:
+    """One HP/death-save operation in a batch (e.g. one target of a fireball)."""
+
+    action: str  # "damage", "heal", "temp_hp" or "death_save"
+    creature_id: str
+    amount: int = 0
+    half: bool = False  # target made its save: half damage, rounded down
+    save_type: str = ""  # death saves only: "success" or "failure"
+    value: int = 0  # death saves only
+
+
+@timed("combat.roll_area_damage")
+def roll_area_damage(
+    actions: list[CombatAction], expression: str, rng: random.Random | None = None
+) -> int:
+    """Roll an area effect's damage (e.g. "8d6") once for all its targets.
+
+    Every damage action gets the rolled total as its amount (halved later
+    for targets that saved). Returns the total.
+    """
+    total = dice.roll(expression, rng)
+    for act in actions:
+        if act.action == "damage":
+            act.amount = total
+    return total
+
+
+@timed("combat.apply_actions")
+def apply_actions(encounter: Encounter, actions: list[CombatAction]) -> list[str]:
+    """Apply a batch of actions in order; return the ids of affected creatures."""
+    affected: dict[str, None] = {}
+    for act in actions:
+        if encounter.get_creature(act.creature_id) is None:
+            continue
+        if act.action == "damage":
+            amount = act.amount // 2 if act.half else act.amount
+            affected.update(dict.fromkeys(apply_damage(encounter, act.creature_id, amount)))
+        elif act.action == "heal":
+            apply_healing(encounter, act.creature_id, act.amount)
+        elif act.action == "temp_hp":
+            set_temp_hp(encounter, act.creature_id, act.amount)
+        elif act.action == "death_save":
+            affected.update(
+                dict.fromkeys(
+                    update_death_save(encounter, act.creature_id, act.save_type, act.value)
+                )
+            )
+        else:
+            continue
+        affected[act.creature_id] = None
+    return list(affected)
+
+
+TURN_POINTS = ("start", "end")
+
+
+@timed("combat.add_effect")
+def add_effect(
+    encounter: Encounter,
+    creature_id: str,
+    name: str,
+    rounds: int | None = None,
+    expires_at: str = "start",
+    concentration: bool = False,
+    on_turn: str = "",
+    damage: str = "",
+    note: str = "",
+) -> list[str]:
+    """Put a condition or timed effect on a creature.
+
+    The creature whose turn it is counts as the effect's source, as it
+    usually cast the spell. With ``rounds``, the effect expires at the
+    start (or end) of the source's turn that many rounds on, as a spell's
+    duration does; outside combat, the bearer's turn is used. With
+    ``concentration`` the source concentrates on it, ending any other
+    spell it concentrated on. Raises ValueError for a bad ``damage``
+    expression. Returns the ids of all creatures whose effects changed.
+    """
+    creature = encounter.get_creature(creature_id)
+    name = name.strip()
+    if creature is None or not name:
+        return []
+    if damage:
+        dice.parse(damage)
+    source = encounter.current_creature if encounter.is_active else None
+    anchor = source or creature
+    effect = Effect(
+        name,
+        expires_round=max(1, encounter.round_number) + rounds if rounds else None,
+        expires_on=anchor.id if rounds else None,
+        expires_at=expires_at if expires_at in TURN_POINTS else "start",
+        source_id=source.id if source is not None else None,
+        concentration=concentration and source is not None,
+        on_turn=on_turn if on_turn in TURN_POINTS else "",
+        damage=damage,
+        note=note.strip(),
+    )
+
+    affected: dict[str, None] = {}
+    if effect.concentration:
+        # One concentration spell at a time; the same spell on several
+        # targets (Bless) is one concentration
+        other = [
+            (c, e) for c, e in encounter.concentration_effects(source.id) if e.name != name
+        ]
+        _expire(encounter, other, affected, op="concentration")
+    encounter.update_creature(creature, "effect", effects=creature.effects + (effect,))
+    affected[creature.id] = None
+    return list(affected)
+
+
+@timed("combat.remove_effect")
+def remove_effect(encounter: Encounter, creature_id: str, effect_id: str) -> None:
+    """Take an effect off a creature (its save succeeded, it was dispelled...)."""
+    creature = encounter.get_creature(creature_id)
+    if creature is None:
+        return
+    effects = tuple(e for e in creature.effects if e.id != effect_id)
+    encounter.update_creature(creature, "effect", effects=effects)
+
+
+@timed("combat.break_concentration")
+def break_concentration(encounter: Encounter, source_id: str) -> list[str]:
+    """End every effect ``source_id`` concentrates on; returns the bearers' ids."""
+    affected: dict[str, None] = {}
+    _expire(encounter, encounter.concentration_effects(source_id), affected, op="concentration")
+    return list(affected)
+
+
+def _expire(
+    encounter: Encounter,
+    effects: list[tuple[Creature, Effect]],
+    affected: dict[str, None],
+    op: str = "expire",
+) -> None:
+    """Remove ``effects``, with one change per bearer."""
+    ended: dict[str, set[str]] = {}
+    for creature, effect in effects:
+        ended.setdefault(creature.id, set()).add(effect.id)
+    for creature_id, ids in ended.items():
+        creature = encounter.get_creature(creature_id)
+        encounter.update_creature(
+            creature, op, effects=tuple(e for e in creature.effects if e.id not in ids)
+        )
+        affected[creature_id] = None
+
+
+def _release_expiries(
+    encounter: Encounter, creature_id: str, affected: dict[str, None]
+) -> None:
+    """Move effects that expire on ``creature_id``'s turn to their bearer's turn.
+
+    For a creature that died or is leaving the encounter: its turns no
+    longer come, so nothing would ever expire on them. Effects whose slot
+    on the bearer's turn already went by expire now.
+    """
+    moved: dict[str, dict[str, Effect]] = {}
+    ended = []
+    for bearer, effect in encounter.expiring_on(creature_id):
+        if bearer.id == creature_id:
+            continue
+        if _turn_passed(encounter, effect.expires_round, bearer.id, effect.expires_at):
+            ended.append((bearer, effect))
+        else:
+            moved.setdefault(bearer.id, {})[effect.id] = replace(effect, expires_on=bearer.id)
+    _expire(encounter, ended, affected)
+    for bearer_id, effects in moved.items():
+        bearer = encounter.get_creature(bearer_id)
+        encounter.update_creature(
+            bearer, "effect", effects=tuple(effects.get(e.id, e) for e in bearer.effects)
+        )
+        affected[bearer_id] = None
+
+
+def _turn_passed(encounter: Encounter, round_number: int, creature_id: str, at: str) -> bool:
+    """Whether the "start"/"end" of ``creature_id``'s turn in ``round_number`` is over."""
+    if round_number != encounter.round_number:
+        return round_number < encounter.round_number
+    if creature_id == encounter.current_creature_id:
+        return at == "start"
+    if not encounter.is_scheduled(creature_id):
+        return False  # delayed: its turn is still to come
+    # turn_index is the current entry (or the one it resumes after), which
+    # is over unless it left the schedule
+    index = encounter.schedule_index(creature_id)
+    anchor = encounter.resume_after or encounter.current_creature_id
+    return index < encounter.turn_index or (
+        index == encounter.turn_index and encounter.is_scheduled(anchor)
+    )
+
+
+@timed("combat.remove_creature")
+def remove_creature(encounter: Encounter, creature_id: str) -> list[str]:
+    """Take a creature out of the encounter.
+
+    Effects on others that expire on its turn move to their bearer's turn.
+    Returns the ids of the creatures whose effects changed.
+    """
+    affected: dict[str, None] = {}
+    if encounter.get_creature(creature_id) is not None:
+        _release_expiries(encounter, creature_id, affected)
+        encounter.remove_creature(creature_id)
+    return list(affected)
+
+
+def _start_turn(
+    encounter: Encounter, affected: dict[str, None], rng: random.Random | None
+) -> None:
+    incoming = encounter.current_creature
+    if incoming is not None:
+        if incoming.legendary_used:
+            encounter.update_creature(incoming, "legendary", legendary_used=0)
+        due = encounter.pop_due_effects(encounter.round_number, incoming.id, "start")
+        _expire(encounter, due, affected)
+        _turn_triggers(encounter, incoming, "start", affected, rng)
+
+
+def _turn_triggers(
+    encounter: Encounter,
+    creature: Creature,
+    when: str,
+    affected: dict[str, None],
+    rng: random.Random | None,
+) -> None:
+    """Deal the damage of ``creature``'s effects that trigger at ``when`` of its turn."""
+    if creature.is_dead:
+        return
+    for effect in creature.effects:
+        if effect.on_turn == when and effect.damage:
+            amount = dice.roll(effect.damage, rng)
+            affected.update(dict.fromkeys(apply_damage(encounter, creature.id, amount, rng)))
+            affected[creature.id] = None
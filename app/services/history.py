@@ -0,0 +1,185 @@
+"""Undo/redo for an encounter, from the deltas it already records.
+
+Every mutation emits a ``Change`` holding ``field -> (old, new)``. History
+collects the changes made by one request into a step: a fireball on six
+goblins is one step, as is a turn advance. Undoing a step applies its
+changes' inverses in reverse order, and redoing applies them again. Both
+cost the size of the step, whatever the length of the fight. Undo and
+redo go through the encounter like any other mutation, so the journal,
+player screens and card cache follow along.
+
+Memory stays bounded. Only the last ``limit`` steps are kept. Older
+steps are folded, ``checkpoint_every`` at a time, into a checkpoint: a
+snapshot of the encounter as it was before the oldest kept step.
+``transcript()`` exports the checkpoint plus the kept steps, and
+``replay()`` turns such a transcript back into the encounter.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+from app.models import Change, Encounter
+
+UNDO_LIMIT = 1000
+CHECKPOINT_EVERY = 250
+TRANSCRIPT_FORMAT = 1
+
+# (current entry id, round, combat active, turn phase, resume after): the
+# turn state around a step, which undo/redo restore explicitly after
+# replaying its changes.
+TurnState = tuple[str | None, int, bool, str, str | None]
+
+
+@dataclass(slots=True)
+class Step:
+    """The changes one action made, with the turn state before and after."""
+
+    op: str  # the first change's op: "damage", "turn", "add", ...
+    changes: list[Change]
+    before: TurnState
+    after: TurnState
+
+    def to_dict(self) -> dict:
+        return {
+            "op": self.op,
+            "round": self.before[1],
+            "changes": [c.to_dict() for c in self.changes],
+        }
+
+
+def _turn_state(encounter: Encounter) -> TurnState:
+    return (
+        encounter.current_creature_id,
+        encounter.round_number,
+        encounter.is_active,
+        encounter.turn_phase,
+        encounter.resume_after,
+    )
+
+
+def _inverse(change: Change) -> Change:
+    return Change(
+        change.op, change.creature_id, {k: (new, old) for k, (old, new) in change.fields.items()}
+    )
+
+
+class History:
+    """Undo and redo stacks for one encounter."""
+
+    def __init__(self, limit: int = UNDO_LIMIT, checkpoint_every: int = CHECKPOINT_EVERY):
+        self.limit = limit
+        self.checkpoint_every = checkpoint_every
+        self.encounter: Encounter | None = None
+        self._undo: list[Step] = []
+        self._redo: list[Step] = []
+        self._pending: list[Change] = []
+        self._state: TurnState = (None, 0, False, "", None)
+        self._checkpoint: dict = {}
+        self._replaying = False
+
+    def attach(self, encounter: Encounter) -> None:
+        """Record ``encounter`` from its current state (dropping any old history)."""
+        if self.encounter is not None:
+            self.encounter.unsubscribe(self._on_change)
+        self.encounter = encounter
+        encounter.subscribe(self._on_change)
+        self._undo.clear()
+        self._redo.clear()
+        self._pending.clear()
+        self._state = _turn_state(encounter)
+        self._checkpoint = encounter.to_dict()
+
+    @property
+    def can_undo(self) -> bool:
+        return bool(self._undo)
+
+    @property
+    def can_redo(self) -> bool:
+        return bool(self._redo)
+
+    def _on_change(self, change: Change) -> None:
+        if not self._replaying:
+            self._pending.append(change)
+
+    def seal(self) -> Step | None:
+        """Close the step of changes made since the last one (end of a request)."""
+        if not self._pending:
+            return None
+        after = _turn_state(self.encounter)
+        step = Step(self._pending[0].op, self._pending, self._state, after)
+        self._pending = []
+        self._state = after
+        self._undo.append(step)
+        self._redo.clear()
+        if len(self._undo) > self.limit + self.checkpoint_every:
+            self._compact()
+        return step
+
+    def undo(self) -> Step | None:
+        """Revert the last step; None if there is nothing to undo."""
+        self.seal()
+        if not self._undo:
+            return None
+        step = self._undo.pop()
+        self._replay([_inverse(c) for c in reversed(step.changes)], step.before)
+        self._redo.append(step)
+        return step
+
+    def redo(self) -> Step | None:
+        """Re-apply the last undone step; None if there is nothing to redo."""
+        self.seal()
+        if not self._redo:
+            return None
+        step = self._redo.pop()
+        self._replay(step.changes, step.after)
+        self._undo.append(step)
+        return step
+
+    def _replay(self, changes: list[Change], state: TurnState) -> None:
+        encounter = self.encounter
+        self._replaying = True
+        try:
+            for change in changes:
+                encounter.apply_change(change)
+            current, round_number, is_active, turn_phase, resume_after = state
+            encounter.set_current(
+                current,
+                "undo",
+                round_number=round_number,
+                is_active=is_active,
+                turn_phase=turn_phase,
+                resume_after=resume_after,
+            )
+        finally:
+            self._replaying = False
+        self._state = state
+
+    def _compact(self) -> None:
+        """Fold the oldest ``checkpoint_every`` steps into the checkpoint."""
+        folded = self._undo[: self.checkpoint_every]
+        del self._undo[: self.checkpoint_every]
+        encounter = Encounter.from_dict(self._checkpoint)
+        for step in folded:
+            for change in step.changes:
+                encounter.apply_change(change)
+        self._checkpoint = encounter.to_dict()
+
+    def transcript(self) -> dict:
+        """The fight so far: a checkpoint plus every kept step, replayable."""
+        self.seal()
+        return {
+            "format": TRANSCRIPT_FORMAT,
+            "checkpoint": self._checkpoint,
+            "steps": [step.to_dict() for step in self._undo],
+        }
+
+
+def replay(transcript: dict) -> Encounter:
+    """Rebuild the encounter a transcript ends with."""
+    if transcript.get("format") != TRANSCRIPT_FORMAT:
+        raise ValueError(f"Unsupported transcript format: {transcript.get('format')!r}")
+    encounter = Encounter.from_dict(transcript["checkpoint"])
+    for step in transcript["steps"]:
+        for change in step["changes"]:
+            encounter.apply_change(Change.from_dict(change))
+    return encounter
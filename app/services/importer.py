@@ -0,0 +1,239 @@
+"""Bulk import of stat blocks from archives and multi-file uploads.
+
+Each upload is a markdown stat block, a zip, or a tar (optionally gzip,
+bzip2 or xz compressed). Archives are read one entry at a time, and tars
+in streaming mode. Entries are parsed in batches of ``BATCH_FILES``: on the
+server's shared worker pool when there are enough of them, with at most
+two batches per worker in flight. Memory therefore stays bounded by a few batches,
+whatever the size of the archive. Uploads themselves are spooled to disk
+by Starlette above 1 MB.
+
+Every file ends up in the summary, either imported or with the reason it
+was not. The parsed creatures are merged into the library in one step,
+with duplicate names resolved as on startup (``select_pcs`` /
+``select_monsters``).
+"""
+from __future__ import annotations
+
+import bz2
+import gzip
+import lzma
+import re
+import tarfile
+import time
+import zipfile
+from collections.abc import Iterator
+from concurrent.futures import Executor, Future
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import BinaryIO, Literal
+
+from app import state
+from app.models import Creature
+from app.parsers.character_md import parse_character_md, select_pcs
+from app.parsers.loader import decode_stat_block
+from app.parsers.monster_md import parse_monster_md, select_monsters
+from app.services.library import REBUILD_AFTER
+
+Kind = Literal["pc", "monster"]
+
+_PARSERS = {"pc": parse_character_md, "monster": parse_monster_md}
+_SELECT = {"pc": select_pcs, "monster": select_monsters}
+_LIBRARY = {"pc": "pc_library", "monster": "monster_library"}
+
+# Files parsed per task: below this, a task costs more to ship than to run
+BATCH_FILES = 64
+# A stat block is a few KB; anything this big is not one (or is a zip bomb)
+MAX_ENTRY_BYTES = 1 << 20
+_HEADING_RE = re.compile(r"^##[ \t]+\S", re.MULTILINE)
+_COMPRESSIONS = (
+    (b"\x1f\x8b", lambda f: gzip.GzipFile(fileobj=f, mode="rb")),
+    (b"BZh", bz2.BZ2File),
+    (b"\xfd7zXZ\x00", lzma.LZMAFile),
+)
+_TAR_SUFFIXES = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")
+
+# (entry name, file bytes)
+Entry = tuple[str, bytes]
+
+
+@dataclass
+class ImportSummary:
+    kind: Kind
+    imported: int = 0
+    # Library names added, and replaced (an existing entry of that name)
+    added: int = 0
+    replaced: int = 0
+    # (file or archive entry, reason) for every file that was not imported
+    errors: list[tuple[str, str]] = field(default_factory=list)
+    seconds: float = 0.0
+
+    @property
+    def files(self) -> int:
+        return self.imported + len(self.errors)
+
+
+def _entries(filename: str, fileobj: BinaryIO, errors: list[tuple[str, str]]) -> Iterator[Entry]:
+    """Markdown files in one upload, read one at a time."""
+    lower = filename.lower()
+    if lower.endswith(".md"):
+        data = fileobj.read(MAX_ENTRY_BYTES + 1)
+        if len(data) > MAX_ENTRY_BYTES:
+            errors.append((filename, "too large for a stat block"))
+        else:
+            yield filename, data
+    elif lower.endswith(".zip"):
+        try:
+            archive = zipfile.ZipFile(fileobj)
+        except zipfile.BadZipFile as e:
+            errors.append((filename, f"not a zip archive: {e}"))
+            return
+        with archive:
+            for info in archive.infolist():
+                name = f"{filename}/{info.filename}"
+                if info.is_dir() or not _is_stat_block(info.filename):
+                    continue
+                if info.file_size > MAX_ENTRY_BYTES:
+                    errors.append((name, "too large for a stat block"))
+                    continue
+                try:
+                    yield name, archive.read(info)
+                except (zipfile.BadZipFile, OSError, RuntimeError) as e:
+                    errors.append((name, str(e)))
+    elif lower.endswith(_TAR_SUFFIXES):
+        try:
+            # "r|": a forward-only stream, so nothing but the current member is held
+            with tarfile.open(fileobj=_decompressed(fileobj), mode="r|") as archive:
+                for member in archive:
+                    name = f"{filename}/{member.name}"
+                    if not member.isfile() or not _is_stat_block(member.name):
+                        continue
+                    if member.size > MAX_ENTRY_BYTES:
+                        errors.append((name, "too large for a stat block"))
+                        continue
+                    yield name, archive.extractfile(member).read()
+        except (tarfile.TarError, OSError, EOFError, lzma.LZMAError) as e:
+            errors.append((filename, f"unreadable tar archive: {e}"))
+    else:
+        errors.append((filename, "not a .md, .zip or .tar file"))
+
+
+def _decompressed(fileobj: BinaryIO) -> BinaryIO:
+    """``fileobj`` decompressed according to its magic bytes.
+
+    tarfile's own "r|*" decompression refills a small buffer by slicing it,
+    which makes it several times slower than reading through these.
+    """
+    magic = fileobj.read(6)
+    fileobj.seek(0)
+    for prefix, opener in _COMPRESSIONS:
+        if magic.startswith(prefix):
+            return opener(fileobj)
+    return fileobj
+
+
+def _is_stat_block(name: str) -> bool:
+    base = name.rsplit("/", 1)[-1]
+    return base.lower().endswith(".md") and not base.startswith(".") and "__MACOSX/" not in name
+
+
+def _parse_batch(kind: Kind, batch: list[Entry]) -> list[tuple[str, Creature | None, str]]:
+    """Parse a batch of files (runs in worker processes): (name, creature, error)."""
+    parse = _PARSERS[kind]
+    results = []
+    for name, data in batch:
+        try:
+            text = decode_stat_block(data)
+        except UnicodeDecodeError:
+            results.append((name, None, "not UTF-8 text"))
+            continue
+        # The parsers fall back to "Unknown"; a bulk import reports it instead
+        if _HEADING_RE.search(text) is None:
+            results.append((name, None, "no '## Name' heading"))
+            continue
+        try:
+            results.append((name, parse(text, None), ""))
+        except Exception as e:  # a malformed file must not fail the whole import
+            results.append((name, None, f"could not parse: {e}"))
+    return results
+
+
+def _batches(entries: Iterator[Entry]) -> Iterator[list[Entry]]:
+    batch: list[Entry] = []
+    for entry in entries:
+        batch.append(entry)
+        if len(batch) == BATCH_FILES:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def parse_uploads(
+    uploads: list[tuple[str, BinaryIO]],
+    kind: Kind,
+    workers: int = 1,
+    pool: Executor | None = None,
+) -> tuple[dict[Path, Creature], ImportSummary]:
+    """Parse every stat block in ``uploads``: creature per file, plus a summary.
+
+    Batches go to ``pool`` (the server's shared worker pool, of ``workers``
+    processes) when there is more than one; without a pool, or with one
+    worker, everything is parsed here.
+    """
+    start = time.perf_counter()
+    summary = ImportSummary(kind)
+    parsed: dict[Path, Creature] = {}
+
+    def collect(results: list[tuple[str, Creature | None, str]]) -> None:
+        for name, creature, error in results:
+            if creature is None:
+                summary.errors.append((name, error))
+            else:
+                parsed[Path(name)] = creature
+
+    batches = _batches(
+        entry for filename, fileobj in uploads for entry in _entries(filename, fileobj, summary.errors)
+    )
+    first = next(batches, None)
+    second = next(batches, None)
+    # Up to one batch is parsed right here; starting processes would cost
+    # more. So is everything on a single CPU.
+    if pool is None or workers <= 1 or second is None:
+        for batch in (first, second):
+            if batch:
+                collect(_parse_batch(kind, batch))
+        for batch in batches:
+            collect(_parse_batch(kind, batch))
+    else:
+        pending: list[Future] = [
+            pool.submit(_parse_batch, kind, batch) for batch in (first, second)
+        ]
+        for batch in batches:
+            if len(pending) >= workers * 2:
+                collect(pending.pop(0).result())
+            pending.append(pool.submit(_parse_batch, kind, batch))
+        for future in pending:
+            collect(future.result())
+
+    summary.imported = len(parsed)
+    summary.errors.sort()
+    summary.seconds = time.perf_counter() - start
+    return parsed, summary
+
+
+def merge_into_library(parsed: dict[Path, Creature], summary: ImportSummary) -> None:
+    """Swap the imported creatures into the library (call on the event loop)."""
+    winners = _SELECT[summary.kind](parsed)
+    library: dict[str, Creature] = dict(getattr(state, _LIBRARY[summary.kind]))
+    summary.replaced = sum(name in library for name in winners)
+    summary.added = len(winners) - summary.replaced
+    library.update(winners)
+    setattr(state, _LIBRARY[summary.kind], library)
+
+    index = state.library_index
+    if len(winners) > REBUILD_AFTER:
+        index.rebuild(state.pc_library.values(), state.monster_library.values())
+    else:
+        for creature in winners.values():
+            index.add(creature)
@@ -0,0 +1,207 @@
+"""Durable encounter state: an append-only change journal plus snapshots.
+
+Every Change made through the attached encounter is appended to
+``journal.jsonl`` as one JSON line. Writes are buffered and fsynced in
+batches by a GroupCommitter thread shared by all journals, so recording an
+action costs a buffered write rather than a disk flush.
+
+Every ``snapshot_every`` changes the journal is compacted. On the event
+loop, only the encounter's state is captured and the journal rotated to
+``journal.prev.jsonl``. The committer thread then writes and fsyncs
+``snapshot.json`` and deletes the rotated journal, so no request waits
+for a snapshot. Restore reads the snapshot, then both journals, skipping
+entries the snapshot already holds. Replacing the encounter (a reset) is
+recorded as a ``state`` line in the journal rather than a snapshot.
+"""
+from __future__ import annotations
+
+import json
+import os
+import threading
+from pathlib import Path
+
+from app.models import Change, Encounter
+
+
+class Journal:
+    """Write-ahead log for one encounter, stored in ``directory``."""
+
+    def __init__(self, directory: Path, snapshot_every: int = 500) -> None:
+        directory.mkdir(parents=True, exist_ok=True)
+        self.snapshot_path = directory / "snapshot.json"
+        self.journal_path = directory / "journal.jsonl"
+        self.rotated_path = directory / "journal.prev.jsonl"
+        self.snapshot_every = snapshot_every
+        self.encounter: Encounter | None = None
+        self._since_snapshot = 0
+        self._lock = threading.Lock()
+        self._dirty = False
+        # Encounter state captured for the committer to write as the snapshot
+        self._pending: dict | None = None
+        self._file = open(self.journal_path, "a", encoding="utf-8")
+
+    def restore(self) -> Encounter:
+        """Rebuild the encounter from the last snapshot plus the journal."""
+        if self.snapshot_path.exists():
+            encounter = Encounter.from_dict(
+                json.loads(self.snapshot_path.read_text(encoding="utf-8"))
+            )
+        else:
+            encounter = Encounter()
+
+        for path in (self.rotated_path, self.journal_path):
+            if not path.exists():
+                continue
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        if "state" in entry:
+                            # The encounter was replaced; a snapshot taken at
+                            # that very version holds the same state
+                            if entry["version"] >= encounter.version:
+                                encounter = Encounter.from_dict(entry["state"])
+                            continue
+                        change = Change.from_dict(entry)
+                    except (ValueError, KeyError):
+                        break  # torn final write from a crash
+                    # Skip entries already in the snapshot (crash mid-compaction)
+                    if entry["version"] > encounter.version:
+                        encounter.apply_change(change)
+                        encounter.version = entry["version"]
+        if self.rotated_path.exists():
+            # A compaction was cut short: finish it with the restored state
+            self._pending = encounter.to_dict()
+        return encounter
+
+    def attach(self, encounter: Encounter, restored: bool = False) -> None:
+        """Record changes to ``encounter`` from now on.
+
+        Unless it was just ``restore``d (the files already hold it), its
+        state is journaled first, replacing whatever the journal held.
+        """
+        if self.encounter is not None:
+            self.encounter.unsubscribe(self.record)
+        self.encounter = encounter
+        encounter.subscribe(self.record)
+        if not restored:
+            self._write({"state": encounter.to_dict(), "version": encounter.version})
+
+    def record(self, change: Change) -> None:
+        entry = change.to_dict()
+        entry["version"] = self.encounter.version
+        self._write(entry)
+        self._since_snapshot += 1
+        if self._since_snapshot >= self.snapshot_every:
+            self.snapshot()
+
+    def _write(self, entry: dict) -> None:
+        line = json.dumps(entry, separators=(",", ":")) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._dirty = True
+
+    def snapshot(self) -> None:
+        """Capture the encounter and rotate the journal; the committer writes it.
+
+        Skipped while an earlier snapshot is still unwritten: its rotated
+        journal must not be overwritten.
+        """
+        if self.encounter is None:
+            return
+        with self._lock:
+            if self._pending is not None or self.rotated_path.exists():
+                return
+            self._pending = self.encounter.to_dict()
+            # Durable before it is renamed: restore needs every line of it
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            os.replace(self.journal_path, self.rotated_path)
+            self._file = open(self.journal_path, "w", encoding="utf-8")
+            self._dirty = False
+        self._since_snapshot = 0
+
+    def write_snapshot(self) -> None:
+        """Write a captured snapshot and drop the journal it replaces.
+
+        Runs on the committer thread. On failure the rotated journal stays,
+        so restore still has every change, and the write is retried.
+        """
+        with self._lock:
+            data = self._pending
+        if data is None:
+            return
+        tmp = self.snapshot_path.with_suffix(".tmp")
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(json.dumps(data, separators=(",", ":")))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.snapshot_path)
+            self.rotated_path.unlink(missing_ok=True)
+        except OSError:
+            return
+        with self._lock:
+            if self._pending is data:
+                self._pending = None
+
+    def flush(self) -> None:
+        """Make recorded changes durable, and write any captured snapshot.
+
+        Only handing the buffer to the OS happens under the lock; the fsync
+        runs after it is released, so recording a change never waits for
+        the disk. It goes through a duplicate descriptor, which stays valid
+        if ``snapshot`` closes the file meanwhile.
+        """
+        with self._lock:
+            if not self._dirty or self._file.closed:
+                fd = None
+            else:
+                self._file.flush()
+                fd = os.dup(self._file.fileno())
+                self._dirty = False
+        if fd is not None:
+            try:
+                os.fsync(fd)
+            except OSError:
+                with self._lock:
+                    self._dirty = True  # retried on the next flush
+            finally:
+                os.close(fd)
+        self.write_snapshot()
+
+    def close(self) -> None:
+        self.flush()
+        with self._lock:
+            self._file.close()
+
+
+class GroupCommitter:
+    """Background thread that fsyncs journals in batches."""
+
+    def __init__(self, interval: float = 0.05) -> None:
+        self.interval = interval
+        self._journals: list[Journal] = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def add(self, journal: Journal) -> None:
+        self._journals = [*self._journals, journal]
+
+    def remove(self, journal: Journal) -> None:
+        """Stop flushing ``journal`` (the caller closes it)."""
+        self._journals = [j for j in self._journals if j is not journal]
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            for journal in self._journals:
+                journal.flush()
+
+    def close(self) -> None:
+        """Stop the thread and close every journal."""
+        self._stop.set()
+        self._thread.join()
+        for journal in self._journals:
+            journal.close()
@@ -0,0 +1,284 @@
+"""In-memory search index over the PC and monster libraries.
+
+Names are looked up three ways: a sorted list of names and one of later
+name words, both searched by prefix with bisect, and a trigram index for
+matches inside a word ("gob" finds "Hobgoblin"). Challenge rating, AC and
+HP each have a sorted index, so the number of creatures in a range is two
+bisects away; a search with a narrow range starts from it instead of the
+names. Type is checked on the candidates.
+
+Matches are produced lazily, best first, and a search stops once it has
+its page and a bounded count of what follows. A broad query ("g") over a
+huge library therefore costs about as much as a narrow one.
+"""
+from __future__ import annotations
+
+import bisect
+from collections import defaultdict
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
+from fractions import Fraction
+from functools import lru_cache
+from typing import NamedTuple
+
+from app.metrics import timed
+from app.models import Creature, CreatureType
+
+PAGE_SIZE = 20
+# Matches counted past the requested page before the total is shown as "N+"
+COUNT_LIMIT = 500
+# Past this many added/removed creatures, ``rebuild`` beats ``add``/``remove``
+REBUILD_AFTER = 200
+# Start from a CR/AC/HP range holding fewer creatures than this; a wider
+# one is cheaper to check against names already in order
+RANGE_LIMIT = 2000
+
+# (kind, name): kind is "pc" or "monster", as the two libraries may share names
+Key = tuple[str, str]
+_FIELDS = ("cr", "ac", "hp")
+
+
+@lru_cache(maxsize=128)
+def challenge_value(cr: str) -> float | None:
+    """Numeric challenge rating: "1/4" -> 0.25, "5" -> 5.0; None if absent."""
+    try:
+        return float(Fraction(cr.strip()))
+    except (ValueError, ZeroDivisionError):
+        return None
+
+
+def _trigrams(text: str) -> set[str]:
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+class _Entry(NamedTuple):
+    folded: str  # lowercase name, the sort key
+    kind: str
+    creature: Creature
+    cr: float | None
+
+
+@dataclass
+class SearchPage:
+    items: list[Creature]
+    total: int
+    offset: int
+    limit: int
+    capped: bool = False  # more than ``total`` matches exist
+
+    @property
+    def next_offset(self) -> int | None:
+        end = self.offset + self.limit
+        return end if end < self.total or self.capped else None
+
+
+class LibraryIndex:
+    """Search index over library creatures, kept in step by ``add``/``remove``."""
+
+    def __init__(self) -> None:
+        self._entries: dict[Key, _Entry] = {}
+        # Sorted (folded name, kind, name), and (word, folded name, kind, name)
+        # for every word after the first
+        self._names: list[tuple[str, str, str]] = []
+        self._words: list[tuple[str, str, str, str]] = []
+        # Built on the first query that needs it, as most searches never do
+        self._trigrams: defaultdict[str, set[Key]] | None = None
+        # "cr"/"ac"/"hp" -> sorted (value, kind, name)
+        self._values: dict[str, list[tuple[float, str, str]]] = {f: [] for f in _FIELDS}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @timed("library.index")
+    def rebuild(self, pcs: Iterable[Creature], monsters: Iterable[Creature]) -> None:
+        """Index both libraries from scratch."""
+        self.__init__()
+        for creature in pcs:
+            self._insert(creature, sort=False)
+        for creature in monsters:
+            self._insert(creature, sort=False)
+        self._names.sort()
+        self._words.sort()
+        for values in self._values.values():
+            values.sort()
+
+    def add(self, creature: Creature) -> None:
+        """Index a creature, replacing any library entry with the same name."""
+        self.remove(creature)
+        self._insert(creature, sort=True)
+
+    def remove(self, creature: Creature) -> None:
+        key = (_kind(creature), creature.name)
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        folded = entry.folded
+        self._names.remove((folded, *key))
+        for word in set(folded.split()[1:]):
+            self._words.remove((word, folded, *key))
+        if self._trigrams is not None:
+            for tri in _trigrams(folded):
+                self._trigrams[tri].discard(key)
+        for field, value in _indexed_values(entry):
+            self._values[field].remove((value, *key))
+
+    def _insert(self, creature: Creature, sort: bool) -> None:
+        kind = _kind(creature)
+        key = (kind, creature.name)
+        folded = creature.name.casefold()
+        entry = _Entry(folded, kind, creature, challenge_value(creature.challenge_rating))
+        self._entries[key] = entry
+        add = bisect.insort if sort else list.append
+        add(self._names, (folded, kind, creature.name))
+        for word in set(folded.split()[1:]):
+            add(self._words, (word, folded, kind, creature.name))
+        if self._trigrams is not None:
+            for tri in _trigrams(folded):
+                self._trigrams[tri].add(key)
+        for field, value in _indexed_values(entry):
+            add(self._values[field], (value, kind, creature.name))
+
+    def _prefix_range(self, sorted_list: list, prefix: str) -> range:
+        """Positions in ``sorted_list`` whose first item starts with ``prefix``."""
+        lo = bisect.bisect_left(sorted_list, (prefix,))
+        hi = bisect.bisect_left(sorted_list, (prefix + "\U0010ffff",), lo)
+        return range(lo, hi)
+
+    def _value_range(self, field: str, low: float | None, high: float | None) -> range:
+        """Positions in the ``field`` index with ``low <= value <= high``."""
+        values = self._values[field]
+        lo = 0 if low is None else bisect.bisect_left(values, (low,))
+        hi = len(values) if high is None else bisect.bisect_left(values, (high, "\U0010ffff"))
+        return range(lo, max(lo, hi))
+
+    def _matches(self, query: str) -> Iterator[Key]:
+        """Keys whose name matches ``query``, best first, produced lazily.
+
+        Names starting with the query come first, then names with a later
+        word starting with it, then (for 3+ characters) names containing
+        it, each in name order. Only as many keys as the caller consumes
+        are looked at.
+        """
+        names, words = self._names, self._words
+        for i in self._prefix_range(names, query):
+            yield names[i][1:]
+        seen: set[Key] = set()
+        for i in self._prefix_range(words, query):
+            _, folded, kind, name = words[i]
+            if not folded.startswith(query) and (kind, name) not in seen:
+                seen.add((kind, name))
+                yield kind, name
+        if len(query) < 3:
+            return
+        if self._trigrams is None:
+            self._trigrams = defaultdict(set)
+            for key, entry in self._entries.items():
+                for tri in _trigrams(entry.folded):
+                    self._trigrams[tri].add(key)
+        postings = sorted((self._trigrams.get(t, set()) for t in _trigrams(query)), key=len)
+        inner = []
+        for key in set.intersection(*postings) if postings else ():
+            folded = self._entries[key].folded
+            if _rank(folded, query) == 2:
+                inner.append((folded, key))
+        inner.sort()
+        for _, key in inner:
+            yield key
+
+    @timed("library.search")
+    def search(
+        self,
+        query: str = "",
+        kind: str | None = None,
+        cr_min: float | None = None,
+        cr_max: float | None = None,
+        ac_min: int | None = None,
+        ac_max: int | None = None,
+        hp_min: int | None = None,
+        hp_max: int | None = None,
+        offset: int = 0,
+        limit: int = PAGE_SIZE,
+    ) -> SearchPage:
+        """One page of library creatures matching the name query and filters.
+
+        Matches are counted up to ``COUNT_LIMIT`` past the page; beyond
+        that ``SearchPage.total`` stops growing and ``capped`` is set.
+        """
+        query = query.strip().casefold()
+        bounds = {"cr": (cr_min, cr_max), "ac": (ac_min, ac_max), "hp": (hp_min, hp_max)}
+        ranges = [
+            (field, self._value_range(field, low, high))
+            for field, (low, high) in bounds.items()
+            if low is not None or high is not None
+        ]
+        narrowest = min(ranges, key=lambda r: len(r[1]), default=None)
+
+        entries = self._entries
+        candidates: Iterable[Key]
+        if narrowest is not None and len(narrowest[1]) < RANGE_LIMIT:
+            # Few enough creatures in range to order them by name match here
+            field, positions = narrowest
+            values = self._values[field]
+            ranked = []
+            for i in positions:
+                key = values[i][1:]
+                folded = entries[key].folded
+                rank = _rank(folded, query) if query else 0
+                if rank is not None:
+                    ranked.append((rank, folded, key))
+            ranked.sort()
+            candidates = (key for _, _, key in ranked)
+        elif query:
+            candidates = self._matches(query)
+        else:
+            candidates = (name[1:] for name in self._names)
+
+        if kind is not None or ranges:
+            def keep(key: Key) -> bool:
+                e = entries[key]
+                c = e.creature
+                return (
+                    (kind is None or e.kind == kind)
+                    and (cr_min is None or (e.cr is not None and e.cr >= cr_min))
+                    and (cr_max is None or (e.cr is not None and e.cr <= cr_max))
+                    and (ac_min is None or c.armor_class >= ac_min)
+                    and (ac_max is None or c.armor_class <= ac_max)
+                    and (hp_min is None or c.max_hp >= hp_min)
+                    and (hp_max is None or c.max_hp <= hp_max)
+                )
+
+            candidates = filter(keep, candidates)
+
+        offset = max(0, offset)
+        end = offset + limit
+        items = []
+        total = 0
+        for key in candidates:
+            if offset <= total < end:
+                items.append(entries[key].creature)
+            total += 1
+            if total >= end + COUNT_LIMIT:
+                return SearchPage(items, total, offset, limit, capped=True)
+        return SearchPage(items, total, offset, limit)
+
+
+def _kind(creature: Creature) -> str:
+    return "pc" if creature.creature_type == CreatureType.PC else "monster"
+
+
+def _indexed_values(entry: _Entry) -> Iterator[tuple[str, float]]:
+    if entry.cr is not None:
+        yield "cr", entry.cr
+    yield "ac", entry.creature.armor_class
+    yield "hp", entry.creature.max_hp
+
+
+def _rank(folded: str, query: str) -> int | None:
+    """0 for a name prefix match, 1 for a later word, 2 inside a word, else None."""
+    if folded.startswith(query):
+        return 0
+    if any(word.startswith(query) for word in folded.split()[1:]):
+        return 1
+    if len(query) >= 3 and query in folded:
+        return 2
+    return None
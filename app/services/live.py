@@ -0,0 +1,191 @@
+"""Live updates for player-facing screens, pushed as Server-Sent Events.
+
+A LiveFeed follows one table's encounter. Changes made while a request is
+handled are collected and, once the handler yields to the event loop, turned
+into a few events:
+
+- ``card``: one creature's card changed (HP, temp HP, death saves, ...)
+- ``turn``: the turn or round advanced (round display + old/new current cards)
+- ``order``: creatures were added, removed or re-ordered (the whole list)
+
+Each event is rendered and encoded once, and the same bytes are queued for
+every viewer, so the cost of a mutation does not grow with the number of open
+screens. The player templates never show monster HP.
+"""
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+from collections.abc import AsyncIterator
+
+from app.models import Change, Creature, Encounter
+from app.templating import env
+
+# Messages a viewer may fall behind by before it is dropped; the browser's
+# EventSource reconnects and starts over from a full list.
+MAX_BACKLOG = 256
+KEEPALIVE_SECONDS = 15.0
+
+
+def encode_event(event: str, html: str) -> bytes:
+    """Frame an HTML fragment as one SSE message."""
+    data = "".join(f"data: {line}\n" for line in html.strip().split("\n"))
+    return f"event: {event}\n{data}\n".encode()
+
+
+class Viewer:
+    """One open player screen: a bounded queue of encoded messages."""
+
+    __slots__ = ("_pending", "_wakeup", "closed")
+
+    def __init__(self) -> None:
+        self._pending: deque[bytes] = deque()
+        self._wakeup = asyncio.Event()
+        self.closed = False
+
+    def push(self, message: bytes) -> bool:
+        """Queue a message; returns False (and closes) if the viewer is too far behind."""
+        if len(self._pending) >= MAX_BACKLOG:
+            self.closed = True
+        else:
+            self._pending.append(message)
+        self._wakeup.set()
+        return not self.closed
+
+    async def messages(self) -> AsyncIterator[bytes]:
+        while True:
+            while self._pending:
+                yield self._pending.popleft()
+            if self.closed:
+                return
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                # Comment line: keeps proxies from timing out and lets a
+                # write fail on a closed connection
+                yield b": keepalive\n\n"
+
+
+class LiveFeed:
+    """Fan-out of one table's encounter changes to its player screens."""
+
+    def __init__(self) -> None:
+        self.encounter: Encounter | None = None
+        self._viewers: set[Viewer] = set()
+        # Pending since the last flush
+        self._cards: set[str] = set()
+        self._turn_cards: set[str] = set()
+        self._turn = False
+        self._order = False
+        self._scheduled = False
+
+    def __len__(self) -> int:
+        return len(self._viewers)
+
+    def attach(self, encounter: Encounter) -> None:
+        """Follow ``encounter`` (replacing any previous one)."""
+        if self.encounter is not None:
+            self.encounter.unsubscribe(self._on_change)
+        self.encounter = encounter
+        encounter.subscribe(self._on_change)
+        if self._viewers:
+            self._order = True
+            self._schedule()
+
+    def connect(self) -> Viewer:
+        """Register a viewer, starting it off with the full list."""
+        viewer = Viewer()
+        viewer.push(self._render_order())
+        self._viewers.add(viewer)
+        return viewer
+
+    def disconnect(self, viewer: Viewer) -> None:
+        self._viewers.discard(viewer)
+
+    async def stream(self, viewer: Viewer) -> AsyncIterator[bytes]:
+        """The viewer's SSE byte stream; disconnects it when the client goes away."""
+        try:
+            async for message in viewer.messages():
+                yield message
+        finally:
+            self.disconnect(viewer)
+
+    def _on_change(self, change: Change) -> None:
+        if not self._viewers:
+            return
+        if change.creature_id is not None and not self.encounter.is_active:
+            return  # players only see the list once combat starts
+        fields = change.fields
+        if change.creature_id is None:
+            if "is_active" in fields:
+                self._order = True
+            if "current_creature_id" in fields:
+                self._turn = True
+                self._turn_cards.update(i for i in fields["current_creature_id"] if i)
+            if "round_number" in fields:
+                self._turn = True
+        elif "creature" in fields or "initiative_roll" in fields:
+            self._order = True
+        else:
+            self._cards.add(change.creature_id)
+        self._schedule()
+
+    def _schedule(self) -> None:
+        if self._scheduled:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+        # Coalesce everything one handler changes into a single flush
+        self._scheduled = True
+        loop.call_soon(self.flush)
+
+    def flush(self) -> None:
+        """Render pending changes once and queue them for every viewer."""
+        self._scheduled = False
+        messages = self._render_pending()
+        self._cards.clear()
+        self._turn_cards.clear()
+        self._turn = self._order = False
+        if not messages:
+            return
+        for viewer in list(self._viewers):
+            for message in messages:
+                if not viewer.push(message):
+                    self._viewers.discard(viewer)
+                    break
+
+    def _render_pending(self) -> list[bytes]:
+        encounter = self.encounter
+        if encounter is None or not self._viewers:
+            return []
+        if self._order:
+            return [self._render_order()]
+        messages = []
+        if self._turn:
+            creatures = [encounter.get_creature(i) for i in self._turn_cards]
+            messages.append(self._render_cards("turn", creatures, show_round=True))
+        for creature_id in self._cards - self._turn_cards:
+            creature = encounter.get_creature(creature_id)
+            if creature is not None:
+                messages.append(self._render_cards("card", [creature]))
+        return messages
+
+    def _render_cards(
+        self, event: str, creatures: list[Creature | None], show_round: bool = False
+    ) -> bytes:
+        html = env.get_template("partials/player_cards_oob.html").render(
+            encounter=self.encounter,
+            creatures=[c for c in creatures if c is not None],
+            show_round=show_round,
+        )
+        return encode_event(event, html)
+
+    def _render_order(self) -> bytes:
+        return encode_event(
+            "order",
+            env.get_template("partials/player_list.html").render(encounter=self.encounter),
+        )
@@ -0,0 +1,368 @@
+"""Monte Carlo encounter difficulty: how likely is the party to survive?
+
+The encounter's creatures are turned into combatants. Monsters attack
+with the attacks parsed from their actions text, e.g.
+``*Melee Weapon Attack:* +4 to hit ... *Hit:* 5 (1d6 + 2)``, using their
+best attack as many times as their Multiattack says. PCs use simple attack
+profiles such as ``+5 1d8+3 x2``, or a default derived from their ability
+scores. Each trial then fights to the end:
+
+- initiative is rolled, and everyone attacks a random conscious enemy
+- a natural 20 always hits and doubles the damage dice; a natural 1 misses
+- monsters die at 0 HP; PCs drop and make death saves
+- the party wins when no monster is left, and loses when no PC is conscious
+
+Trials are independent, so they are split across a process pool, each
+worker seeded from the run's seed, and the results are added up. The
+server runs them on its shared worker pool (``app.services.workers``);
+the command line starts a pool of its own.
+
+Command line::
+
+    python -m app.services.simulate --pc Ragnar --monster Goblin:4 --trials 10000
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import re
+from collections.abc import Iterable
+from concurrent.futures import Executor
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from app.models import AbilityScores, Creature, CreatureType
+from app.services import dice
+from app.services.workers import MAX_WORKERS, make_pool
+
+MAX_ROUNDS = 100
+MAX_TRIALS = 100_000
+# Below this many trials per worker, starting processes costs more than it saves
+MIN_TRIALS_PER_WORKER = 2000
+PROFICIENCY_BONUS = 2
+
+# "**Scimitar.** *Melee Weapon Attack:* +4 to hit, ... *Hit:* 5 (1d6 + 2) slashing"
+_ATTACK_RE = re.compile(
+    r"\*\*(?P<name>[^*\n]+?)\.\*\*[^\n]*?(?P<bonus>[+-]\d+) to hit"
+    r"[^\n]*?\*Hit:\*\s*\d+\s*\((?P<damage>\d+d\d+(?:\s*[+-]\s*\d+)?)\)"
+)
+_MULTIATTACK_RE = re.compile(
+    r"\*\*Multiattack\.\*\*[^\n]*?makes (?P<count>\w+)\b", re.IGNORECASE
+)
+_COUNTS = {"two": 2, "three": 3, "four": 4, "five": 5, "2": 2, "3": 3, "4": 4, "5": 5}
+_PROFILE_RE = re.compile(
+    r"\s*(?P<bonus>[+-]?\d+)\s+(?P<damage>[^\sx]+)(?:\s*x\s*(?P<count>\d+))?\s*$"
+)
+
+
+@dataclass(frozen=True, slots=True)
+class Attack:
+    name: str
+    to_hit: int
+    damage: str  # dice expression
+    count: int = 1  # attacks per turn
+
+    @property
+    def average(self) -> int:
+        return dice.parse(self.damage).average * self.count
+
+
+def parse_attacks(actions: str) -> list[Attack]:
+    """Attacks in a monster's actions text, with Multiattack applied to the best one."""
+    attacks = [
+        Attack(m.group("name"), int(m.group("bonus")), "".join(m.group("damage").split()))
+        for m in _ATTACK_RE.finditer(actions)
+    ]
+    multi = _MULTIATTACK_RE.search(actions)
+    if attacks and multi is not None:
+        best = max(attacks, key=lambda a: a.average)
+        count = _COUNTS.get(multi.group("count").lower(), 1)
+        return [Attack(best.name, best.to_hit, best.damage, count)]
+    return attacks
+
+
+def parse_attack_profile(text: str, name: str = "Attack") -> Attack:
+    """``"+5 1d8+3"`` or ``"+7 2d6+4 x2"``: to-hit bonus, damage, attacks per turn."""
+    m = _PROFILE_RE.match(text)
+    if m is None:
+        raise ValueError(f"Not an attack profile (e.g. '+5 1d8+3 x2'): {text!r}")
+    dice.parse(m.group("damage"))
+    return Attack(name, int(m.group("bonus")), m.group("damage"), int(m.group("count") or 1))
+
+
+def default_attack(creature: Creature) -> Attack:
+    """A plain weapon attack from the better of STR and DEX."""
+    a = creature.abilities
+    mod = max(AbilityScores.modifier(a.strength), AbilityScores.modifier(a.dexterity))
+    return Attack("Weapon", PROFICIENCY_BONUS + mod, f"1d8{mod:+d}")
+
+
+@dataclass(frozen=True, slots=True)
+class Combatant:
+    """What a simulated combat needs to know about one creature."""
+
+    name: str
+    is_pc: bool
+    max_hp: int
+    armor_class: int
+    initiative_modifier: int
+    attack: Attack
+
+
+def combatants(
+    creatures: Iterable[Creature], pc_attacks: dict[str, Attack] | None = None
+) -> list[Combatant]:
+    pc_attacks = pc_attacks or {}
+    result = []
+    for c in creatures:
+        is_pc = c.creature_type == CreatureType.PC
+        if is_pc:
+            attack = pc_attacks.get(c.name) or default_attack(c)
+        else:
+            parsed = parse_attacks(str(c.actions))
+            attack = max(parsed, key=lambda a: a.average) if parsed else default_attack(c)
+        result.append(
+            Combatant(c.name, is_pc, c.max_hp, c.armor_class, c.initiative_modifier, attack)
+        )
+    return result
+
+
+@dataclass
+class SimulationReport:
+    trials: int
+    wins: int = 0
+    total_rounds: int = 0
+    # Combatant names, by position in the simulated side
+    names: list[str] = field(default_factory=list)
+    # PC position -> trials in which they dropped to 0 HP / died; by
+    # position, as two PCs may share a name
+    downed: dict[int, int] = field(default_factory=dict)
+    killed: dict[int, int] = field(default_factory=dict)
+
+    def merge(self, other: SimulationReport) -> None:
+        self.trials += other.trials
+        self.wins += other.wins
+        self.total_rounds += other.total_rounds
+        self.names = self.names or other.names
+        for mine, theirs in ((self.downed, other.downed), (self.killed, other.killed)):
+            for i, n in theirs.items():
+                mine[i] = mine.get(i, 0) + n
+
+    def pc_stats(self) -> list[tuple[str, int, int]]:
+        """(name, downed, killed) per PC; a repeated name gets " (2)", " (3)", ..."""
+        seen: dict[str, int] = {}
+        rows = []
+        for i, downed in self.downed.items():
+            name = self.names[i]
+            seen[name] = seen.get(name, 0) + 1
+            label = name if seen[name] == 1 else f"{name} ({seen[name]})"
+            rows.append((label, downed, self.killed[i]))
+        return rows
+
+    @property
+    def win_probability(self) -> float:
+        return self.wins / self.trials if self.trials else 0.0
+
+    @property
+    def expected_rounds(self) -> float:
+        return self.total_rounds / self.trials if self.trials else 0.0
+
+    def summary(self) -> dict:
+        n = self.trials or 1
+        return {
+            "trials": self.trials,
+            "win_probability": round(self.win_probability, 4),
+            "expected_rounds": round(self.expected_rounds, 2),
+            "pc_downed_probability": {k: round(d / n, 4) for k, d, _ in self.pc_stats()},
+            "pc_death_probability": {k: round(x / n, 4) for k, _, x in self.pc_stats()},
+        }
+
+
+def _run_trials(side: list[Combatant], trials: int, seed: int | None) -> SimulationReport:
+    rng = random.Random(seed)
+    # int(rand() * 20) + 1 is a fair d20 and several times cheaper than randint
+    rand = rng.random
+    n = len(side)
+    pcs = [i for i in range(n) if side[i].is_pc]
+    attacks = [
+        (c.attack.to_hit, dice.parse(c.attack.damage), c.attack.count) for c in side
+    ]
+    report = SimulationReport(
+        trials,
+        names=[c.name for c in side],
+        downed=dict.fromkeys(pcs, 0),
+        killed=dict.fromkeys(pcs, 0),
+    )
+
+    for _ in range(trials):
+        hp = [c.max_hp for c in side]
+        downed = [False] * n
+        out = [False] * n  # dead, or stable and out of the fight
+        saves = [0] * n
+        fails = [0] * n
+        order = sorted(
+            range(n), key=lambda i: -(int(rand() * 20) + 1 + side[i].initiative_modifier)
+        )
+        up_pcs = list(pcs)
+        monsters = [i for i in range(n) if not side[i].is_pc]
+        rounds = 0
+        while up_pcs and monsters and rounds < MAX_ROUNDS:
+            rounds += 1
+            for i in order:
+                if out[i]:
+                    continue
+                me = side[i]
+                if hp[i] <= 0:
+                    # Death saving throw (PCs only; monsters are dead at 0)
+                    roll = int(rand() * 20) + 1
+                    if roll == 20:
+                        hp[i] = 1
+                        saves[i] = fails[i] = 0
+                        up_pcs.append(i)
+                    elif roll >= 10:
+                        saves[i] += 1
+                        if saves[i] >= 3:
+                            out[i] = True  # stable
+                    else:
+                        fails[i] += 2 if roll == 1 else 1
+                        if fails[i] >= 3:
+                            out[i] = True
+                            report.killed[i] += 1
+                    continue
+                to_hit, damage, count = attacks[i]
+                targets = monsters if me.is_pc else up_pcs
+                for _ in range(count):
+                    if not targets:
+                        break
+                    j = targets[int(rand() * len(targets))]
+                    roll = int(rand() * 20) + 1
+                    if roll == 1 or (roll < 20 and roll + to_hit < side[j].armor_class):
+                        continue
+                    dealt = damage.roll(rng)
+                    if roll == 20:
+                        dealt += damage.roll(rng) - damage.modifier
+                    hp[j] -= max(0, dealt)
+                    if hp[j] <= 0:
+                        hp[j] = 0
+                        targets.remove(j)
+                        if side[j].is_pc:
+                            if not downed[j]:
+                                downed[j] = True
+                                report.downed[j] += 1
+                            saves[j] = fails[j] = 0
+                        else:
+                            out[j] = True
+                if not (up_pcs and monsters):
+                    break
+            if not (up_pcs and monsters):
+                break
+        report.total_rounds += rounds
+        if not monsters:
+            report.wins += 1
+    return report
+
+
+def simulate(
+    creatures: Iterable[Creature],
+    trials: int = 10_000,
+    pc_attacks: dict[str, Attack] | None = None,
+    seed: int | None = None,
+    workers: int = 1,
+    pool: Executor | None = None,
+) -> SimulationReport:
+    """Fight the encounter ``trials`` times; see the module docstring."""
+    return simulate_combatants(combatants(creatures, pc_attacks), trials, seed, workers, pool)
+
+
+def simulate_combatants(
+    side: list[Combatant],
+    trials: int = 10_000,
+    seed: int | None = None,
+    workers: int = 1,
+    pool: Executor | None = None,
+) -> SimulationReport:
+    """``simulate`` for combatants already taken from the creatures.
+
+    With a ``pool`` (of at least ``workers`` processes) trials run there;
+    otherwise ``workers`` > 1 starts a pool for this run alone.
+    """
+    if not any(c.is_pc for c in side) or all(c.is_pc for c in side):
+        raise ValueError("The encounter needs at least one PC and one monster")
+
+    trials = max(1, min(trials, MAX_TRIALS))
+    workers = max(1, min(workers, MAX_WORKERS, trials // MIN_TRIALS_PER_WORKER))
+    if workers == 1 and pool is None:
+        return _run_trials(side, trials, seed)
+
+    base = random.Random(seed)
+    shares = [trials // workers + (k < trials % workers) for k in range(workers)]
+    seeds = [base.getrandbits(64) for _ in shares]
+    if pool is not None:
+        parts = list(pool.map(_run_trials, [side] * workers, shares, seeds))
+    else:
+        with make_pool(workers) as own:
+            parts = list(own.map(_run_trials, [side] * workers, shares, seeds))
+    report = SimulationReport(0)
+    for part in parts:
+        report.merge(part)
+    return report
+
+
+def main(argv: list[str] | None = None) -> None:
+    from app import state
+    from app.main import MONSTERS_DIR, PCS_DIR
+    from app.parsers.character_md import load_all_pcs
+    from app.parsers.monster_md import load_all_monsters
+
+    parser = argparse.ArgumentParser(
+        prog="python -m app.services.simulate",
+        description="Estimate how likely the party is to survive an encounter.",
+    )
+    parser.add_argument("--pc", action="append", default=[], help="PC name (repeatable)")
+    parser.add_argument(
+        "--monster", action="append", default=[], help="Monster name, optionally NAME:COUNT"
+    )
+    parser.add_argument(
+        "--attack",
+        action="append",
+        default=[],
+        help='PC attack profile, e.g. "Ragnar=+5 1d8+3 x2"',
+    )
+    parser.add_argument("--trials", type=int, default=10_000)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--workers", type=int, default=0, help="0 = one per CPU")
+    parser.add_argument("--pcs-dir", type=Path, default=PCS_DIR)
+    parser.add_argument("--monsters-dir", type=Path, default=MONSTERS_DIR)
+    args = parser.parse_args(argv)
+
+    load_all_pcs(args.pcs_dir)
+    load_all_monsters(args.monsters_dir)
+    creatures = []
+    for name in args.pc:
+        if name not in state.pc_library:
+            parser.error(f"unknown PC: {name}")
+        creatures.append(state.pc_library[name])
+    for spec in args.monster:
+        name, _, count = spec.partition(":")
+        if name not in state.monster_library:
+            parser.error(f"unknown monster: {name}")
+        creatures += [state.monster_library[name]] * int(count or 1)
+    pc_attacks = {}
+    for spec in args.attack:
+        name, _, profile = spec.partition("=")
+        pc_attacks[name] = parse_attack_profile(profile, name)
+
+    report = simulate(
+        creatures,
+        args.trials,
+        pc_attacks,
+        seed=args.seed,
+        workers=args.workers or os.cpu_count() or 1,
+    )
+    print(json.dumps(report.summary(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
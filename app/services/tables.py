@@ -0,0 +1,156 @@
+"""Game tables: one encounter per table, looked up by table id.
+
+Each table has its own lock, so requests for different tables never wait
+on each other. It also has its own journal under ``<data_dir>/<table id>/``,
+live feed for player screens, cache of rendered creature cards,
+undo/redo history and log of recent changes for the JSON API.
+
+Only DM setup actions create a table; everything else, player screens
+and API reads included, is answered with a 404 for a table that does not
+exist.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import re
+import time
+from collections import OrderedDict
+from collections.abc import Iterator
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from app.models import Encounter
+from app.services.cards import CardCache
+from app.services.changelog import ChangeLog
+from app.services.history import History
+from app.services.journal import GroupCommitter, Journal
+from app.services.live import LiveFeed
+
+DEFAULT_TABLE = "default"
+# Journaled tables kept open (one journal file each); idle ones beyond this are closed
+MAX_OPEN_TABLES = int(os.environ.get("DND_MAX_OPEN_TABLES", "64"))
+# A table used more recently than this is never closed
+IDLE_SECONDS = 300.0
+_TABLE_ID_RE = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+
+def valid_table_id(table_id: str | None) -> bool:
+    return table_id is not None and _TABLE_ID_RE.fullmatch(table_id) is not None
+
+
+@dataclass
+class Table:
+    id: str
+    encounter: Encounter
+    journal: Journal | None = None
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    feed: LiveFeed = field(default_factory=LiveFeed)
+    cards: CardCache = field(default_factory=CardCache)
+    history: History = field(default_factory=History)
+    changes: ChangeLog = field(default_factory=ChangeLog)
+
+    def __post_init__(self) -> None:
+        self.feed.attach(self.encounter)
+        self.cards.attach(self.encounter)
+        self.history.attach(self.encounter)
+        self.changes.attach(self.encounter)
+
+    def reset(self) -> None:
+        """Replace the encounter with an empty one.
+
+        Versions carry on from the old encounter, so journal entries of
+        the table stay in version order.
+        """
+        self.encounter = Encounter(version=self.encounter.version)
+        if self.journal is not None:
+            self.journal.attach(self.encounter)
+        self.feed.attach(self.encounter)
+        self.cards.attach(self.encounter)
+        self.history.attach(self.encounter)
+        self.changes.attach(self.encounter)
+
+
+class TableRegistry:
+    """All tables served by this process.
+
+    Tables are only made by ``create`` (a DM setting one up); ``get`` finds
+    an existing one, in memory or, with a ``data_dir``, journaled there by
+    an earlier run. At most ``max_open`` journaled tables are kept open:
+    beyond that, the least recently used ones that are idle (unused for
+    ``idle_seconds``, unlocked, no player screens) are closed, along with
+    their journal file, and restored from it when next used.
+    """
+
+    def __init__(
+        self,
+        data_dir: Path | None = None,
+        max_open: int = MAX_OPEN_TABLES,
+        idle_seconds: float = IDLE_SECONDS,
+    ) -> None:
+        self.data_dir = data_dir
+        self.max_open = max_open
+        self.idle_seconds = idle_seconds
+        # Least recently used first; table id -> (table, monotonic time of last use)
+        self._tables: OrderedDict[str, tuple[Table, float]] = OrderedDict()
+        self._committer = GroupCommitter() if data_dir is not None else None
+
+    def __len__(self) -> int:
+        return len(self._tables)
+
+    def __iter__(self) -> Iterator[Table]:
+        return (table for table, _ in list(self._tables.values()))
+
+    def get(self, table_id: str) -> Table | None:
+        """The table ``table_id``, if it exists (opening it if need be)."""
+        entry = self._tables.get(table_id)
+        if entry is not None:
+            table = entry[0]
+        elif self.data_dir is not None and (self.data_dir / table_id).is_dir():
+            table = self._open(table_id)
+        else:
+            return None
+        self._use(table)
+        return table
+
+    def create(self, table_id: str) -> Table:
+        """The table ``table_id``, set up empty if it does not exist yet."""
+        table = self.get(table_id)
+        if table is None:
+            table = self._open(table_id)
+            self._use(table)
+        return table
+
+    def _use(self, table: Table) -> None:
+        self._tables[table.id] = (table, time.monotonic())
+        self._tables.move_to_end(table.id)
+        if len(self._tables) > self.max_open:
+            self._evict()
+
+    def _evict(self) -> None:
+        """Close idle tables, least recently used first, down to ``max_open``."""
+        if self._committer is None:
+            return  # nowhere to restore them from
+        cutoff = time.monotonic() - self.idle_seconds
+        # Never the table just asked for, the last one
+        for table_id, (table, used) in list(self._tables.items())[:-1]:
+            if len(self._tables) <= self.max_open or used > cutoff:
+                break
+            if table.lock.locked() or len(table.feed):
+                continue
+            del self._tables[table_id]
+            self._committer.remove(table.journal)
+            table.journal.close()
+
+    def _open(self, table_id: str) -> Table:
+        if self.data_dir is None or self._committer is None:
+            return Table(table_id, Encounter())
+        journal = Journal(self.data_dir / table_id)
+        encounter = journal.restore()
+        journal.attach(encounter, restored=True)
+        self._committer.add(journal)
+        return Table(table_id, encounter, journal)
+
+    def close(self) -> None:
+        if self._committer is not None:
+            self._committer.close()
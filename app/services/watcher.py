@@ -0,0 +1,222 @@
+"""Hot reload of the asset directories.
+
+A background task watches ``assets/pcs`` and ``assets/monsters`` and
+re-parses only the stat block files that were added or edited. Events come
+from ``watchfiles`` (inotify on Linux) when it is installed; otherwise the
+directories are polled and files compared by mtime and size.
+
+Duplicate names resolve as on startup (``select_pcs`` keeps the
+highest-level PC file; the last monster file by path wins), so deleting a
+file brings back the entry it had hidden, or removes the name altogether.
+Files are parsed in a worker thread, and the library is then replaced by
+an updated copy in one step on the event loop. A request therefore sees
+either the old library or the new one, never a partial update. Creatures
+uploaded through ``/creatures/upload-*`` are left alone.
+"""
+from __future__ import annotations
+
+import asyncio
+import importlib.util
+import logging
+import os
+import time
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from app import state
+from app.metrics import timed
+from app.models import Creature
+from app.parsers.loader import StatBlockParser, parse_stat_file
+from app.services.library import REBUILD_AFTER
+
+# Imported by the watch task itself, after startup has served its first page
+HAVE_WATCHFILES = importlib.util.find_spec("watchfiles") is not None
+
+log = logging.getLogger(__name__)
+
+POLL_INTERVAL = 1.0
+POLL_BACKOFF = 10  # wait at least this many times as long as the last scan took
+PATTERN_SUFFIX = "_stats.md"
+
+# Per changed file: (creature, (mtime_ns, size)); no creature if it could
+# not be parsed, and neither if the file is gone
+_Result = tuple[Creature | None, tuple[int, int] | None]
+
+
+@dataclass
+class WatchedLibrary:
+    """One asset directory and the library its files feed."""
+
+    directory: Path
+    parse: StatBlockParser
+    # Parsed files -> name -> library entry (the duplicate-name rule)
+    select: Callable[[dict[Path, Creature]], dict[str, Creature]]
+    attr: str  # "pc_library" / "monster_library" on app.state
+    # Creature parsed from each file, and the (mtime_ns, size) it was read at
+    files: dict[Path, Creature] = field(default_factory=dict)
+    stamps: dict[Path, tuple[int, int]] = field(default_factory=dict)
+
+
+def _is_stat_file(path: Path) -> bool:
+    return path.name.endswith(PATTERN_SUFFIX)
+
+
+def _stamp(path: Path) -> tuple[int, int] | None:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def _scan(directory: Path) -> dict[Path, tuple[int, int]]:
+    stamps = {}
+    try:
+        entries = list(os.scandir(directory))
+    except OSError:
+        return stamps
+    for entry in entries:
+        if entry.name.endswith(PATTERN_SUFFIX) and entry.is_file():
+            st = entry.stat()
+            stamps[Path(entry.path)] = (st.st_mtime_ns, st.st_size)
+    return stamps
+
+
+class LibraryWatcher:
+    """Keeps the PC and monster libraries in step with their directories."""
+
+    def __init__(self, libraries: Iterable[WatchedLibrary], poll_interval: float = POLL_INTERVAL):
+        self.libraries = list(libraries)
+        self.poll_interval = poll_interval
+        self.backend = "watchfiles" if HAVE_WATCHFILES else "polling"
+        self._task: asyncio.Task | None = None
+        self._stop = asyncio.Event()
+
+    def start(self) -> None:
+        """Take a baseline of every directory and start watching."""
+        for lib in self.libraries:
+            lib.stamps = {p: s for p in lib.files if (s := _stamp(p)) is not None}
+        run = self._watch if self.backend == "watchfiles" else self._poll
+        self._task = asyncio.get_running_loop().create_task(run())
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._task is None:
+            return
+        # watchfiles checks the stop event between steps; cancelling it
+        # instead could leave its thread running at interpreter exit
+        done, _ = await asyncio.wait({self._task}, timeout=2)
+        if not done:
+            self._task.cancel()
+
+    async def _watch(self) -> None:
+        import watchfiles
+
+        dirs = [str(lib.directory) for lib in self.libraries if lib.directory.is_dir()]
+        if not dirs:
+            return
+        async for changes in watchfiles.awatch(*dirs, stop_event=self._stop):
+            await self.refresh({Path(p) for _, p in changes})
+
+    async def _poll(self) -> None:
+        interval = self.poll_interval
+        while not self._stop.is_set():
+            try:
+                await asyncio.wait_for(self._stop.wait(), interval)
+            except asyncio.TimeoutError:
+                pass
+            else:
+                return
+            start = time.perf_counter()
+            await self.refresh()
+            # Big directories take a while to scan: keep that under ~10% of the time
+            interval = max(self.poll_interval, (time.perf_counter() - start) * POLL_BACKOFF)
+
+    async def refresh(self, paths: set[Path] | None = None) -> None:
+        """Apply changes to ``paths``, or to whatever differs on disk if None."""
+        for lib in self.libraries:
+            changed = await asyncio.to_thread(self._changed, lib, paths)
+            if changed:
+                results = await asyncio.to_thread(self._parse, lib, changed)
+                self._apply(lib, results)
+
+    @staticmethod
+    def _changed(lib: WatchedLibrary, paths: set[Path] | None) -> set[Path]:
+        """Files in ``lib`` whose mtime/size differ from what was loaded."""
+        if paths is None:
+            current = _scan(lib.directory)
+            return {
+                p for p in current.keys() | lib.stamps.keys()
+                if current.get(p) != lib.stamps.get(p)
+            }
+        # Event paths may be resolved; ours are as the directory was given
+        directory = lib.directory.resolve()
+        ours = {
+            parent for parent in {p.parent for p in paths} if parent.resolve() == directory
+        }
+        candidates = {lib.directory / p.name for p in paths if p.parent in ours and _is_stat_file(p)}
+        return {p for p in candidates if _stamp(p) != lib.stamps.get(p)}
+
+    @staticmethod
+    @timed("library.reload")
+    def _parse(lib: WatchedLibrary, paths: set[Path]) -> dict[Path, _Result]:
+        results: dict[Path, _Result] = {}
+        for path in paths:
+            stamp = _stamp(path)
+            if stamp is None:
+                results[path] = (None, None)
+                continue
+            try:
+                parsed = parse_stat_file(path, lib.parse)
+            except Exception:
+                # Mid-write or malformed: keep the old entry until the file changes again
+                log.warning("Could not parse %s", path, exc_info=True)
+                results[path] = (None, stamp)
+                continue
+            results[path] = (parsed.creature, (parsed.mtime_ns, parsed.size))
+        return results
+
+    def _apply(self, lib: WatchedLibrary, results: dict[Path, _Result]) -> None:
+        """Swap the changed files' creatures into the library (on the event loop)."""
+        old = {p: lib.files[p] for p in results if p in lib.files}
+        names = {c.name for c in old.values()}
+        for path, (creature, stamp) in results.items():
+            if stamp is None:
+                lib.files.pop(path, None)
+                lib.stamps.pop(path, None)
+                continue
+            lib.stamps[path] = stamp
+            if creature is None:
+                old.pop(path, None)  # unparseable: its old creature stays
+            else:
+                lib.files[path] = creature
+                names.add(creature.name)
+        if not names:
+            return
+
+        winners = lib.select({p: c for p, c in lib.files.items() if c.name in names})
+        library: dict[str, Creature] = dict(getattr(state, lib.attr))
+        added, removed = [], []
+        for name in names:
+            current = library.get(name)
+            winner = winners.get(name)
+            if winner is not None:
+                if winner is not current:
+                    library[name] = winner
+                    added.append(winner)
+            elif current is not None and any(current is c for c in old.values()):
+                # Its file was deleted or renamed the creature; not an upload
+                del library[name]
+                removed.append(current)
+        setattr(state, lib.attr, library)
+
+        index = state.library_index
+        if len(added) + len(removed) > REBUILD_AFTER:
+            index.rebuild(state.pc_library.values(), state.monster_library.values())
+        else:
+            for creature in removed:
+                index.remove(creature)
+            for creature in added:
+                index.add(creature)
+        log.info("Reloaded %d file(s) in %s", len(results), lib.directory)
@@ -0,0 +1,24 @@
+"""The process pool shared by CPU-heavy requests: simulations and bulk imports.
+
+The server creates it once at startup (``state.worker_pool``) rather than
+one per request. Its processes are spawned, not forked: a fork of the
+running server would inherit its event loop, the journal committer and
+watcher threads, open journal files and any lock another thread held at
+that moment (logging's, say), and could deadlock on one of them.
+"""
+from __future__ import annotations
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+# More processes than this only add start-up and merge overhead
+MAX_WORKERS = 8
+
+
+def make_pool(workers: int) -> ProcessPoolExecutor | None:
+    """A spawned pool of ``workers`` processes, or None for one (run in-process)."""
+    if workers <= 1:
+        return None
+    return ProcessPoolExecutor(
+        max_workers=min(workers, MAX_WORKERS), mp_context=multiprocessing.get_context("spawn")
+    )
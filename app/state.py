@@ -1,4 +1,14 @@
-from app.models import Creature, Encounter
+from __future__ import annotations
+
+from concurrent.futures import Executor
+from typing import TYPE_CHECKING
+
+from app.models import Creature
+from app.services.library import LibraryIndex
+from app.services.tables import TableRegistry
+
+if TYPE_CHECKING:
+    from app.services.watcher import LibraryWatcher
 
 # Monster library: name -> template Creature (copied when adding to encounter)
 monster_library: dict[str, Creature] = {}
@@ -6,5 +16,15 @@ monster_library: dict[str, Creature] = {}
 # PC library: name -> Creature
 pc_library: dict[str, Creature] = {}
 
-# Active encounter (single encounter at a time for MVP)
-encounter: Encounter = Encounter()
+# Name/CR search index over both libraries (rebuilt once startup loads them)
+library_index: LibraryIndex = LibraryIndex()
+
+# Game tables, each with its own encounter (journaled once startup runs)
+tables: TableRegistry = TableRegistry()
+
+# Process pool shared by simulations and bulk imports (None: run them in a thread)
+worker_pool: Executor | None = None
+worker_count: int = 1
+
+# Reloads the libraries when asset files change (started on startup)
+watcher: LibraryWatcher | None = None
@@ -0,0 +1,49 @@
+"""The one Jinja environment shared by the app, routers and services.
+
+Templates are compiled up front by ``precompile`` (called on startup), so
+no request pays for compiling one. With a cache directory the compiled
+bytecode is also kept on disk, and later startups load it instead of
+compiling again; Jinja invalidates an entry when its template changes.
+
+Every render is timed into ``dnd_template_render_seconds`` (by the name
+of the template rendered; includes count toward their parent).
+"""
+from __future__ import annotations
+
+import time
+from pathlib import Path
+from typing import Any
+
+from fastapi.templating import Jinja2Templates
+from jinja2 import FileSystemBytecodeCache, Template
+
+from app.metrics import RENDER_SECONDS
+
+TEMPLATES_DIR = Path(__file__).parent / "templates"
+
+
+class TimedTemplate(Template):
+    """A template that records how long each render takes."""
+
+    def render(self, *args: Any, **kwargs: Any) -> str:
+        start = time.perf_counter()
+        try:
+            return super().render(*args, **kwargs)
+        finally:
+            RENDER_SECONDS.observe((self.name or "<string>",), time.perf_counter() - start)
+
+
+templates = Jinja2Templates(directory=TEMPLATES_DIR)
+env = templates.env
+env.template_class = TimedTemplate
+
+
+def precompile(cache_dir: Path | None = None) -> int:
+    """Compile every template now; returns how many there are."""
+    if cache_dir is not None:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        env.bytecode_cache = FileSystemBytecodeCache(str(cache_dir))
+    names = env.list_templates(extensions=["html"])
+    for name in names:
+        env.get_template(name)
+    return len(names)
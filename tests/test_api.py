@@ -0,0 +1,119 @@
+"""JSON API: ETags and 304s, diffs since a version, full resends, unknown ids."""
+import asyncio
+
+import httpx
+import pytest
+
+from app import state
+from app.main import app
+from app.models import Creature, CreatureType
+from app.services import combat
+from app.services.changelog import ChangeLog
+from app.services.tables import TableRegistry
+
+PARAMS = {"table": "t"}
+
+
+@pytest.fixture
+def table(monkeypatch):
+    registry = TableRegistry()
+    monkeypatch.setattr(state, "tables", registry)
+    table = registry.create("t")
+    # A short log, so a client can fall behind it
+    table.changes = ChangeLog(limit=4)
+    table.changes.attach(table.encounter)
+    for name, roll in (("Goblin", 15), ("Ogre", 8)):
+        creature = Creature(name=name, creature_type=CreatureType.MONSTER, max_hp=30)
+        creature.initiative_roll = roll
+        table.encounter.add_creature(creature)
+    combat.start_combat(table.encounter)
+    return table
+
+
+def call(*requests: tuple) -> list[httpx.Response]:
+    """Send (method, path, kwargs) requests in order, on the table "t"."""
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            return [
+                await http.request(method, path, params=kwargs.pop("params", PARAMS), **kwargs)
+                for method, path, kwargs in requests
+            ]
+
+    return asyncio.run(run())
+
+
+def since(response: httpx.Response) -> tuple:
+    return "GET", "/api/v1/encounter", {"params": {**PARAMS, "since": response.headers["ETag"]}}
+
+
+def ids(table) -> dict[str, str]:
+    return {c.name: c.id for c in table.encounter.creatures}
+
+
+def test_matching_etag_gets_a_304(table):
+    (first,) = call(("GET", "/api/v1/encounter", {}))
+    etag = first.headers["ETag"]
+    assert first.json()["full"] is True
+    same, weak, stale = call(
+        ("GET", "/api/v1/encounter", {"headers": {"If-None-Match": etag}}),
+        ("GET", "/api/v1/encounter", {"headers": {"If-None-Match": f'"other", W/{etag}'}}),
+        ("GET", "/api/v1/encounter", {"headers": {"If-None-Match": '"old-1"'}}),
+    )
+    assert (same.status_code, same.headers["ETag"], same.content) == (304, etag, b"")
+    assert weak.status_code == 304
+    assert stale.status_code == 200 and stale.json()["full"] is True
+
+
+def test_diffs_since_an_earlier_version(table):
+    c = ids(table)
+    (start,) = call(("GET", "/api/v1/encounter", {}))
+    etag = start.headers["ETag"]
+    damaged, turned, later = call(
+        ("POST", f"/api/v1/encounter/damage/{c['Ogre']}", {"json": {"amount": 5}}),
+        ("POST", "/api/v1/encounter/next-turn", {}),
+        since(start),
+    )
+    # A mutation returns just what it changed
+    assert damaged.json()["creatures"] == {c["Ogre"]: {"current_hp": 25}}
+    assert turned.json()["encounter"] == {"current_creature_id": c["Ogre"]}
+    body = later.json()
+    assert "full" not in body
+    assert body["creatures"] == {c["Ogre"]: {"current_hp": 25}}
+    assert body["encounter"] == {"current_creature_id": c["Ogre"]}
+    assert later.headers["ETag"] == turned.headers["ETag"] != etag
+
+
+def test_a_client_behind_the_log_gets_everything_again(table):
+    c = ids(table)
+    (start,) = call(("GET", "/api/v1/encounter", {}))
+    damage = ("POST", f"/api/v1/encounter/damage/{c['Goblin']}", {"json": {"amount": 1}})
+    call(*[damage] * 6)  # more changes than the log keeps
+    (behind,) = call(since(start))
+    body = behind.json()
+    assert body["full"] is True
+    assert body["creatures"][c["Goblin"]]["current_hp"] == 24
+    assert body["order"] == [c["Goblin"], c["Ogre"]]
+
+    # After a reset the old epoch's versions mean nothing
+    table.reset()
+    (other_epoch,) = call(since(behind))
+    assert other_epoch.json()["full"] is True
+    assert other_epoch.json()["creatures"] == {}
+
+
+def test_unknown_ids_and_bad_bodies(table):
+    c = ids(table)
+    missing, negative, no_table, no_table_post = call(
+        ("POST", "/api/v1/encounter/heal/nobody", {"json": {"amount": 5}}),
+        ("POST", f"/api/v1/encounter/damage/{c['Ogre']}", {"json": {"amount": -5}}),
+        ("GET", "/api/v1/encounter", {"params": {"table": "nowhere"}}),
+        ("POST", "/api/v1/encounter/next-turn", {"params": {"table": "nowhere"}}),
+    )
+    assert missing.status_code == 404
+    assert missing.json() == {"detail": "No creature 'nobody'"}
+    assert negative.status_code == 422
+    assert no_table.status_code == no_table_post.status_code == 404
+    assert table.encounter.get_creature(c["Ogre"]).current_hp == 30
+    assert state.tables.get("nowhere") is None
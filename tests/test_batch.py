@@ -0,0 +1,120 @@
+"""Batch operations: several targets and kinds at once, rolled area damage, one undo step."""
+import asyncio
+
+import httpx
+import pytest
+
+from app import state
+from app.main import app
+from app.models import Creature, CreatureType
+from app.services.combat import CombatAction, apply_actions
+from app.services.journal import Journal
+from app.services.tables import TableRegistry
+
+
+@pytest.fixture
+def table(tmp_path, monkeypatch):
+    registry = TableRegistry(tmp_path)
+    monkeypatch.setattr(state, "tables", registry)
+    table = registry.create("t")
+    for name in ("Goblin", "Ogre", "Troll"):
+        table.encounter.add_creature(
+            Creature(name=name, creature_type=CreatureType.MONSTER, max_hp=100)
+        )
+    table.history.seal()
+    yield table
+    registry.close()
+
+
+def ids(table) -> dict[str, str]:
+    return {c.name: c.id for c in table.encounter.creatures}
+
+
+def hp(table) -> dict[str, tuple[int, int]]:
+    return {c.name: (c.current_hp, c.temp_hp) for c in table.encounter.creatures}
+
+
+def post(path: str, body: dict) -> httpx.Response:
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            return await http.post(path, params={"table": "t"}, json=body)
+
+    return asyncio.run(run())
+
+
+def test_mixed_operations_and_unknown_targets(table):
+    c = ids(table)
+    table.encounter.get_creature(c["Ogre"]).current_hp = 50
+    affected = apply_actions(
+        table.encounter,
+        [
+            CombatAction("temp_hp", c["Goblin"], 5),
+            CombatAction("damage", c["Goblin"], 8),
+            CombatAction("heal", c["Ogre"], 20),
+            CombatAction("damage", "gone", 30),  # removed mid-fight: skipped
+            CombatAction("damage", c["Troll"], 9, half=True),
+        ],
+    )
+    assert affected == [c["Goblin"], c["Ogre"], c["Troll"]]
+    assert hp(table) == {"Goblin": (97, 0), "Ogre": (70, 0), "Troll": (96, 0)}
+
+
+@pytest.mark.parametrize("path", ["/encounter/batch", "/api/v1/encounter/batch"])
+def test_rolled_damage_is_shared_and_reported(table, path):
+    c = ids(table)
+    response = post(
+        path,
+        {
+            "roll": "8d6",
+            "operations": [
+                {"action": "damage", "creature_id": c["Goblin"]},
+                {"action": "damage", "creature_id": c["Ogre"], "half": True},
+                {"action": "heal", "creature_id": c["Troll"], "amount": 5},
+                {"action": "damage", "creature_id": "nobody"},
+            ],
+        },
+    )
+    assert response.status_code == 200
+    total = int(response.headers["X-Roll-Total"])
+    assert 8 <= total <= 48
+    assert hp(table) == {
+        "Goblin": (100 - total, 0),
+        "Ogre": (100 - total // 2, 0),
+        "Troll": (100, 0),
+    }
+
+
+def test_bad_operations_are_rejected(table):
+    c = ids(table)
+    for body in (
+        {"roll": "8q6", "operations": [{"action": "damage", "creature_id": c["Goblin"]}]},
+        {"operations": [{"action": "explode", "creature_id": c["Goblin"]}]},
+    ):
+        assert post("/api/v1/encounter/batch", body).status_code == 422
+    assert hp(table)["Goblin"] == (100, 0)
+
+
+def test_a_batch_is_one_undo_step_and_journaled(table, tmp_path):
+    c = ids(table)
+    before = hp(table)
+    undo_depth = len(table.history._undo)
+    body = {
+        "operations": [
+            {"action": "damage", "creature_id": c["Goblin"], "amount": 10},
+            {"action": "damage", "creature_id": c["Ogre"], "amount": 20},
+            {"action": "temp_hp", "creature_id": c["Troll"], "amount": 7},
+        ]
+    }
+    diff = post("/api/v1/encounter/batch", body).json()
+    assert set(diff["creatures"]) == set(c.values())
+    assert len(table.history._undo) == undo_depth + 1
+    after = hp(table)
+    table.journal.flush()
+    restored = Journal(tmp_path / "t").restore()
+    assert {c.name: (c.current_hp, c.temp_hp) for c in restored.creatures} == after
+
+    post("/api/v1/encounter/undo", {})
+    assert hp(table) == before
+    post("/api/v1/encounter/redo", {})
+    assert hp(table) == after
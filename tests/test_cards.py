@@ -0,0 +1,71 @@
+"""Card cache: cached until something a card shows changes, including other creatures' names."""
+import random
+
+import pytest
+
+from app.models import Creature, CreatureType, Encounter
+from app.services import combat
+from app.services.cards import CardCache
+
+
+@pytest.fixture
+def encounter() -> Encounter:
+    encounter = Encounter()
+    for name in ("Aria", "Goblin", "Ogre"):
+        kind = CreatureType.PC if name == "Aria" else CreatureType.MONSTER
+        encounter.add_creature(Creature(name=name, creature_type=kind, max_hp=20))
+    combat.start_combat(encounter, random.Random(3))
+    return encounter
+
+
+@pytest.fixture
+def cards(encounter) -> CardCache:
+    cards = CardCache()
+    cards.attach(encounter)
+    return cards
+
+
+def by_name(encounter: Encounter, name: str) -> Creature:
+    return next(c for c in encounter.creatures if c.name == name)
+
+
+def test_cards_are_rendered_again_only_when_they_change(encounter, cards):
+    goblin, ogre = by_name(encounter, "Goblin"), by_name(encounter, "Ogre")
+    first = cards.render(goblin)
+    ogre_card = cards.render(ogre)
+    assert cards.render(goblin) is first
+    combat.apply_damage(encounter, goblin.id, 5)
+    damaged = cards.render(encounter.get_creature(goblin.id))
+    assert damaged is not first and "15" in damaged
+    assert cards.render(ogre) is ogre_card
+
+    # Taking or losing the turn re-renders, as the current card is marked
+    current = encounter.current_creature_id
+    combat.next_turn(encounter)
+    changed = {current, encounter.current_creature_id}
+    assert (cards.render(ogre) is ogre_card) == (ogre.id not in changed)
+
+
+def test_renaming_an_effect_source_refreshes_the_cards_naming_it(encounter, cards):
+    caster = encounter.get_creature(encounter.current_creature_id)
+    target = next(c for c in encounter.creatures if c is not caster)
+    combat.add_effect(encounter, target.id, "Bless", rounds=10, concentration=True)
+    assert f"C: {caster.name}" in cards.render(encounter.get_creature(target.id))
+
+    encounter.update_creature(caster, "rename", name="Mirabel")
+    assert "C: Mirabel" in cards.render(encounter.get_creature(target.id))
+
+
+def test_removing_an_effect_anchor_refreshes_the_cards_naming_it(encounter, cards):
+    anchor = encounter.get_creature(encounter.current_creature_id)
+    target = next(c for c in encounter.creatures if c is not anchor)
+    combat.add_effect(encounter, target.id, "Hex", rounds=2)
+    card = cards.render(encounter.get_creature(target.id))
+    assert f"of {anchor.name}&#39;s turn" in card or f"of {anchor.name}'s turn" in card
+
+    # Unrelated changes to the anchor keep the cached card
+    combat.apply_damage(encounter, anchor.id, 1)
+    assert cards.render(encounter.get_creature(target.id)) is card
+
+    encounter.remove_creature(anchor.id)  # as undo does, without re-keying the expiry
+    assert "a removed creature" in cards.render(encounter.get_creature(target.id))
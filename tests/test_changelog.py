@@ -0,0 +1,53 @@
+"""API diffs: removing a creature moves the turn, and the diff says so."""
+from app.models import Creature, CreatureType, Encounter
+from app.services import combat
+from app.services.journal import Journal
+from app.services.tables import Table
+
+
+def table_with(*rolls: int) -> tuple[Table, list[Creature]]:
+    table = Table("t", Encounter())
+    creatures = []
+    for i, roll in enumerate(rolls):
+        creature = Creature(name=f"G{i}", creature_type=CreatureType.MONSTER, max_hp=7)
+        creature.initiative_roll = roll
+        table.encounter.add_creature(creature)
+        creatures.append(creature)
+    combat.start_combat(table.encounter)
+    table.history.seal()
+    return table, creatures
+
+
+def test_removing_the_current_creature_diffs_the_turn_move():
+    table, (a, b, c) = table_with(18, 11, 5)
+    before = table.encounter.version
+    table.encounter.remove_creature(a.id)
+    diff = table.changes.diff(before)
+    assert diff["removed"] == [a.id]
+    assert diff["encounter"] == {"current_creature_id": b.id}
+    assert diff["order"] == [b.id, c.id]
+
+
+def test_removal_that_leaves_the_turn_alone_has_no_turn_change():
+    table, (a, b, c) = table_with(18, 11, 5)
+    before = table.encounter.version
+    table.encounter.remove_creature(c.id)
+    assert "encounter" not in table.changes.diff(before)
+    assert table.encounter.version == before + 1
+
+
+def test_turn_move_replays_and_undoes(tmp_path):
+    table, (a, b, c) = table_with(18, 11, 5)
+    journal = Journal(tmp_path)
+    journal.attach(table.encounter)
+    table.encounter.remove_creature(a.id)
+    table.history.seal()
+    table.encounter.unsubscribe(journal.record)
+    journal.close()
+    restored = Journal(tmp_path).restore()
+    assert restored.to_dict() == table.encounter.to_dict()
+    assert restored.turn_index == table.encounter.turn_index == 0
+
+    table.history.undo()
+    assert table.encounter.current_creature_id == a.id
+    assert table.encounter.schedule[table.encounter.turn_index] == a.id
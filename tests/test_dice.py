@@ -0,0 +1,68 @@
+"""Dice expressions: parsing, exact averages and the cached keep-term mean."""
+import random
+from fractions import Fraction
+from itertools import product
+
+import pytest
+
+from app.services import dice
+
+
+@pytest.mark.parametrize(
+    ("text", "average", "low", "high"),
+    [
+        ("2d6+3", 10, 5, 15),
+        ("1d8+1d6-1", 7, 1, 13),
+        ("4d6kh3", 12, 3, 18),
+        ("d20+5 adv", 18, 6, 25),
+        ("d20+5 dis", 12, 6, 25),
+    ],
+)
+def test_average_and_bounds(text, average, low, high):
+    expression = dice.parse(text)
+    assert (expression.average, expression.minimum, expression.maximum) == (average, low, high)
+    rolls = expression.roll_many(500, random.Random(0))
+    assert low <= min(rolls) and max(rolls) <= high
+
+
+def test_keep_mean_is_computed_once():
+    dice._keep_mean.cache_clear()
+    term = dice.parse("2d20kh1").terms[0]
+    for _ in range(100):
+        assert term.mean == Fraction(5530, 400)
+    assert dice._keep_mean.cache_info().misses == 1
+
+
+@pytest.mark.parametrize(
+    ("count", "sides", "keep"),
+    [(2, 20, 1), (2, 20, -1), (4, 6, 3), (4, 6, -3), (3, 8, 2), (5, 4, -2), (6, 3, 6), (6, 3, -6)],
+)
+def test_keep_mean_matches_every_outcome(count, sides, keep):
+    total = 0
+    for roll in product(range(1, sides + 1), repeat=count):
+        group = sorted(roll)
+        total += sum(group[-keep:] if keep > 0 else group[:-keep])
+    assert dice._keep_mean(count, sides, keep) == Fraction(total, sides**count)
+
+
+@pytest.mark.parametrize(
+    ("text", "mean"),
+    [
+        ("10d20kh1", 18.64),  # far from the 10.5 of one die
+        ("10d20kl1", 2.36),
+        ("100d100kh3", 295.48),
+        ("1000d100kh1", 100.0),  # past the exact limit
+        ("1000d20kl3", 3.0),
+    ],
+)
+def test_large_keep_terms(text, mean):
+    term = dice.parse(text).terms[0]
+    assert float(term.mean) == pytest.approx(mean, abs=0.5)
+    rolled = term.roll_many(2000, random.Random(1))
+    assert sum(rolled) / len(rolled) == pytest.approx(float(term.mean), abs=0.5)
+
+
+def test_rejects_what_is_not_dice():
+    for text in ("", "d", "2d6kh3", "fireball"):
+        with pytest.raises(ValueError):
+            dice.parse(text)
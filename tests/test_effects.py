@@ -0,0 +1,82 @@
+"""Effect expiry when the creature whose turn it is tied to dies, leaves or delays."""
+from app.models import Creature, CreatureType, Encounter
+from app.services import combat
+
+
+def fighter(name: str, roll: int, kind: CreatureType = CreatureType.MONSTER) -> Creature:
+    creature = Creature(name=name, creature_type=kind, max_hp=7)
+    creature.initiative_roll = roll
+    return creature
+
+
+def setup() -> tuple[Encounter, Creature, Creature, Creature]:
+    """Caster (20) puts a 1-round effect on Target (10); Other (15) acts between."""
+    encounter = Encounter()
+    caster, other, target = fighter("Caster", 20), fighter("Other", 15), fighter("Target", 10)
+    for creature in (caster, other, target):
+        encounter.add_creature(creature)
+    combat.start_combat(encounter)
+    combat.add_effect(encounter, target.id, "Hex", rounds=1)
+    assert target.effects[0].expiry == (2, caster.id, "start")
+    return encounter, caster, other, target
+
+
+def names(creature: Creature) -> list[str]:
+    return [e.name for e in creature.effects]
+
+
+def turn_to(encounter: Encounter, creature: Creature) -> None:
+    while encounter.current_creature_id != creature.id:
+        combat.next_turn(encounter)
+
+
+def test_source_death_moves_expiry_to_the_bearers_turn():
+    encounter, caster, other, target = setup()
+    assert combat.apply_damage(encounter, caster.id, 7) == [target.id]
+    assert target.effects[0].expiry == (2, target.id, "start")
+    turn_to(encounter, other)
+    combat.next_turn(encounter)  # Target, round 1
+    combat.next_turn(encounter)  # Other, round 2
+    assert names(target) == ["Hex"]
+    combat.next_turn(encounter)  # Target, round 2
+    assert names(target) == []
+    assert not encounter._due
+
+
+def test_removed_source_no_longer_holds_the_effect():
+    encounter, caster, other, target = setup()
+    assert combat.remove_creature(encounter, caster.id) == [target.id]
+    for _ in range(4):
+        combat.next_turn(encounter)
+    assert names(target) == []
+    assert not encounter._due
+
+
+def test_expiry_already_past_on_the_bearers_turn_ends_now():
+    encounter = Encounter()
+    target, caster = fighter("Target", 20), fighter("Caster", 10)
+    for creature in (target, caster):
+        encounter.add_creature(creature)
+    combat.start_combat(encounter)
+    combat.next_turn(encounter)
+    combat.add_effect(encounter, target.id, "Hex", rounds=1)  # on Caster's turn, round 1
+    combat.next_turn(encounter)  # Target, round 2
+    combat.apply_damage(encounter, caster.id, 7)  # Target's start of round 2 is over
+    assert names(target) == []
+
+
+def test_source_delaying_through_the_round_ends_it_with_the_round():
+    encounter, caster, other, target = setup()
+    turn_to(encounter, target)
+    combat.next_turn(encounter)  # Caster, round 2: its effect expires as it starts
+    assert names(target) == []
+
+    encounter, caster, other, target = setup()
+    combat.delay_turn(encounter)  # Caster holds round 1 and round 2 goes by
+    turn_to(encounter, target)
+    combat.next_turn(encounter)  # Other, round 2
+    assert names(target) == ["Hex"]
+    turn_to(encounter, target)
+    combat.next_turn(encounter)  # round 3 starts: Caster never took its round 2 turn
+    assert names(target) == []
+    assert not encounter._due
@@ -0,0 +1,43 @@
+"""Monster HP modes: the stat block average, rolled from the hit dice, or their maximum."""
+import random
+
+import pytest
+
+from app.models import Creature, CreatureType
+from app.services.combat import monster_hit_points
+
+
+def ogre(hit_dice: str = "7d10+21", max_hp: int = 59) -> Creature:
+    return Creature(
+        name="Ogre", creature_type=CreatureType.MONSTER, max_hp=max_hp, hit_dice=hit_dice
+    )
+
+
+def test_average_is_the_listed_hp():
+    assert monster_hit_points(ogre(), 3) == [59, 59, 59]
+    assert monster_hit_points(ogre(max_hp=60), 2, "average") == [60, 60]
+
+
+def test_max_is_the_formula_maximum():
+    assert monster_hit_points(ogre(), 2, "max") == [91, 91]
+
+
+def test_rolled_uses_the_formula_and_the_seed():
+    rolled = monster_hit_points(ogre(), 200, "rolled", random.Random(42))
+    assert rolled == monster_hit_points(ogre(), 200, "rolled", random.Random(42))
+    assert rolled != monster_hit_points(ogre(), 200, "rolled", random.Random(43))
+    assert 28 <= min(rolled) and max(rolled) <= 91
+    assert len(set(rolled)) > 10
+    assert abs(sum(rolled) / len(rolled) - 59.5) < 3
+
+
+def test_rolled_hp_is_at_least_one():
+    frail = ogre(hit_dice="1d4-3", max_hp=1)
+    assert set(monster_hit_points(frail, 100, "rolled", random.Random(0))) == {1}
+
+
+@pytest.mark.parametrize("hit_dice", ["", "lots", "7d"])
+@pytest.mark.parametrize("mode", ["average", "rolled", "max"])
+def test_without_a_usable_formula_the_listed_hp_is_used(hit_dice, mode):
+    monster = ogre(hit_dice=hit_dice, max_hp=45)
+    assert monster_hit_points(monster, 2, mode, random.Random(0)) == [45, 45]
@@ -0,0 +1,113 @@
+"""Bulk import: .md, zip and tar.gz uploads, rejected files, and merging into the library."""
+import io
+import random
+import tarfile
+import zipfile
+
+import pytest
+
+from app import state
+from app.bench import monster_stat_block
+from app.models import Creature, CreatureType
+from app.services import importer
+from app.services.importer import merge_into_library, parse_uploads
+from app.services.library import LibraryIndex
+from app.services.workers import make_pool
+
+
+def block(name: str) -> bytes:
+    return monster_stat_block(name, random.Random(name)).encode()
+
+
+def zipped(files: dict[str, bytes]) -> io.BytesIO:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name, data in files.items():
+            archive.writestr(name, data)
+    buffer.seek(0)
+    return buffer
+
+
+def tarred(files: dict[str, bytes]) -> io.BytesIO:
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as archive:
+        for name, data in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    buffer.seek(0)
+    return buffer
+
+
+def names(parsed) -> list[str]:
+    return sorted(c.name for c in parsed.values())
+
+
+def test_markdown_zip_and_tar_uploads():
+    uploads = [
+        ("ghoul.md", io.BytesIO(block("Ghoul"))),
+        ("pack.zip", zipped({"a/wolf.md": block("Wolf"), "a/readme.txt": b"skip me"})),
+        ("pack.tar.gz", tarred({"b/bat.md": block("Bat"), "b/._bat.md": b"resource fork"})),
+    ]
+    parsed, summary = parse_uploads(uploads, "monster")
+    assert names(parsed) == ["Bat", "Ghoul", "Wolf"]
+    assert (summary.imported, summary.errors, summary.files) == (3, [], 3)
+
+
+def test_rejected_files_are_listed_with_the_reason(monkeypatch):
+    monkeypatch.setattr(importer, "MAX_ENTRY_BYTES", 4096)
+    big = b"## Huge\n" + b"x" * 5000
+    uploads = [
+        ("huge.md", io.BytesIO(big)),
+        ("pack.zip", zipped({"huge.md": big, "nameless.md": b"**Armor Class:** 12\n"})),
+        ("pack.tar.gz", tarred({"huge.md": big, "latin1.md": "## Gobélin".encode("latin-1")})),
+        ("notes.txt", io.BytesIO(b"hello")),
+        ("broken.zip", io.BytesIO(b"not a zip")),
+    ]
+    parsed, summary = parse_uploads(uploads, "monster")
+    assert parsed == {}
+    reasons = dict(summary.errors)
+    assert reasons["huge.md"] == "too large for a stat block"
+    assert reasons["pack.zip/huge.md"] == "too large for a stat block"
+    assert reasons["pack.tar.gz/huge.md"] == "too large for a stat block"
+    assert reasons["pack.zip/nameless.md"] == "no '## Name' heading"
+    assert reasons["pack.tar.gz/latin1.md"] == "not UTF-8 text"
+    assert reasons["notes.txt"] == "not a .md, .zip or .tar file"
+    assert reasons["broken.zip"].startswith("not a zip archive")
+    assert summary.files == len(summary.errors) == 7
+
+
+def test_pool_parses_the_same_as_in_process(monkeypatch):
+    monkeypatch.setattr(importer, "BATCH_FILES", 4)
+    files = {f"m/{i}.md": block(f"Monster {i}") for i in range(20)}
+    serial, _ = parse_uploads([("all.zip", zipped(files))], "monster")
+    pool = make_pool(2)
+    try:
+        pooled, summary = parse_uploads([("all.zip", zipped(files))], "monster", 2, pool)
+    finally:
+        pool.shutdown()
+    assert names(pooled) == names(serial)
+    assert summary.imported == 20
+
+
+@pytest.fixture
+def library(monkeypatch):
+    existing = Creature(name="Wolf", creature_type=CreatureType.MONSTER, max_hp=3)
+    monkeypatch.setattr(state, "monster_library", {"Wolf": existing})
+    monkeypatch.setattr(state, "pc_library", {})
+    index = LibraryIndex()
+    index.rebuild([], [existing])
+    monkeypatch.setattr(state, "library_index", index)
+    return index
+
+
+def test_merge_counts_added_and_replaced_and_updates_the_index(library):
+    uploads = [("pack.zip", zipped({"wolf.md": block("Wolf"), "bat.md": block("Bat")}))]
+    parsed, summary = parse_uploads(uploads, "monster")
+    merge_into_library(parsed, summary)
+    assert (summary.added, summary.replaced) == (1, 1)
+    assert sorted(state.monster_library) == ["Bat", "Wolf"]
+    assert state.monster_library["Wolf"].max_hp != 3
+    assert [c.name for c in library.search("bat").items] == ["Bat"]
+    assert library.search("wolf").items == [state.monster_library["Wolf"]]
+    assert len(library) == 2
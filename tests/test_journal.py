@@ -0,0 +1,122 @@
+"""Write-ahead journal: restore after compaction, a cut-short compaction, a reset and fsyncs."""
+import os
+import threading
+import time
+
+from app.models import Creature, CreatureType, Encounter
+from app.services import combat
+from app.services import journal as journal_module
+from app.services.journal import Journal
+from app.services.tables import Table
+
+
+def fill(encounter: Encounter, count: int) -> None:
+    for i in range(count):
+        encounter.add_creature(
+            Creature(name=f"Goblin {i}", creature_type=CreatureType.MONSTER, max_hp=7)
+        )
+
+
+def damage_all(encounter: Encounter, rounds: int) -> None:
+    for _ in range(rounds):
+        for creature in list(encounter.creatures):
+            combat.set_temp_hp(encounter, creature.id, creature.temp_hp + 1)
+
+
+def state(encounter: Encounter) -> dict:
+    return encounter.to_dict()
+
+
+def test_restore_replays_snapshot_and_journal(tmp_path):
+    journal = Journal(tmp_path, snapshot_every=7)
+    encounter = Encounter()
+    journal.attach(encounter)
+    fill(encounter, 4)
+    damage_all(encounter, 5)
+    journal.close()
+    assert state(Journal(tmp_path).restore()) == state(encounter)
+
+
+def test_snapshot_is_written_off_the_recording_path(tmp_path):
+    journal = Journal(tmp_path, snapshot_every=5)
+    encounter = Encounter()
+    journal.attach(encounter)
+    fill(encounter, 5)
+    # The fifth change captured the state and rotated the journal, nothing more
+    assert journal.rotated_path.exists()
+    assert not journal.snapshot_path.exists()
+    journal.flush()  # what the committer thread does
+    assert journal.snapshot_path.exists()
+    assert not journal.rotated_path.exists()
+    journal.close()
+    assert state(Journal(tmp_path).restore()) == state(encounter)
+
+
+def test_restore_after_a_compaction_cut_short(tmp_path):
+    journal = Journal(tmp_path, snapshot_every=5)
+    encounter = Encounter()
+    journal.attach(encounter)
+    fill(encounter, 5)
+    damage_all(encounter, 1)
+    # Crash before the committer wrote the snapshot: no flush, no close
+    journal._file.flush()
+    reopened = Journal(tmp_path)
+    assert state(reopened.restore()) == state(encounter)
+    reopened.flush()  # the restore finishes the compaction
+    assert not reopened.rotated_path.exists()
+    assert state(Journal(tmp_path).restore()) == state(encounter)
+
+
+def test_reset_is_journaled_as_a_state_line(tmp_path):
+    journal = Journal(tmp_path, snapshot_every=6)
+    table = Table("t", Encounter(), journal)
+    journal.attach(table.encounter)
+    fill(table.encounter, 6)
+    journal.flush()  # snapshot of the six goblins
+    table.reset()
+    fill(table.encounter, 2)
+    journal.close()
+    restored = Journal(tmp_path).restore()
+    assert [c.name for c in restored.creatures] == ["Goblin 0", "Goblin 1"]
+    assert state(restored) == state(table.encounter)
+
+
+def test_recording_does_not_wait_for_the_fsync(tmp_path, monkeypatch):
+    journal = Journal(tmp_path)
+    encounter = Encounter()
+    journal.attach(encounter)
+    fill(encounter, 1)
+    syncing, done = threading.Event(), threading.Event()
+
+    def slow_fsync(fd):
+        syncing.set()
+        done.wait(5)
+
+    monkeypatch.setattr(journal_module.os, "fsync", slow_fsync)
+    committer = threading.Thread(target=journal.flush)
+    committer.start()
+    assert syncing.wait(5)
+    start = time.perf_counter()
+    fill(encounter, 1)  # while the committer is inside fsync
+    assert time.perf_counter() - start < 1
+    done.set()
+    committer.join()
+    monkeypatch.undo()
+    journal.close()
+    assert state(Journal(tmp_path).restore()) == state(encounter)
+
+
+def test_journal_is_fsynced_before_it_is_rotated(tmp_path, monkeypatch):
+    journal = Journal(tmp_path, snapshot_every=3)
+    encounter = Encounter()
+    journal.attach(encounter)
+    calls = []
+    fsync, replace = os.fsync, os.replace
+    monkeypatch.setattr(journal_module.os, "fsync", lambda fd: (calls.append("fsync"), fsync(fd)))
+    monkeypatch.setattr(
+        journal_module.os, "replace", lambda a, b: (calls.append("replace"), replace(a, b))
+    )
+    fill(encounter, 3)  # the third change rotates the journal
+    assert calls == ["fsync", "replace"]
+    monkeypatch.undo()
+    journal.close()
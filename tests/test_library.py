@@ -0,0 +1,133 @@
+"""Library search index: name matching, range filters, pages, and add/remove/rebuild."""
+import random
+
+import pytest
+
+from app.models import Creature, CreatureType
+from app.services import library as library_module
+from app.services.library import LibraryIndex
+
+
+def monster(name: str, cr: str = "1", ac: int = 12, hp: int = 10) -> Creature:
+    return Creature(
+        name=name,
+        creature_type=CreatureType.MONSTER,
+        challenge_rating=cr,
+        armor_class=ac,
+        max_hp=hp,
+    )
+
+
+def pc(name: str, ac: int = 15, hp: int = 30) -> Creature:
+    return Creature(name=name, creature_type=CreatureType.PC, armor_class=ac, max_hp=hp)
+
+
+MONSTERS = [
+    monster("Goblin", "1/4", 15, 7),
+    monster("Goblin Boss", "1", 17, 21),
+    monster("Hobgoblin", "1/2", 18, 11),
+    monster("Giant Rat", "1/8", 12, 7),
+    monster("Adult Red Dragon", "17", 19, 256),
+    monster("Red Dragon Wyrmling", "4", 17, 75),
+    monster("Ogre", "2", 11, 59),
+]
+PCS = [pc("Gimble"), pc("Red Wizard", ac=12, hp=18)]
+
+
+@pytest.fixture
+def index() -> LibraryIndex:
+    index = LibraryIndex()
+    index.rebuild(PCS, MONSTERS)
+    return index
+
+
+def names(page) -> list[str]:
+    return [c.name for c in page.items]
+
+
+def test_prefix_then_word_then_inside_a_word(index):
+    assert names(index.search("gob")) == ["Goblin", "Goblin Boss", "Hobgoblin"]
+    assert names(index.search("red")) == ["Red Dragon Wyrmling", "Red Wizard", "Adult Red Dragon"]
+    assert names(index.search("rag")) == ["Adult Red Dragon", "Red Dragon Wyrmling"]
+    # Two characters only match the start of a word
+    assert names(index.search("ob")) == []
+    assert names(index.search("  GOBLIN b ")) == ["Goblin Boss"]
+
+
+def test_kind_and_range_filters(index):
+    assert names(index.search("g", kind="pc")) == ["Gimble"]
+    assert names(index.search(cr_min=1, cr_max=4)) == [
+        "Goblin Boss",
+        "Ogre",
+        "Red Dragon Wyrmling",
+    ]
+    # PCs have no challenge rating, so any CR bound leaves them out
+    assert names(index.search("red", cr_max=30)) == ["Red Dragon Wyrmling", "Adult Red Dragon"]
+    assert names(index.search(ac_min=18)) == ["Adult Red Dragon", "Hobgoblin"]
+    assert names(index.search("gob", hp_max=11)) == ["Goblin", "Hobgoblin"]
+    assert names(index.search(ac_min=12, ac_max=12, hp_min=10)) == ["Red Wizard"]
+
+
+def test_range_filters_agree_with_name_order(index, monkeypatch):
+    """Searching from a range index and from the names gives the same pages."""
+    queries = [
+        {"cr_min": 0.25},
+        {"query": "g", "ac_max": 17},
+        {"query": "red", "hp_min": 20, "hp_max": 300},
+    ]
+    from_ranges = [names(index.search(**q)) for q in queries]
+    monkeypatch.setattr(library_module, "RANGE_LIMIT", 0)
+    assert [names(index.search(**q)) for q in queries] == from_ranges
+
+
+def test_pages_and_capped_totals(monkeypatch):
+    index = LibraryIndex()
+    index.rebuild([], [monster(f"Goblin {i:03}") for i in range(50)])
+    first = index.search("goblin", limit=20)
+    assert names(first) == [f"Goblin {i:03}" for i in range(20)]
+    assert (first.total, first.next_offset, first.capped) == (50, 20, False)
+    last = index.search("goblin", offset=40, limit=20)
+    assert names(last) == [f"Goblin {i:03}" for i in range(40, 50)]
+    assert last.next_offset is None
+
+    monkeypatch.setattr(library_module, "COUNT_LIMIT", 5)
+    capped = index.search("goblin", limit=20)
+    assert (capped.total, capped.capped, capped.next_offset) == (25, True, 20)
+
+
+def test_add_and_remove_match_a_rebuild(index):
+    rng = random.Random(7)
+    pcs, monsters = {c.name: c for c in PCS}, {c.name: c for c in MONSTERS}
+    index.search("gob")  # builds the trigram index, which add/remove then keep up
+    for step in range(200):
+        name = f"{rng.choice(['Goblin', 'Red', 'Ogre'])} {rng.choice(['Mage', 'Chief', 'Cub'])}"
+        if rng.random() < 0.3:
+            creature = pc(name, hp=rng.randint(1, 50))
+            library = pcs
+        else:
+            cr, ac, hp = str(rng.randint(0, 5)), rng.randint(10, 20), rng.randint(1, 50)
+            creature = monster(name, cr, ac, hp)
+            library = monsters
+        if name in library and rng.random() < 0.5:
+            index.remove(library.pop(name))
+        else:
+            library[name] = creature
+            index.add(creature)
+    fresh = LibraryIndex()
+    fresh.rebuild(pcs.values(), monsters.values())
+    assert len(index) == len(fresh) == len(pcs) + len(monsters)
+    queries = [
+        {"query": "gob"},
+        {"query": "chi"},
+        {"query": "red", "kind": "monster"},
+        {"cr_min": 2, "cr_max": 3},
+        {"ac_min": 15, "hp_max": 25},
+        {"limit": 100},
+    ]
+    for q in queries:
+        assert index.search(**q) == fresh.search(**q), q
+
+
+def test_remove_of_an_unknown_creature_is_a_no_op(index):
+    index.remove(monster("Nobody"))
+    assert len(index) == len(PCS) + len(MONSTERS)
@@ -0,0 +1,143 @@
+"""Player feed: changes coalesced per tick, slow viewers dropped, viewers cleaned up."""
+import asyncio
+import random
+
+from app.models import Creature, CreatureType, Encounter
+from app.services import combat
+from app.services import live
+from app.services.live import LiveFeed
+
+
+def encounter_in_combat() -> Encounter:
+    encounter = Encounter()
+    for name in ("Aria", "Goblin", "Ogre"):
+        kind = CreatureType.PC if name == "Aria" else CreatureType.MONSTER
+        encounter.add_creature(Creature(name=name, creature_type=kind, max_hp=20))
+    combat.start_combat(encounter, random.Random(1))
+    return encounter
+
+
+def pending(viewer) -> list[bytes]:
+    messages = list(viewer._pending)
+    viewer._pending.clear()
+    return messages
+
+
+def event(message: bytes) -> str:
+    return message.split(b"\n", 1)[0].decode().removeprefix("event: ")
+
+
+def test_changes_in_one_tick_are_sent_as_one_event():
+    encounter = encounter_in_combat()
+    feed = LiveFeed()
+    feed.attach(encounter)
+    goblin = next(c for c in encounter.creatures if c.name == "Goblin")
+
+    async def run():
+        viewer = feed.connect()
+        assert [event(m) for m in pending(viewer)] == ["order"]
+        combat.apply_damage(encounter, goblin.id, 3)
+        combat.set_temp_hp(encounter, goblin.id, 4)
+        assert pending(viewer) == []  # nothing until the handler yields
+        await asyncio.sleep(0)
+        messages = pending(viewer)
+        assert [event(m) for m in messages] == ["card"]
+        assert b'data: ' in messages[0]
+
+        # A turn change carries the cards it touches; they are not sent twice
+        current = encounter.current_creature_id
+        combat.apply_damage(encounter, current, 1)
+        combat.next_turn(encounter)
+        await asyncio.sleep(0)
+        assert [event(m) for m in pending(viewer)] == ["turn"]
+
+        # Adding a creature resends the list, which covers every card change
+        combat.apply_damage(encounter, goblin.id, 1)
+        encounter.add_creature(Creature(name="Rat", creature_type=CreatureType.MONSTER))
+        await asyncio.sleep(0)
+        assert [event(m) for m in pending(viewer)] == ["order"]
+
+    asyncio.run(run())
+
+
+def test_every_viewer_gets_the_same_bytes_rendered_once(monkeypatch):
+    encounter = encounter_in_combat()
+    feed = LiveFeed()
+    feed.attach(encounter)
+    renders = []
+    render = feed._render_cards
+    monkeypatch.setattr(feed, "_render_cards", lambda *a, **k: renders.append(a) or render(*a, **k))
+
+    async def run():
+        viewers = [feed.connect() for _ in range(50)]
+        for viewer in viewers:
+            pending(viewer)
+        for creature in encounter.creatures:
+            combat.apply_damage(encounter, creature.id, 2)
+        await asyncio.sleep(0)
+        sent = [pending(viewer) for viewer in viewers]
+        assert len(renders) == 3
+        assert all(messages == sent[0] for messages in sent)
+        assert [event(m) for m in sent[0]] == ["card"] * 3
+
+    asyncio.run(run())
+
+
+def test_a_viewer_too_far_behind_is_dropped(monkeypatch):
+    monkeypatch.setattr(live, "MAX_BACKLOG", 5)
+    encounter = encounter_in_combat()
+    feed = LiveFeed()
+    feed.attach(encounter)
+    goblin = next(c for c in encounter.creatures if c.name == "Goblin")
+
+    async def run():
+        slow, reading = feed.connect(), feed.connect()
+        for _ in range(10):
+            combat.apply_damage(encounter, goblin.id, 1)
+            await asyncio.sleep(0)
+            pending(reading)
+        assert slow.closed and not reading.closed
+        assert len(feed) == 1
+        # The dropped viewer's stream ends after what it had queued
+        received = [m async for m in feed.stream(slow)]
+        assert [event(m) for m in received] == ["order"] + ["card"] * 4
+
+    asyncio.run(run())
+
+
+def test_viewers_are_removed_when_their_stream_ends():
+    encounter = encounter_in_combat()
+    feed = LiveFeed()
+    feed.attach(encounter)
+
+    async def run():
+        viewer = feed.connect()
+        stream = feed.stream(viewer)
+        assert event(await anext(stream)) == "order"
+        assert len(feed) == 1
+        await stream.aclose()  # the client went away
+        assert len(feed) == 0
+        # With nobody watching, changes are not even collected
+        combat.apply_damage(encounter, next(iter(encounter.creatures)).id, 1)
+        assert not feed._scheduled and not feed._cards
+
+    asyncio.run(run())
+
+
+def test_attach_stops_following_the_old_encounter():
+    old, new = encounter_in_combat(), encounter_in_combat()
+    feed = LiveFeed()
+    feed.attach(old)
+
+    async def run():
+        viewer = feed.connect()
+        pending(viewer)
+        feed.attach(new)
+        await asyncio.sleep(0)
+        assert [event(m) for m in pending(viewer)] == ["order"]
+        combat.apply_damage(old, next(iter(old.creatures)).id, 1)
+        await asyncio.sleep(0)
+        assert pending(viewer) == []
+        assert feed._on_change not in old._listeners
+
+    asyncio.run(run())
@@ -0,0 +1,23 @@
+"""Library loading: serial and process-pool parsing agree; the pool is used sparingly."""
+from app.bench import write_library
+from app.parsers import loader
+from app.parsers.monster_md import parse_monster_md
+
+
+def test_pool_workers_falls_back_to_serial(monkeypatch):
+    monkeypatch.setattr(loader, "available_cpus", lambda: 1)
+    assert loader.pool_workers(8, 100_000) == 1
+    monkeypatch.setattr(loader, "available_cpus", lambda: 8)
+    assert loader.pool_workers(8, loader.MIN_FILES_PER_WORKER - 1) == 1
+    assert loader.pool_workers(8, loader.MIN_FILES_PER_WORKER * 3) == 3
+    assert loader.pool_workers(4, 100_000) == 4
+
+
+def test_pool_and_serial_parse_the_same(tmp_path):
+    write_library(tmp_path, 40, 0)
+    paths = sorted((tmp_path / "monsters").glob("*_stats.md"))
+    serial = loader.parse_stat_files(paths, parse_monster_md, 1)
+    pooled = loader.parse_stat_files(paths, parse_monster_md, 2)
+    assert [p.creature.name for p in pooled] == [p.creature.name for p in serial]
+    assert [p.digest for p in pooled] == [p.digest for p in serial]
+    assert [p.creature.max_hp for p in pooled] == [p.creature.max_hp for p in serial]
@@ -0,0 +1,208 @@
+"""Encounter bookkeeping: initiative order, the turn schedule and turn index."""
+import random
+
+import pytest
+
+from app.models import LAIR_ID, Creature, CreatureType, Encounter
+from app.services import combat
+from app.services.tables import Table
+
+
+def goblin(name: str, roll: int | None = None, dex: int = 10) -> Creature:
+    creature = Creature(name=name, creature_type=CreatureType.MONSTER, max_hp=7)
+    creature.abilities.dexterity = dex
+    creature.initiative_roll = roll
+    return creature
+
+
+def reference_order(encounter: Encounter) -> list[str]:
+    """Initiative order by a full sort, as ``initiative_order`` used to be."""
+    seq = {c.id: i for i, c in enumerate(encounter.creatures)}
+    return [
+        c.id
+        for c in sorted(
+            encounter.creatures,
+            key=lambda c: (
+                -(c.initiative_roll if c.initiative_roll is not None else -100),
+                -c.dex_modifier,
+                seq[c.id],
+            ),
+        )
+    ]
+
+
+def check_invariants(encounter: Encounter) -> None:
+    assert [c.id for c in encounter.initiative_order] == reference_order(encounter)
+    living = [
+        cid
+        for cid in reference_order(encounter)
+        if not encounter.get_creature(cid).is_dead and not encounter.get_creature(cid).delayed
+    ]
+    assert encounter.schedule == living
+    current = encounter.current_creature_id
+    if current is not None and encounter.is_scheduled(current):
+        assert encounter.schedule[encounter.turn_index] == current
+
+
+def test_order_follows_rolls_dex_then_insertion():
+    encounter = Encounter()
+    a, b, c, d = goblin("A", 12), goblin("B", 15), goblin("C", 12, dex=16), goblin("D", 12)
+    for creature in (a, b, c, d):
+        encounter.add_creature(creature)
+    assert [x.name for x in encounter.initiative_order] == ["B", "C", "A", "D"]
+    encounter.set_initiative(d.id, 20)
+    assert [x.name for x in encounter.initiative_order] == ["D", "B", "C", "A"]
+
+
+def test_order_matches_full_sort_under_random_mutations():
+    rng = random.Random(1)
+    encounter = Encounter()
+    for step in range(500):
+        roll = rng.choice((None, *range(1, 21)))
+        ids = [c.id for c in encounter.creatures]
+        action = rng.random()
+        if action < 0.45 or not ids:
+            encounter.add_creature(goblin(f"G{step}", roll, dex=rng.randint(6, 18)))
+        elif action < 0.7:
+            encounter.set_initiative(rng.choice(ids), roll)
+        elif action < 0.85:
+            encounter.remove_creature(rng.choice(ids))
+        else:
+            encounter.set_initiatives({cid: rng.randint(1, 20) for cid in rng.sample(ids, 3)})
+        check_invariants(encounter)
+
+
+def test_next_turn_walks_the_schedule_and_wraps_the_round():
+    encounter = Encounter()
+    for i, roll in enumerate((18, 3, 11, 7)):
+        encounter.add_creature(goblin(f"G{i}", roll))
+    combat.start_combat(encounter)
+    seen = []
+    for _ in range(8):
+        seen.append((encounter.round_number, encounter.current_creature.name))
+        check_invariants(encounter)
+        combat.next_turn(encounter)
+    assert seen == [
+        (1, "G0"), (1, "G2"), (1, "G3"), (1, "G1"),
+        (2, "G0"), (2, "G2"), (2, "G3"), (2, "G1"),
+    ]
+
+
+def test_prev_turn_goes_back_across_the_round():
+    encounter = Encounter()
+    for i, roll in enumerate((18, 11)):
+        encounter.add_creature(goblin(f"G{i}", roll))
+    combat.start_combat(encounter)
+    combat.next_turn(encounter)
+    combat.next_turn(encounter)
+    assert (encounter.round_number, encounter.current_creature.name) == (2, "G0")
+    combat.prev_turn(encounter)
+    assert (encounter.round_number, encounter.current_creature.name) == (1, "G1")
+    check_invariants(encounter)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_turn_index_survives_deaths_removals_and_rerolls(seed):
+    rng = random.Random(seed)
+    encounter = Encounter()
+    for i in range(12):
+        encounter.add_creature(goblin(f"G{i}", rng.randint(1, 20)))
+    combat.start_combat(encounter, rng)
+    for _ in range(200):
+        ids = [c.id for c in encounter.creatures]
+        if not ids:
+            break
+        action = rng.random()
+        if action < 0.5:
+            combat.next_turn(encounter, rng)
+        elif action < 0.65:
+            combat.apply_damage(encounter, rng.choice(ids), 7, rng)
+        elif action < 0.75:
+            combat.apply_healing(encounter, rng.choice(ids), 7)
+        elif action < 0.85:
+            encounter.set_initiative(rng.choice(ids), rng.randint(1, 20))
+        elif action < 0.9:
+            encounter.remove_creature(rng.choice(ids))
+        else:
+            encounter.add_creature(goblin("Late", rng.randint(1, 20)))
+        check_invariants(encounter)
+
+
+def test_dead_creatures_are_skipped():
+    encounter = Encounter()
+    a, b, c = goblin("A", 15), goblin("B", 10), goblin("C", 5)
+    for creature in (a, b, c):
+        encounter.add_creature(creature)
+    combat.start_combat(encounter)
+    combat.apply_damage(encounter, b.id, 7)
+    combat.next_turn(encounter)
+    assert encounter.current_creature_id == c.id
+    check_invariants(encounter)
+
+
+def test_id_index_follows_adds_and_removals():
+    encounter = Encounter()
+    creatures = [goblin(f"G{i}", i) for i in range(5)]
+    for creature in creatures:
+        encounter.add_creature(creature)
+    encounter.remove_creature(creatures[2].id)
+    assert encounter.get_creature(creatures[2].id) is None
+    assert [c.name for c in encounter.creatures] == ["G0", "G1", "G3", "G4"]
+    # Re-adding at its old seq (undo of a removal) restores its roster place
+    encounter.add_creature(creatures[2], seq=2)
+    assert encounter.get_creature(creatures[2].id) is creatures[2]
+    assert [c.name for c in encounter.creatures] == ["G0", "G1", "G2", "G3", "G4"]
+    check_invariants(encounter)
+
+
+def turn_state(encounter: Encounter) -> dict:
+    return {k: v for k, v in encounter.to_dict().items() if k not in ("version", "creatures")}
+
+
+def test_turn_ends_with_nobody_left_in_the_schedule():
+    encounter = Encounter()
+    last = goblin("Last", 10)
+    encounter.add_creature(last)
+    combat.start_combat(encounter)
+    combat.add_effect(encounter, last.id, "Burning", on_turn="end", damage="20")
+    combat.next_turn(encounter)  # its end-of-turn damage kills it
+    assert last.is_dead and encounter.schedule == []
+    assert encounter.current_creature_id is None
+    assert combat.next_turn(encounter) == []
+
+
+def test_removing_the_lair_on_its_turn_moves_the_turn_on():
+    table = Table("t", Encounter())
+    encounter = table.encounter
+    a, b = goblin("A", 18), goblin("B", 5)
+    for creature in (a, b):
+        encounter.add_creature(creature)
+    combat.set_lair(encounter, 20)
+    combat.start_combat(encounter)
+    combat.next_turn(encounter)
+    combat.next_turn(encounter)
+    combat.next_turn(encounter)  # round 2, the lair's turn again
+    table.history.seal()
+    before = turn_state(encounter)
+    combat.set_lair(encounter, None)
+    table.history.seal()
+    assert (encounter.current_creature_id, encounter.round_number) == (a.id, 2)
+    check_invariants(encounter)
+    table.history.undo()
+    assert turn_state(encounter) == before
+    assert encounter.schedule[encounter.turn_index] == LAIR_ID
+
+
+def test_removing_the_only_lair_turn_leaves_nobody_current():
+    table = Table("t", Encounter())
+    encounter = table.encounter
+    combat.set_lair(encounter, 20)
+    combat.start_combat(encounter)
+    table.history.seal()
+    before = turn_state(encounter)
+    combat.set_lair(encounter, None)
+    table.history.seal()
+    assert (encounter.current_creature_id, encounter.lair_initiative) == (None, None)
+    table.history.undo()
+    assert turn_state(encounter) == before
+    assert encounter.current_creature_id == LAIR_ID
@@ -0,0 +1,89 @@
+"""Parse cache: hits on unchanged files, misses on edits, version bumps, a bad database."""
+import os
+import random
+import sqlite3
+
+import pytest
+
+from app.bench import monster_stat_block
+from app.parsers import cache as cache_module
+from app.parsers.cache import StatBlockCache
+from app.parsers.loader import load_stat_files
+from app.parsers.monster_md import parse_monster_md
+
+
+@pytest.fixture
+def files(tmp_path):
+    directory = tmp_path / "monsters"
+    directory.mkdir()
+    paths = []
+    for i, name in enumerate(("Goblin", "Ogre", "Troll")):
+        path = directory / f"{name.lower()}_stats.md"
+        path.write_text(monster_stat_block(name, random.Random(i)))
+        paths.append(path)
+    return paths
+
+
+def load(db, paths, **kwargs) -> tuple[list[str], int, int]:
+    """Names loaded through a cache at ``db``, and its hits and misses."""
+    cache = StatBlockCache(db, **kwargs)
+    try:
+        creatures = load_stat_files(paths, parse_monster_md, cache)
+        return [c.name for c in creatures], cache.hits, cache.misses
+    finally:
+        cache.close()
+
+
+def test_unchanged_files_are_served_from_the_cache(tmp_path, files):
+    db = tmp_path / "cache.sqlite"
+    assert load(db, files) == (["Goblin", "Ogre", "Troll"], 0, 3)
+    assert load(db, files) == (["Goblin", "Ogre", "Troll"], 3, 0)
+    # A rebuild starts from nothing
+    assert load(db, files, rebuild=True)[1:] == (0, 3)
+
+
+def test_edited_files_are_parsed_again(tmp_path, files):
+    db = tmp_path / "cache.sqlite"
+    load(db, files)
+    goblin, ogre, _ = files
+    goblin.write_text(monster_stat_block("Hobgoblin", random.Random(9)))  # new size
+    st = os.stat(ogre)
+    os.utime(ogre, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))  # touched, same bytes
+    assert load(db, files) == (["Hobgoblin", "Ogre", "Troll"], 2, 1)
+
+    # An edit that keeps the size is caught by the mtime, then the content
+    text = ogre.read_text()
+    ogre.write_text(text.replace("## Ogre", "## Orc!"))
+    os.utime(ogre, ns=(st.st_atime_ns, st.st_mtime_ns + 2 * 10**9))
+    assert load(db, files) == (["Hobgoblin", "Orc!", "Troll"], 2, 1)
+    assert load(db, files)[1:] == (3, 0)
+
+
+def test_a_parser_version_bump_discards_every_entry(tmp_path, files, monkeypatch):
+    db = tmp_path / "cache.sqlite"
+    load(db, files)
+    monkeypatch.setattr(cache_module, "PARSER_VERSION", cache_module.PARSER_VERSION + 1)
+    assert load(db, files)[1:] == (0, 3)
+    assert load(db, files)[1:] == (3, 0)
+
+
+def test_removed_files_are_pruned(tmp_path, files):
+    db = tmp_path / "cache.sqlite"
+    load(db, files)
+    cache = StatBlockCache(db)
+    cache.prune(files[0].parent, files[1:])
+    cache.close()
+    rows = sqlite3.connect(db).execute("SELECT count(*) FROM statblocks").fetchone()
+    assert rows == (2,)
+
+
+@pytest.mark.parametrize("damage", ["garbage", "missing"])
+def test_an_unusable_database_falls_back_to_parsing(tmp_path, files, damage):
+    db = tmp_path / "cache" / "cache.sqlite"
+    load(db, files)
+    if damage == "garbage":
+        db.write_bytes(b"not a database" * 100)
+    else:
+        db.unlink()
+    assert load(db, files) == (["Goblin", "Ogre", "Troll"], 0, 3)
+    assert load(db, files)[1:] == (3, 0)
@@ -0,0 +1,80 @@
+"""Difficulty simulator: seeded runs, the shared pool and the route's table lock."""
+import asyncio
+
+import httpx
+
+from app import state
+from app.main import app
+from app.models import Creature, CreatureType
+from app.routers import encounter as encounter_routes
+from app.services import simulate
+from app.services.tables import TableRegistry
+from app.services.workers import make_pool
+
+
+def party() -> list[Creature]:
+    hero = Creature(name="Hero", creature_type=CreatureType.PC, max_hp=30, armor_class=16)
+    hero.abilities.strength = 16
+    goblins = [
+        Creature(name=f"Goblin {i}", creature_type=CreatureType.MONSTER, max_hp=7)
+        for i in range(3)
+    ]
+    return [hero, *goblins]
+
+
+def test_shared_pool_matches_a_pool_per_run():
+    side = simulate.combatants(party())
+    own = simulate.simulate_combatants(side, 4000, seed=7, workers=2)
+    pool = make_pool(2)
+    try:
+        shared = simulate.simulate_combatants(side, 4000, seed=7, workers=2, pool=pool)
+    finally:
+        pool.shutdown()
+    assert shared.summary() == own.summary()
+
+
+def test_trials_are_capped(monkeypatch):
+    monkeypatch.setattr(simulate, "MAX_TRIALS", 50)
+    side = simulate.combatants(party())
+    assert simulate.simulate_combatants(side, 10**9, seed=1).trials == 50
+
+
+def test_route_releases_the_table_lock_while_simulating(tmp_path, monkeypatch):
+    registry = TableRegistry(tmp_path)
+    monkeypatch.setattr(state, "tables", registry)
+    table = registry.create("sim")
+    for creature in party():
+        table.encounter.add_creature(creature)
+    held = []
+
+    def fake(side, trials, **kwargs):
+        held.append(table.lock.locked())
+        return simulate.simulate_combatants(side, 100, seed=1)
+
+    monkeypatch.setattr(encounter_routes, "simulate_combatants", fake)
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            return await http.post("/encounter/simulate", params={"table": "sim"})
+
+    try:
+        response = asyncio.run(run())
+    finally:
+        registry.close()
+    assert response.status_code == 200
+    assert held == [False]
+
+
+def test_pcs_with_the_same_name_are_counted_apart():
+    frail = Creature(name="Hero", creature_type=CreatureType.PC, max_hp=1, armor_class=5)
+    sturdy = Creature(name="Hero", creature_type=CreatureType.PC, max_hp=200, armor_class=25)
+    ogre = Creature(name="Ogre", creature_type=CreatureType.MONSTER, max_hp=500)
+    report = simulate.simulate([frail, sturdy, ogre], 300, seed=3, workers=1)
+    stats = report.pc_stats()
+    assert [name for name, _, _ in stats] == ["Hero", "Hero (2)"]
+    (_, frail_downed, _), (_, sturdy_downed, _) = stats
+    assert frail_downed > sturdy_downed
+    assert frail_downed <= report.trials
+    summary = report.summary()
+    assert set(summary["pc_downed_probability"]) == {"Hero", "Hero (2)"}
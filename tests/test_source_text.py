@@ -0,0 +1,57 @@
+"""Monster traits and actions read lazily from their stat block file."""
+from app.models import Creature
+from app.parsers.loader import parse_stat_file
+from app.parsers.monster_md import parse_monster_md
+
+STAT_BLOCK = """## Bandit Captain
+
+**Armor Class:** 15 (studded leather)
+**Hit Points:** 65 (10d8 + 20)
+
+### Traits
+
+**Sure-Footed.** Advantage on saves against being knocked prone — ça va.
+
+### Actions
+
+**Scimitar.** *Melee Weapon Attack:* +5 to hit, reach 5 ft., one target.
+"""
+
+
+def parse(path):
+    return parse_stat_file(path, parse_monster_md).creature
+
+
+def test_text_is_read_from_the_file(tmp_path):
+    path = tmp_path / "bandit_captain_stats.md"
+    path.write_text(STAT_BLOCK, encoding="utf-8")
+    creature = parse(path)
+    assert creature.traits.path is not None  # a reference, not a copy
+    assert str(creature.traits) == (
+        "**Sure-Footed.** Advantage on saves against being knocked prone — ça va."
+    )
+    assert str(creature.actions).startswith("**Scimitar.**")
+    assert creature.actions.summary == "Scimitar"
+
+
+def test_edited_file_reads_as_empty_not_as_another_slice(tmp_path):
+    path = tmp_path / "bandit_captain_stats.md"
+    path.write_text(STAT_BLOCK, encoding="utf-8")
+    creature = parse(path)
+    path.write_text("<!-- edited -->\n" + STAT_BLOCK, encoding="utf-8")
+    assert str(creature.traits) == ""
+    assert creature.actions.summary == "Scimitar"
+    # An edit that is undone makes the reference good again
+    path.write_text(STAT_BLOCK, encoding="utf-8")
+    assert str(creature.actions).startswith("**Scimitar.**")
+
+
+def test_restored_creature_checks_the_file_too(tmp_path):
+    """A creature restored from a snapshot or journal after the file changed."""
+    path = tmp_path / "bandit_captain_stats.md"
+    path.write_text(STAT_BLOCK, encoding="utf-8")
+    saved = parse(path).to_dict()
+    path.write_text(STAT_BLOCK.replace("Scimitar", "Longsword"), encoding="utf-8")
+    restored = Creature.from_dict(saved)
+    assert str(restored.actions) == ""
+    assert str(restored.traits).startswith("**Sure-Footed.**")  # bytes unchanged
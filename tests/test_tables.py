@@ -0,0 +1,115 @@
+"""Table registry: tables made only by DM setup, 404 reads, closing idle tables, 200 at once."""
+import asyncio
+
+import httpx
+import pytest
+
+from app import state
+from app.main import app
+from app.models import Creature, CreatureType
+from app.services.tables import TableRegistry
+
+LOAD_TABLES = 200
+LOAD_CLIENTS = 20
+MAX_OPEN = 32
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    registry = TableRegistry(tmp_path, max_open=MAX_OPEN, idle_seconds=0)
+    monkeypatch.setattr(state, "tables", registry)
+    monkeypatch.setattr(
+        state,
+        "monster_library",
+        {"Goblin": Creature(name="Goblin", creature_type=CreatureType.MONSTER, max_hp=7)},
+    )
+    yield registry
+    registry.close()
+
+
+def client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+def test_reads_of_unknown_tables_create_nothing(registry, tmp_path):
+    async def run():
+        async with client() as http:
+            params = {"table": "nobody"}
+            for path in ("/player", "/player/events", "/api/v1/encounter", "/encounter/transcript"):
+                assert (await http.get(path, params=params)).status_code == 404
+            assert (await http.post("/encounter/next-turn", params=params)).status_code == 404
+            # The DM page shows an empty setup, and only adding a creature makes the table
+            assert (await http.get("/", params=params)).status_code == 200
+            assert registry.get("nobody") is None
+            await http.post("/encounter/add-monster", params=params, data={"monster_name": "Goblin"})
+            assert (await http.get("/api/v1/encounter", params=params)).status_code == 200
+
+    asyncio.run(run())
+    assert [p.name for p in tmp_path.iterdir()] == ["nobody"]
+
+
+def test_idle_tables_are_closed_and_reopened_from_their_journal(tmp_path):
+    registry = TableRegistry(tmp_path, max_open=4, idle_seconds=0)
+    try:
+        for i in range(10):
+            registry.create(f"t{i}").encounter.add_creature(
+                Creature(name=f"Goblin {i}", creature_type=CreatureType.MONSTER, max_hp=7)
+            )
+        assert len(registry) == 4
+        assert len(registry._committer._journals) == 4
+        reopened = registry.get("t0")
+        assert [c.name for c in reopened.encounter.creatures] == ["Goblin 0"]
+    finally:
+        registry.close()
+
+
+def test_busy_tables_are_not_closed(tmp_path):
+    registry = TableRegistry(tmp_path, max_open=1, idle_seconds=0)
+    try:
+        watched = registry.create("watched")
+        watched.feed.connect()
+        registry.create("other")
+        # Over the cap, rather than cut off a player screen
+        assert len(registry) == 2
+        assert registry.get("watched") is watched
+    finally:
+        registry.close()
+
+
+def test_load_200_tables(registry):
+    """Every table gets its own creatures and damage, with at most MAX_OPEN idle ones open."""
+    open_counts = []
+
+    async def play(http: httpx.AsyncClient, table_id: str) -> None:
+        params = {"table": table_id}
+        await http.post(
+            "/encounter/add-monster", params=params, data={"monster_name": "Goblin", "count": 3}
+        )
+        await http.post("/encounter/start-combat", params=params)
+        body = (await http.get("/api/v1/encounter", params=params)).json()
+        first = body["order"][0]
+        for _ in range(3):
+            await http.post(f"/api/v1/encounter/damage/{first}", params=params, json={"amount": 2})
+            await http.post("/api/v1/encounter/next-turn", params=params)
+        open_counts.append(len(registry))
+
+    async def run():
+        queue = [f"load-{i}" for i in range(LOAD_TABLES)]
+
+        async def worker():
+            async with client() as http:
+                while queue:
+                    await play(http, queue.pop())
+
+        await asyncio.gather(*(worker() for _ in range(LOAD_CLIENTS)))
+        async with client() as http:
+            for i in range(LOAD_TABLES):
+                response = await http.get("/api/v1/encounter", params={"table": f"load-{i}"})
+                creatures = response.json()["creatures"].values()
+                hp = sorted(c["current_hp"] for c in creatures)
+                assert hp == [1, 7, 7]
+
+    asyncio.run(run())
+    # Tables still in use by another client may keep it briefly over the cap
+    assert max(open_counts) <= MAX_OPEN + LOAD_CLIENTS
+    assert len(registry._committer._journals) == len(registry)
@@ -0,0 +1,133 @@
+"""Hot reload: polling ``refresh`` for edits, deletes, renames, partial writes and uploads."""
+import asyncio
+import os
+import random
+from pathlib import Path
+
+import pytest
+
+from app import state
+from app.bench import monster_stat_block
+from app.models import Creature, CreatureType
+from app.parsers.monster_md import load_all_monsters, parse_monster_md, select_monsters
+from app.services.library import LibraryIndex
+from app.services.watcher import LibraryWatcher, WatchedLibrary
+
+
+def write(path: Path, name: str, seed: int = 0) -> None:
+    path.write_text(monster_stat_block(name, random.Random(seed)))
+    # Coarse filesystem clocks: make every write visible to the mtime check
+    stamp = os.stat(path).st_mtime_ns + 10**9 * (seed + 1)
+    os.utime(path, ns=(stamp, stamp))
+
+
+@pytest.fixture
+def assets(tmp_path, monkeypatch):
+    monkeypatch.setattr(state, "pc_library", {})
+    monkeypatch.setattr(state, "monster_library", {})
+    monkeypatch.setattr(state, "library_index", LibraryIndex())
+    write(tmp_path / "a_goblin_stats.md", "Goblin")
+    write(tmp_path / "b_goblin_stats.md", "Goblin", seed=1)
+    write(tmp_path / "ogre_stats.md", "Ogre")
+    return tmp_path
+
+
+def refreshed(directory: Path, *steps) -> None:
+    """Load ``directory`` as startup does, then run each step and a polling refresh."""
+    files = load_all_monsters(directory)
+    state.library_index.rebuild([], state.monster_library.values())
+    watcher = LibraryWatcher(
+        [WatchedLibrary(directory, parse_monster_md, select_monsters, "monster_library", files)],
+        poll_interval=3600,
+    )
+    watcher.backend = "polling"
+
+    async def run():
+        watcher.start()
+        try:
+            for step in steps:
+                step()
+                await watcher.refresh()
+        finally:
+            await watcher.stop()
+
+    asyncio.run(run())
+
+
+def library_hp() -> dict[str, int]:
+    return {name: c.max_hp for name, c in state.monster_library.items()}
+
+
+def indexed() -> list[str]:
+    return [c.name for c in state.library_index.search(limit=100).items]
+
+
+def test_edited_file_replaces_its_entry(assets):
+    before = {}
+
+    def edit():
+        before.update(library_hp())
+        write(assets / "ogre_stats.md", "Ogre", seed=5)
+
+    refreshed(assets, edit)
+    expected = parse_monster_md(monster_stat_block("Ogre", random.Random(5)))
+    assert state.monster_library["Ogre"].max_hp == expected.max_hp != before["Ogre"]
+    assert state.library_index.search("ogre").items == [state.monster_library["Ogre"]]
+
+
+def test_deleting_a_file_brings_back_the_duplicate_it_hid(assets):
+    hidden = parse_monster_md(monster_stat_block("Goblin", random.Random(0)))
+    shown = parse_monster_md(monster_stat_block("Goblin", random.Random(1)))
+    hp = []
+    refreshed(
+        assets,
+        lambda: hp.append(library_hp()["Goblin"]),
+        lambda: (assets / "b_goblin_stats.md").unlink(),
+        lambda: hp.append(library_hp()["Goblin"]),
+        lambda: (assets / "a_goblin_stats.md").unlink(),
+    )
+    assert hp == [shown.max_hp, hidden.max_hp]
+    assert "Goblin" not in state.monster_library
+    assert indexed() == ["Ogre"]
+
+
+def test_renamed_creature_replaces_the_old_name(assets):
+    refreshed(assets, lambda: write(assets / "ogre_stats.md", "Ogre Chieftain", seed=2))
+    assert sorted(state.monster_library) == ["Goblin", "Ogre Chieftain"]
+    assert indexed() == ["Goblin", "Ogre Chieftain"]
+
+
+def test_unparseable_file_keeps_its_old_entry_until_fixed(assets):
+    path = assets / "ogre_stats.md"
+    seen = []
+
+    def half_written():
+        seen.append(state.monster_library["Ogre"])
+        path.write_bytes(b"## Ogre\n\xff\xfe")
+
+    def finished():
+        seen.append(state.monster_library["Ogre"])
+        write(path, "Ogre", seed=3)
+
+    refreshed(assets, half_written, finished)
+    first, during = seen
+    assert during is first
+    assert state.monster_library["Ogre"] is not first
+    assert state.library_index.search("ogre").items == [state.monster_library["Ogre"]]
+
+
+def test_uploaded_creatures_are_left_alone(assets):
+    uploaded = Creature(name="Ogre", creature_type=CreatureType.MONSTER, max_hp=99)
+    other = Creature(name="Kobold", creature_type=CreatureType.MONSTER, max_hp=5)
+
+    def upload():
+        # What /creatures/upload-monster does over a library entry from a file
+        state.monster_library = {**state.monster_library, "Ogre": uploaded, "Kobold": other}
+
+    def unrelated_edits():
+        write(assets / "a_goblin_stats.md", "Goblin", seed=4)
+        (assets / "ogre_stats.md").unlink()
+
+    refreshed(assets, upload, unrelated_edits)
+    assert state.monster_library["Ogre"] is uploaded
+    assert state.monster_library["Kobold"] is other